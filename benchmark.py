@@ -0,0 +1,463 @@
+"""
+Measure the raw speed of the isolation board engines and of the search agents
+in game_agent.py on a fixed set of reproducible positions.
+
+Each benchmark prints one line per configuration so that results from
+different machines (or before and after a change) can be compared directly.
+Run all benchmarks with `python benchmark.py`, or a subset by name, e.g.
+`python benchmark.py engines`.
+"""
+
+import argparse
+import itertools
+import multiprocessing
+import random
+import time
+import timeit
+
+from isolation import Board
+from isolation import BitBoard
+from competition_agent import CustomPlayer
+from isolation.endgame import longest_path
+from isolation.endgame import solve
+from game_agent import AlphaBetaPlayer
+from game_agent import LazySMPPlayer
+from game_agent import ParallelAlphaBetaPlayer
+from game_agent import batch_evaluate
+from game_agent import custom_score
+from game_agent import np
+from game_agent import stack_grandchildren
+from game_agent import territory_score
+from sample_players import improved_score
+
+SEED = 12345  # seed used to generate the benchmark positions
+NUM_POSITIONS = 5  # number of starting positions per benchmark
+OPENING_PLIES = 4  # random plies played to create each starting position
+PERFT_DEPTH = 5  # depth of the move-generation (perft) benchmark
+SEARCH_DEPTH = 5  # depth of the fixed-depth alpha-beta benchmark
+
+ENGINES = [("Board", Board), ("BitBoard", BitBoard)]
+
+
+def make_positions(board_class, num_positions=NUM_POSITIONS,
+                   plies=OPENING_PLIES, seed=SEED, players=("p1", "p2")):
+    """Return a list of boards created by playing `plies` random moves from
+    the empty board. The same seed always produces the same positions, for
+    every board engine.
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < num_positions:
+        game = board_class(*players)
+        for _ in range(plies):
+            moves = sorted(game.get_legal_moves())
+            if not moves:
+                break
+            game.apply_move(rng.choice(moves))
+        else:
+            positions.append(game)
+    return positions
+
+
+def perft(game, depth):
+    """Count the nodes of the game tree below `game` to a fixed depth, using
+    `forecast_move` to create every successor.
+    """
+    if depth == 0:
+        return 1
+    return 1 + sum(perft(game.forecast_move(m), depth - 1)
+                   for m in game.get_legal_moves())
+
+
+def bench_engines():
+    """Compare the node throughput of the board engines, both for pure move
+    generation and for a fixed-depth alpha-beta search.
+    """
+    print("\nBoard engines")
+    print("----------")
+    for name, board_class in ENGINES:
+        positions = make_positions(board_class)
+        start = timeit.default_timer()
+        nodes = sum(perft(game, PERFT_DEPTH) for game in positions)
+        elapsed = timeit.default_timer() - start
+        print("  {:<10} perft({})      {:>9} nodes {:>10.0f} nodes/s".format(
+            name, PERFT_DEPTH, nodes, nodes / elapsed))
+
+    for (name, board_class), in_place in itertools.product(ENGINES, (False, True)):
+        player = AlphaBetaPlayer(score_fn=improved_score, in_place=in_place)
+        player.time_left = lambda: float("inf")
+        positions = make_positions(board_class, players=(player, "opponent"))
+        start = timeit.default_timer()
+        for game in positions:
+            player.alphabeta(game, SEARCH_DEPTH)
+        elapsed = timeit.default_timer() - start
+        print("  {:<10} alphabeta({}) {:<9} {:>7.1f} ms/search".format(
+            name, SEARCH_DEPTH, "in-place" if in_place else "",
+            1000 * elapsed / len(positions)))
+
+
+def bench_movegen():
+    """Measure the cost of a single `get_legal_moves` call for each engine,
+    the operation every heuristic performs at least twice per leaf.
+    """
+    print("\nMove generation")
+    print("----------")
+    for name, board_class in ENGINES:
+        positions = make_positions(board_class, plies=8)
+        number = 20000
+        elapsed = min(timeit.repeat(
+            lambda: [game.get_legal_moves() for game in positions],
+            number=number // len(positions), repeat=3))
+        print("  {:<10} get_legal_moves {:>8.2f} us/call".format(
+            name, 1e6 * elapsed / number))
+
+
+def bench_heuristics():
+    """Measure the cost of a single call of each heuristic, as a multiple of
+    `improved_score`, on midgame positions of each engine.
+    """
+    print("\nHeuristics")
+    print("----------")
+    heuristics = [("improved_score", improved_score),
+                  ("custom_score", custom_score),
+                  ("territory_score", territory_score)]
+    for name, board_class in ENGINES:
+        positions = make_positions(board_class, plies=12)
+        number = 20000
+        baseline = None
+        for score_name, score_fn in heuristics:
+            elapsed = min(timeit.repeat(
+                lambda: [score_fn(game, "p1") for game in positions],
+                number=number // len(positions), repeat=3))
+            baseline = baseline or elapsed
+            print("  {:<10} {:<16} {:>8.2f} us/call {:>6.1f}x".format(
+                name, score_name, 1e6 * elapsed / number, elapsed / baseline))
+
+
+def bench_tt():
+    """Measure iterative deepening to a fixed depth with and without a
+    transposition table, and report the table's counters.
+    """
+    print("\nTransposition table")
+    print("----------")
+    for tt_size in (0, 2**12, 2**16):
+        player = AlphaBetaPlayer(score_fn=improved_score, tt_size=tt_size)
+        player.time_left = lambda: float("inf")
+        positions = make_positions(BitBoard, players=(player, "opponent"))
+        start = timeit.default_timer()
+        for game in positions:
+            for depth in range(1, SEARCH_DEPTH + 3):
+                player.alphabeta(game, depth)
+        elapsed = timeit.default_timer() - start
+        line = "  tt_size={:<7} ID to depth {} {:>8.1f} ms/search".format(
+            tt_size, SEARCH_DEPTH + 2, 1000 * elapsed / len(positions))
+        if player.tt is not None:
+            stats = player.tt.stats()
+            line += "  hit rate {:.1%}, {} collisions, {}/{} entries".format(
+                stats["hit_rate"], stats["collisions"], stats["entries"],
+                stats["capacity"])
+        print(line)
+
+
+def iterative_deepening(player, game, max_depth):
+    """Search `game` with `player.alphabeta` at every depth up to
+    `max_depth`, returning the number of nodes visited by the last iteration.
+    """
+    player.new_game()
+    score = None
+    for depth in range(1, max_depth + 1):
+        nodes = player.nodes
+        _, score = player.aspiration_search(game, depth, score)
+    return player.nodes - nodes
+
+
+def bench_ordering():
+    """Count the nodes alpha-beta visits to complete a fixed depth with and
+    without move ordering (and with a transposition table).
+    """
+    print("\nMove ordering")
+    print("----------")
+    configs = [("no ordering", {}),
+               ("ordering", {"move_ordering": True}),
+               ("killers", {"killers": True}),
+               ("ordering+killers", {"move_ordering": True, "killers": True}),
+               ("ordering+tt", {"move_ordering": True, "tt_size": 2**16}),
+               ("all", {"move_ordering": True, "killers": True,
+                        "tt_size": 2**16})]
+    depth = SEARCH_DEPTH + 2
+    for name, kwargs in configs:
+        player = AlphaBetaPlayer(score_fn=improved_score, **kwargs)
+        player.time_left = lambda: float("inf")
+        positions = make_positions(BitBoard, players=(player, "opponent"))
+        last_nodes = 0
+        start = timeit.default_timer()
+        for idx, game in enumerate(positions):
+            random.seed(SEED + idx)
+            last_nodes += iterative_deepening(player, game, depth)
+        elapsed = timeit.default_timer() - start
+        print("  {:<16} depth {}  {:>8.0f} nodes/depth {:>9.0f} nodes/search"
+              " {:>8.1f} ms/search".format(
+                  name, depth, last_nodes / len(positions),
+                  player.nodes / len(positions), 1000 * elapsed / len(positions)))
+
+
+def bench_pvs():
+    """Compare plain alpha-beta with principal variation search at equal
+    depth, with and without move ordering.
+    """
+    print("\nPrincipal variation search")
+    print("----------")
+    depth = SEARCH_DEPTH + 2
+    ordering = {"move_ordering": True, "killers": True}
+    tt = dict(ordering, tt_size=2**16)
+    configs = [("alphabeta", {}),
+               ("pvs", {"search": "pvs"}),
+               ("alphabeta+ordering", ordering),
+               ("pvs+ordering", dict(ordering, search="pvs")),
+               ("alphabeta+ordering+tt", tt),
+               ("pvs+ordering+tt", dict(tt, search="pvs"))]
+    for name, kwargs in configs:
+        player = AlphaBetaPlayer(score_fn=improved_score, **kwargs)
+        player.time_left = lambda: float("inf")
+        positions = make_positions(BitBoard, players=(player, "opponent"))
+        last_nodes = 0
+        start = timeit.default_timer()
+        for idx, game in enumerate(positions):
+            random.seed(SEED + idx)
+            last_nodes += iterative_deepening(player, game, depth)
+        elapsed = timeit.default_timer() - start
+        print("  {:<21} depth {}  {:>8.0f} nodes/depth {:>8.1f} ms/search"
+              "  {} re-searches".format(
+                  name, depth, last_nodes / len(positions),
+                  1000 * elapsed / len(positions), player.researches))
+
+
+def bench_aspiration():
+    """Measure iterative deepening to a fixed depth with aspiration windows
+    of several widths, counting the searches repeated after a fail-low or
+    fail-high.
+    """
+    print("\nAspiration windows")
+    print("----------")
+    depth = SEARCH_DEPTH + 2
+    base = {"move_ordering": True, "killers": True, "tt_size": 2**16}
+    for window in (None, 0.5, 1., 2., 4.):
+        player = AlphaBetaPlayer(score_fn=improved_score,
+                                 aspiration_window=window, **base)
+        player.time_left = lambda: float("inf")
+        positions = make_positions(BitBoard, players=(player, "opponent"))
+        start = timeit.default_timer()
+        for idx, game in enumerate(positions):
+            random.seed(SEED + idx)
+            iterative_deepening(player, game, depth)
+        elapsed = timeit.default_timer() - start
+        print("  window={!s:<5} depth {}  {:>8.0f} nodes/search {:>8.1f} ms/search"
+              "  {} re-searches".format(
+                  window, depth, player.nodes / len(positions),
+                  1000 * elapsed / len(positions), player.aspiration_researches))
+
+
+def make_endgames(num_positions=NUM_POSITIONS, seed=SEED, max_cells=20,
+                  plies_before=8, players=("p1", "p2")):
+    """Return a list of pairs (late position, partitioned position): random
+    games are played until the endgame solver applies, and each pair holds
+    the position `plies_before` plies before that point and the first
+    partitioned position itself.
+    """
+    rng = random.Random(seed)
+    pairs = []
+    while len(pairs) < num_positions:
+        history = [BitBoard(*players)]
+        while history[-1].get_legal_moves():
+            game = history[-1].forecast_move(
+                rng.choice(sorted(history[-1].get_legal_moves())))
+            history.append(game)
+            if solve(game, max_cells) is not None:
+                if len(history) > plies_before and game.get_legal_moves():
+                    pairs.append((history[-1 - plies_before], game))
+                break
+    return pairs
+
+
+def bench_endgame():
+    """Compare the exact endgame solver with alpha-beta search on late-game
+    positions, both at the first partitioned position and a few plies before
+    it.
+    """
+    print("\nEndgame solver")
+    print("----------")
+    depth = SEARCH_DEPTH + 4
+    for endgame_cells in (0, 20):
+        player = AlphaBetaPlayer(score_fn=improved_score, move_ordering=True,
+                                 endgame_cells=endgame_cells)
+        player.time_left = lambda: float("inf")
+        pairs = make_endgames(players=(player, "opponent"))
+        exact = 0
+        start = timeit.default_timer()
+        for late, _ in pairs:
+            _, score = player.search_root(late, depth)
+            exact += abs(score) == float("inf")
+        elapsed = timeit.default_timer() - start
+        print("  endgame_cells={:<3} depth {}  {:>8.0f} nodes/search {:>8.1f} ms/search"
+              "  {}/{} exact".format(
+                  endgame_cells, depth, player.nodes / len(pairs),
+                  1000 * elapsed / len(pairs), exact, len(pairs)))
+
+    longest_path.cache_clear()
+    start = timeit.default_timer()
+    for _, partitioned in pairs:
+        solve(partitioned, 20)
+    elapsed = timeit.default_timer() - start
+    print("  solve() at the partition {:>8.1f} ms/position".format(
+        1000 * elapsed / len(pairs)))
+
+
+def bench_parallel():
+    """Measure the speedup of root splitting over the serial search for an
+    increasing number of worker processes, searching every depth up to a
+    fixed one (as iterative deepening does).
+    """
+    print("\nParallel root splitting ({} CPUs)".format(multiprocessing.cpu_count()))
+    print("----------")
+    depth = SEARCH_DEPTH + 2
+    options = {"move_ordering": True, "tt_size": 2**16}
+
+    player = AlphaBetaPlayer(score_fn=improved_score, **options)
+    player.time_left = lambda: float("inf")
+    positions = make_positions(BitBoard, players=(player, "opponent"))
+    start = timeit.default_timer()
+    for game in positions:
+        player.new_game()
+        for d in range(1, depth + 1):
+            player.search_root(game, d)
+    serial = timeit.default_timer() - start
+    print("  serial      depth {} {:>8.1f} ms/search {:>9.0f} nodes/search".format(
+        depth, 1000 * serial / len(positions), player.nodes / len(positions)))
+
+    workers = 1
+    while workers <= max(2, multiprocessing.cpu_count()):
+        player = ParallelAlphaBetaPlayer(score_fn=improved_score,
+                                         workers=workers, **options)
+        positions = make_positions(BitBoard, players=(player, "opponent"))
+        start = timeit.default_timer()
+        for game in positions:
+            for d in range(1, depth + 1):
+                player.split_root(game, d, time.monotonic() + 3600)
+        elapsed = timeit.default_timer() - start
+        player.close()
+        print("  workers={:<3} depth {} {:>8.1f} ms/search {:>9.0f} nodes/search"
+              "  speedup {:.2f}x".format(
+                  workers, depth, 1000 * elapsed / len(positions),
+                  player.nodes / len(positions), serial / elapsed))
+        workers *= 2
+
+
+def bench_lazy_smp(time_limit=200):
+    """Measure the depth completed by Lazy SMP in a fixed time per move for
+    an increasing number of helper processes.
+    """
+    print("\nLazy SMP ({} CPUs, {} ms/move)".format(
+        multiprocessing.cpu_count(), time_limit))
+    print("----------")
+    workers = 0
+    while workers <= max(2, multiprocessing.cpu_count() - 1):
+        player = LazySMPPlayer(score_fn=improved_score, workers=workers,
+                               move_ordering=True)
+        positions = make_positions(BitBoard, players=(player, "opponent"))
+        depths = 0
+        for game in positions:
+            start = time.monotonic()
+            player.get_move(game, lambda: time_limit - 1000 * (time.monotonic() - start))
+            depths += player.completed_depth
+        stats = player.tt.stats()
+        player.close()
+        print("  helpers={:<3} {:>5.1f} plies/move {:>8.0f} nodes/move (main search)"
+              "  {} TT entries".format(workers, depths / len(positions),
+                                       player.nodes / len(positions),
+                                       stats["entries"]))
+        workers = 2 * workers or 1
+
+
+def bench_batch():
+    """Compare scoring the positions two plies below each benchmark
+    position one at a time with stacking and scoring them in one batch.
+    """
+    print("\nBatched evaluation")
+    print("----------")
+    if np is None:
+        print("  skipped: requires numpy")
+        return
+    positions = make_positions(BitBoard, plies=8)
+    batches = []
+    for game in positions:
+        planes, lines = stack_grandchildren(game, game.get_legal_moves(), "p1")
+        leaves = [game.forecast_move(m).forecast_move(r) for m, r in lines]
+        batches.append((game, leaves))
+    count = sum(len(leaves) for _, leaves in batches)
+    number = 200
+
+    def scalar():
+        for _, leaves in batches:
+            [custom_score(leaf, "p1") for leaf in leaves]
+
+    def batched():
+        for game, _ in batches:
+            planes, _ = stack_grandchildren(game, game.get_legal_moves(), "p1")
+            batch_evaluate(planes, game.active_player == "p1", 1, 1)
+
+    for name, run in [("scalar", scalar), ("batched", batched)]:
+        elapsed = min(timeit.repeat(run, number=number, repeat=3))
+        print("  {:<8} {:>5.1f} positions/batch {:>8.2f} us/position".format(
+            name, count / len(batches), 1e6 * elapsed / (number * count)))
+
+
+def bench_mcts(time_limit=150):
+    """Compare the Monte Carlo tree search player with alpha-beta at equal
+    time budgets: rollouts per second against search nodes per second.
+    """
+    print("\nMCTS vs alpha-beta ({} ms/move)".format(time_limit))
+    print("----------")
+    players = [("mcts", "rollouts", CustomPlayer()),
+               ("alphabeta", "nodes", AlphaBetaPlayer(score_fn=improved_score,
+                                                      move_ordering=True))]
+    for name, unit, player in players:
+        positions = make_positions(Board, players=(player, "opponent"))
+        count = 0
+        elapsed = 0.
+        for game in positions:
+            # rollouts are counted per move, nodes over the player's lifetime
+            before = getattr(player, unit) if unit == "nodes" else 0
+            start = timeit.default_timer()
+            player.get_move(game, lambda: time_limit - 1000 * (timeit.default_timer() - start))
+            elapsed += timeit.default_timer() - start
+            count += getattr(player, unit) - before
+        print("  {:<10} {:>8.0f} {}/s {:>8.0f} {}/move".format(
+            name, count / elapsed, unit, count / len(positions), unit))
+
+
+BENCHMARKS = {"aspiration": bench_aspiration, "batch": bench_batch,
+              "endgame": bench_endgame,
+              "engines": bench_engines, "heuristics": bench_heuristics,
+              "lazysmp": bench_lazy_smp,
+              "mcts": bench_mcts, "movegen": bench_movegen,
+              "ordering": bench_ordering, "parallel": bench_parallel,
+              "pvs": bench_pvs, "tt": bench_tt}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("names", nargs="*", metavar="name",
+                        help="benchmarks to run, from: {} (default: all)"
+                        .format(", ".join(sorted(BENCHMARKS))))
+    args = parser.parse_args()
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error("unknown benchmark(s): {}".format(", ".join(sorted(unknown))))
+
+    random.seed(SEED)
+    for name in args.names or sorted(BENCHMARKS):
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,544 @@
+"""
+This file contains test cases for the board engines in the isolation package.
+"""
+import os
+import pickle
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+import competition_agent
+import isolation
+from isolation import endgame
+from isolation import tablebase
+
+
+def play_random_game(board_classes, seed, max_plies=None):
+    """Play the same random game on one board of each of the given classes,
+    yielding the list of boards after every ply.
+    """
+    rng = random.Random(seed)
+    boards = [cls("Player1", "Player2") for cls in board_classes]
+    yield boards
+    while max_plies is None or boards[0].move_count < max_plies:
+        moves = sorted(boards[0].get_legal_moves())
+        if not moves:
+            break
+        move = rng.choice(moves)
+        for board in boards:
+            board.apply_move(move)
+        yield boards
+
+
+def snapshot(board):
+    """Return a tuple summarizing the complete state of a board."""
+    return (board.hash(), board.to_string(), board.move_count,
+            board.active_player, board.inactive_player,
+            board.get_player_location("Player1"),
+            board.get_player_location("Player2"))
+
+
+class KnightNeighborsTest(unittest.TestCase):
+
+    def test_tables_match_knight_moves(self):
+        """Neighbor tables list exactly the in-bounds knight moves"""
+        directions = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                      (1, -2), (1, 2), (2, -1), (2, 1)]
+        for width, height in [(7, 7), (5, 8), (3, 3)]:
+            table = isolation.isolation.knight_neighbors(width, height)
+            self.assertIs(table, isolation.isolation.knight_neighbors(
+                width, height))
+            for r in range(height):
+                for c in range(width):
+                    expected = {(r + dr, c + dc) for dr, dc in directions
+                                if 0 <= r + dr < height and 0 <= c + dc < width}
+                    entries = table[r + c * height]
+                    self.assertEqual({move for _, move in entries}, expected)
+                    for idx, move in entries:
+                        self.assertEqual(idx, move[0] + move[1] * height)
+
+
+class BitBoardTest(unittest.TestCase):
+
+    def test_matches_list_board(self):
+        """BitBoard agrees with Board through complete random games"""
+        for seed in range(20):
+            for board, bitboard in play_random_game(
+                    [isolation.Board, isolation.BitBoard], seed):
+                self.assertEqual(board.to_string(), bitboard.to_string())
+                self.assertEqual(board.move_count, bitboard.move_count)
+                self.assertEqual(board.active_player, bitboard.active_player)
+                self.assertEqual(sorted(board.get_blank_spaces()),
+                                 sorted(bitboard.get_blank_spaces()))
+                for player in ("Player1", "Player2"):
+                    self.assertEqual(board.get_player_location(player),
+                                     bitboard.get_player_location(player))
+                    self.assertEqual(sorted(board.get_legal_moves(player)),
+                                     sorted(bitboard.get_legal_moves(player)))
+                    self.assertEqual(board.utility(player),
+                                     bitboard.utility(player))
+                    self.assertEqual(board.is_winner(player),
+                                     bitboard.is_winner(player))
+                    self.assertEqual(board.is_loser(player),
+                                     bitboard.is_loser(player))
+
+    def test_forecast_move_does_not_modify_board(self):
+        """BitBoard.forecast_move leaves the original board unchanged"""
+        board = isolation.BitBoard("Player1", "Player2", 5, 6)
+        board.apply_move((0, 0))
+        board.apply_move((5, 4))
+        before = board.to_string()
+        new_board = board.forecast_move((2, 1))
+        self.assertEqual(before, board.to_string())
+        self.assertEqual(new_board.get_player_location("Player1"), (2, 1))
+        self.assertFalse(new_board.move_is_legal((0, 0)))
+        self.assertTrue(board.move_is_legal((2, 1)))
+
+
+class PushPopTest(unittest.TestCase):
+
+    def test_pop_restores_state(self):
+        """pop_move undoes push_move exactly on every board engine"""
+        for board_class in (isolation.Board, isolation.BitBoard):
+            for seed in range(5):
+                for board, in play_random_game([board_class], seed):
+                    before = snapshot(board)
+                    for move in board.get_legal_moves():
+                        board.push_move(move)
+                        self.assertEqual(board.get_player_location(
+                            board.inactive_player), move)
+                        self.assertEqual(board.pop_move(), move)
+                        self.assertEqual(before, snapshot(board))
+
+
+class MobilityTest(unittest.TestCase):
+
+    def test_matches_legal_moves(self):
+        """mobility counts the legal moves on every board engine, through
+        moves, copies and undone moves"""
+        for board_class in (isolation.Board, isolation.BitBoard):
+            for seed in range(10):
+                for board, in play_random_game([board_class], seed):
+                    for game in (board, board.copy()):
+                        for player in ("Player1", "Player2"):
+                            self.assertEqual(
+                                game.mobility(player),
+                                len(game.get_legal_moves(player)))
+                    for move in board.get_legal_moves():
+                        board.push_move(move)
+                        self.assertEqual(board.mobility(board.inactive_player),
+                                         len(board.get_legal_moves(
+                                             board.inactive_player)))
+                        board.pop_move()
+
+    def test_recounts_after_foreign_copy(self):
+        """Counts are rebuilt for a board whose cells were copied without
+        them (as by a subclass's copy())"""
+        for board, in play_random_game([isolation.Board], 3, max_plies=8):
+            new_board = isolation.Board("Player1", "Player2")
+            new_board.move_count = board.move_count
+            new_board._active_player = board.active_player
+            new_board._inactive_player = board.inactive_player
+            new_board._board_state = list(board._board_state)
+            for move in board.get_legal_moves():
+                game = new_board.forecast_move(move)
+                for player in ("Player1", "Player2"):
+                    self.assertEqual(game.mobility(player),
+                                     len(game.get_legal_moves(player)))
+
+
+class PickleTest(unittest.TestCase):
+
+    def test_pickle_round_trip(self):
+        """Pickled boards (without their lookup tables) restore exactly"""
+        for board_class in (isolation.Board, isolation.BitBoard):
+            for board, in play_random_game([board_class], 0, max_plies=6):
+                copy = pickle.loads(pickle.dumps(
+                    board.copy_with_players("Player1", "Player2")))
+                self.assertEqual(snapshot(board), snapshot(copy))
+                for move in board.get_legal_moves():
+                    self.assertEqual(snapshot(board.forecast_move(move)),
+                                     snapshot(copy.forecast_move(move)))
+
+
+class ClockPlayer:
+    """Player that queries the clock `queries` times, optionally sleeps, and
+    then plays its first legal move, recording the time left it saw."""
+
+    def __init__(self, queries=1, sleep=0.):
+        self.queries = queries
+        self.sleep = sleep
+        self.seen = []
+
+    def get_move(self, game, legal_moves, time_left):
+        self.seen.append([time_left() for _ in range(self.queries)])
+        time.sleep(self.sleep)
+        return legal_moves[0] if legal_moves else (-1, -1)
+
+
+class TimeControlTest(unittest.TestCase):
+
+    def test_node_budget(self):
+        """The node clock charges a fixed amount per time_left() call"""
+        player_1, player_2 = ClockPlayer(queries=9), ClockPlayer(queries=11)
+        game = isolation.Board(player_1, player_2, 5, 5)
+        winner, history, termination = game.play(
+            time_limit=1, time_control="nodes", node_millis=0.1)
+        # player 2 exhausts its budget on its first move
+        self.assertEqual((winner, termination), (player_1, "timeout"))
+        self.assertEqual(len(history), 1)
+        for seen in player_1.seen + player_2.seen:
+            for left, expected in zip(seen, [0.9 - 0.1 * i for i in range(11)]):
+                self.assertAlmostEqual(left, expected)
+
+    def test_cpu_clock_ignores_waiting(self):
+        """Time spent off the CPU is charged by the wall clock only"""
+        for time_control, termination in (("cpu", "illegal move"),
+                                          ("wall", "timeout")):
+            player_1, player_2 = ClockPlayer(sleep=0.06), ClockPlayer()
+            game = isolation.Board(player_1, player_2, 3, 3)
+            _, _, result = game.play(time_limit=50, time_control=time_control)
+            self.assertEqual(result, termination)
+
+    def test_unknown_time_control(self):
+        """Unknown time controls are rejected"""
+        game = isolation.Board(ClockPlayer(), ClockPlayer())
+        self.assertRaises(ValueError, game.play, time_control="moves")
+
+
+def full_zobrist(board):
+    """Compute the Zobrist key of a board from scratch."""
+    cell_keys, p1_keys, p2_keys, side_key = \
+        isolation.isolation.zobrist_keys(board.width, board.height)
+    key = side_key if board.move_count % 2 else 0
+    for r, c in set((i, j) for i in range(board.height)
+                    for j in range(board.width)) - set(board.get_blank_spaces()):
+        key ^= cell_keys[r + c * board.height]
+    for player, loc_keys in (("Player1", p1_keys), ("Player2", p2_keys)):
+        loc = board.get_player_location(player)
+        if loc is not None:
+            key ^= loc_keys[loc[0] + loc[1] * board.height]
+    return key
+
+
+class ForeignCopyBoard(isolation.Board):
+    """Board whose copy() sets the cells without the incrementally
+    maintained state, as agent_test.CounterBoard does."""
+
+    def copy(self):
+        new_board = ForeignCopyBoard(self._player_1, self._player_2,
+                                     width=self.width, height=self.height)
+        new_board.move_count = self.move_count
+        new_board._active_player = self._active_player
+        new_board._inactive_player = self._inactive_player
+        new_board._board_state = list(self._board_state)
+        return new_board
+
+
+class ZobristTest(unittest.TestCase):
+
+    def test_key_recomputed_after_foreign_copy(self):
+        """A board whose cells were copied without its key recomputes the
+        key instead of reporting the empty board's"""
+        for seed in range(5):
+            for board, in play_random_game([ForeignCopyBoard], seed,
+                                           max_plies=8):
+                copy = board.copy()
+                self.assertEqual(copy.to_string(), board.to_string())
+                self.assertEqual(copy.zobrist_key, board.zobrist_key)
+                self.assertEqual(copy.hash(), full_zobrist(board))
+                for move in board.get_legal_moves():
+                    self.assertEqual(board.copy().forecast_move(move).hash(),
+                                     board.forecast_move(move).hash())
+                    copy.push_move(move)
+                    self.assertEqual(copy.zobrist_key, full_zobrist(copy))
+                    copy.pop_move()
+                    self.assertEqual(copy.zobrist_key, board.zobrist_key)
+
+    def test_incremental_key_matches_full_key(self):
+        """Incremental Zobrist keys match keys computed from scratch"""
+        for seed in range(10):
+            for board, bitboard in play_random_game(
+                    [isolation.Board, isolation.BitBoard], seed):
+                self.assertEqual(board.zobrist_key, full_zobrist(board))
+                self.assertEqual(board.zobrist_key, bitboard.zobrist_key)
+                self.assertEqual(board.hash(), board.zobrist_key)
+                for move in board.get_legal_moves():
+                    self.assertEqual(board.forecast_move(move).zobrist_key,
+                                     bitboard.forecast_move(move).zobrist_key)
+
+    def test_transpositions_share_keys(self):
+        """Positions reached by different move orders have equal keys"""
+        # player 1 walks the knight-move cycle (0, 0)-(1, 2)-(3, 3)-(2, 1)
+        # in two different orders that visit the same cells and end on the
+        # same square
+        p1_orders = [[(0, 0), (1, 2), (3, 3), (2, 1)],
+                     [(3, 3), (1, 2), (0, 0), (2, 1)],
+                     [(1, 2), (0, 0), (2, 1), (3, 3)]]
+        p2_moves = [(6, 6), (4, 5), (6, 4), (5, 6)]
+        for board_class in (isolation.Board, isolation.BitBoard):
+            keys = []
+            for p1_moves in p1_orders:
+                game = board_class("Player1", "Player2")
+                for p1_move, p2_move in zip(p1_moves, p2_moves):
+                    game.apply_move(p1_move)
+                    game.apply_move(p2_move)
+                keys.append(game.zobrist_key)
+            self.assertEqual(keys[0], keys[1])
+            self.assertNotEqual(keys[0], keys[2])
+
+    def test_keys_reproducible_across_processes(self):
+        """Zobrist keys do not depend on the interpreter's hash seed"""
+        script = ("import isolation; b = isolation.Board(1, 2); "
+                  "b.apply_move((2, 3)); b.apply_move((0, 5)); "
+                  "print(b.zobrist_key)")
+        keys = set()
+        for hash_seed in ("1", "2"):
+            env = dict(os.environ, PYTHONHASHSEED=hash_seed)
+            output = subprocess.check_output(
+                [sys.executable, "-c", script], env=env,
+                cwd=os.path.dirname(os.path.abspath(__file__)))
+            keys.add(int(output))
+        self.assertEqual(len(keys), 1)
+
+
+def replay(board_class, moves, perm, width, height):
+    """Play `moves` on a new board with every cell mapped by `perm`."""
+    board = board_class("Player1", "Player2", width, height)
+    for r, c in moves:
+        idx = perm[r + c * height]
+        board.apply_move((idx % height, idx // height))
+    return board
+
+
+class SymmetryTest(unittest.TestCase):
+
+    def random_games(self):
+        """Yield (board class, width, height, moves) for random games of a
+        few plies on square and rectangular boards."""
+        for width, height in ((7, 7), (5, 6)):
+            for board_class in (isolation.Board, isolation.BitBoard):
+                for seed in range(8):
+                    rng = random.Random(seed)
+                    board = board_class("Player1", "Player2", width, height)
+                    moves = []
+                    for _ in range(seed % 6):
+                        legal = sorted(board.get_legal_moves())
+                        if not legal:
+                            break
+                        moves.append(rng.choice(legal))
+                        board.apply_move(moves[-1])
+                    yield board_class, width, height, moves
+
+    def test_symmetric_positions_share_key(self):
+        """Every symmetric image of a position has the same canonical key,
+        and the transform maps the position onto its canonical form"""
+        for board_class, width, height, moves in self.random_games():
+            perms, _ = isolation.isolation.symmetries(width, height)
+            self.assertEqual(len(perms), 8 if width == height else 4)
+            identity = perms[0]
+            board = replay(board_class, moves, identity, width, height)
+            key, transform = board.canonical()
+            for perm in perms:
+                self.assertEqual(replay(board_class, moves, perm, width,
+                                        height).canonical()[0], key)
+            canonical = replay(board_class, moves, perms[transform],
+                               width, height)
+            self.assertEqual(canonical.canonical(), (key, 0))
+
+    def test_moves_map_to_canonical_board(self):
+        """Legal moves map to the legal moves of the canonical board and
+        back"""
+        for board_class, width, height, moves in self.random_games():
+            perms, _ = isolation.isolation.symmetries(width, height)
+            board = replay(board_class, moves, perms[0], width, height)
+            _, transform = board.canonical()
+            canonical = replay(board_class, moves, perms[transform],
+                               width, height)
+            legal = board.get_legal_moves()
+            mapped = [board.to_canonical_move(m, transform) for m in legal]
+            self.assertEqual(sorted(mapped),
+                             sorted(canonical.get_legal_moves()))
+            self.assertEqual([board.from_canonical_move(m, transform)
+                              for m in mapped], legal)
+
+    def test_matches_competition_agent(self):
+        """Board.canonical() computes the same key and transform as the
+        self-contained competition agent, so book keys agree"""
+        for board_class, width, height, moves in self.random_games():
+            board = replay(board_class, moves,
+                           isolation.isolation.symmetries(width, height)[0][0],
+                           width, height)
+            blocked, locs, _ = competition_agent.encode(board)
+            self.assertEqual(board.canonical(), competition_agent.canonical_key(
+                blocked, locs, width, height))
+
+    def test_keys_match_competition_agent_on_random_boards(self):
+        """The duplicated symmetry tables and canonical keys of isolation
+        and of the competition agent agree on random boards, including
+        cell masks that no game reaches"""
+        rng = random.Random(0)
+        for width, height in ((7, 7), (5, 6), (4, 8)):
+            self.assertEqual(isolation.isolation.symmetries(width, height),
+                             competition_agent.symmetries(width, height))
+            size = width * height
+            for _ in range(20):
+                blocked = bytearray(rng.random() < 0.4 for _ in range(size))
+                cells = sum(1 << idx for idx in range(size) if blocked[idx])
+                locs = [rng.randrange(-1, size), rng.randrange(-1, size)]
+                self.assertEqual(
+                    isolation.isolation.canonical_key(cells, locs, width,
+                                                      height),
+                    competition_agent.canonical_key(blocked, locs, width,
+                                                    height))
+
+
+def reachable(board, player):
+    """Return the set of blank cells `player` can reach, by breadth-first
+    search over the board's neighbor table."""
+    r, c = board.get_player_location(player)
+    table = isolation.isolation.knight_neighbors(board.width, board.height)
+    blank = set(board.get_blank_spaces())
+    seen, frontier = set(), [r + c * board.height]
+    while frontier:
+        idx = frontier.pop()
+        for next_idx, move in table[idx]:
+            if move in blank and move not in seen:
+                seen.add(move)
+                frontier.append(next_idx)
+    return seen
+
+
+def active_player_wins(board):
+    """Return True if the active player wins `board` with perfect play."""
+    return any(not active_player_wins(board.forecast_move(m))
+               for m in board.get_legal_moves())
+
+
+class EndgameTest(unittest.TestCase):
+
+    def test_blank_mask(self):
+        """blank_mask() agrees with get_blank_spaces() on every engine"""
+        for board, bitboard in play_random_game(
+                [isolation.Board, isolation.BitBoard], 0):
+            mask = sum(1 << (r + c * board.height)
+                       for r, c in board.get_blank_spaces())
+            self.assertEqual(board.blank_mask(), mask)
+            self.assertEqual(bitboard.blank_mask(), mask)
+
+    def test_regions_match_search(self):
+        """Partition detection agrees with a breadth-first search"""
+        for seed in range(20):
+            for board, in play_random_game([isolation.BitBoard], seed):
+                if board.move_count < 2:
+                    continue
+                regions = endgame.separate_regions(board)
+                active = reachable(board, board.active_player)
+                inactive = reachable(board, board.inactive_player)
+                if active & inactive:
+                    self.assertIsNone(regions)
+                else:
+                    self.assertEqual(regions, tuple(
+                        sum(1 << (r + c * board.height) for r, c in cells)
+                        for cells in (active, inactive)))
+
+    def test_solver_matches_game_tree(self):
+        """The solver finds the game-theoretic winner of partitioned
+        positions and a move that keeps the win"""
+        solved = 0
+        for seed in range(40):
+            for board, in play_random_game(
+                    [lambda p1, p2: isolation.Board(p1, p2, 5, 5)], seed):
+                solution = endgame.solve(board, max_cells=8)
+                if solution is None:
+                    continue
+                solved += 1
+                winner, move, _, _ = solution
+                wins = active_player_wins(board)
+                self.assertEqual(winner == board.active_player, wins)
+                if move != (-1, -1):
+                    self.assertEqual(
+                        active_player_wins(board.forecast_move(move)), not wins)
+        self.assertGreater(solved, 40)
+
+
+def game_value(board):
+    """Return a pair (win, plies): whether the active player wins `board`
+    with perfect play, and the number of plies until the game ends when the
+    winner ends it as quickly and the loser as slowly as possible."""
+    results = [game_value(board.forecast_move(m))
+               for m in board.get_legal_moves()]
+    wins = [plies for win, plies in results if not win]
+    if wins:
+        return True, 1 + min(wins)
+    return False, 1 + max((plies for _, plies in results), default=-1)
+
+
+class TablebaseTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.table = tablebase.generate(max_cells=3, width=5, height=5)
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, "tablebase.bin")
+        tablebase.write_table(cls.path, cls.table, 3, 5, 5)
+        cls.tablebase = tablebase.Tablebase(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tablebase.close()
+        shutil.rmtree(cls.directory)
+
+    def covered_positions(self):
+        """Yield the positions of random 5x5 games covered by the table."""
+        for seed in range(200):
+            for board, in play_random_game(
+                    [lambda p1, p2: isolation.BitBoard(p1, p2, 5, 5)], seed):
+                if self.tablebase.probe(board) is not None:
+                    yield board
+
+    def test_values_match_game_tree(self):
+        """Tablebase values and distances agree with a full game-tree
+        search, and the tablebase move keeps the value"""
+        probed = 0
+        for board in self.covered_positions():
+            probed += 1
+            win, plies = self.tablebase.probe(board)
+            self.assertEqual((win, plies), game_value(board))
+            move = self.tablebase.best_move(board)
+            if plies:
+                self.assertEqual(game_value(board.forecast_move(move)),
+                                 (not win, plies - 1))
+            else:
+                self.assertEqual(move, (-1, -1))
+        self.assertGreater(probed, 50)
+
+    def test_file_matches_table(self):
+        """The mapped file holds every generated position and nothing else"""
+        self.assertEqual(len(self.tablebase), len(self.table))
+        for key in random.Random(0).sample(sorted(self.table), 200):
+            self.assertEqual(self.tablebase.lookup(key), self.table[key])
+            if key + 1 not in self.table:
+                self.assertIsNone(self.tablebase.lookup(key + 1))
+        self.assertIsNone(self.tablebase.lookup(0))
+        copy = pickle.loads(pickle.dumps(self.tablebase))
+        for board in self.covered_positions():
+            self.assertEqual(copy.probe(board), self.tablebase.probe(board))
+        copy.close()
+
+    def test_open_positions_not_covered(self):
+        """Boards with large regions or unplaced players are not covered"""
+        board = isolation.Board("Player1", "Player2", 5, 5)
+        self.assertIsNone(self.tablebase.probe(board))
+        board.apply_move((0, 0))
+        board.apply_move((4, 4))
+        self.assertIsNone(self.tablebase.probe(board))
+        self.assertIsNone(self.tablebase.probe(isolation.Board(1, 2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,36 +4,204 @@ champions) in a tournament.
 
          COMPLETING AND SUBMITTING A COMPETITION AGENT IS OPTIONAL
 """
+import json
+import math
 import random
 
+# knight-move neighbor tables (tuples of cell indices) for each board size
+_NEIGHBORS = {}
+
+# cell permutations of the board symmetries for each board size
+_SYMMETRIES = {}
+
+
+def neighbor_table(width, height):
+    """Return a list mapping each cell index (``row + col * height``) on a
+    board of the given size to the tuple of cell indices a knight can reach
+    from it.
+    """
+    table = _NEIGHBORS.get((width, height))
+    if table is None:
+        table = []
+        for idx in range(width * height):
+            r, c = idx % height, idx // height
+            table.append(tuple(
+                (r + dr) + (c + dc) * height
+                for dr, dc in [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                               (1, -2), (1, 2), (2, -1), (2, 1)]
+                if 0 <= r + dr < height and 0 <= c + dc < width))
+        _NEIGHBORS[(width, height)] = table
+    return table
+
+
+def encode(game):
+    """Convert a board to the lightweight state used by the MCTS player: a
+    tuple (blocked, locs, to_move) where `blocked` is a bytearray with a
+    nonzero entry for each blocked cell, `locs` is a list of the cell
+    indices of the first and second player (-1 before their first move),
+    and `to_move` is the index (0 or 1) of the player to move.
+    """
+    blocked = bytearray(b"\x01") * (game.width * game.height)
+    for r, c in game.get_blank_spaces():
+        blocked[r + c * game.height] = 0
+    to_move = game.move_count % 2
+    players = [game.active_player, game.inactive_player]
+    if to_move:
+        players.reverse()
+    locs = []
+    for player in players:
+        loc = game.get_player_location(player)
+        locs.append(-1 if loc is None else loc[0] + loc[1] * game.height)
+    return blocked, locs, to_move
+
+
+# symmetries() and canonical_key() must be kept in sync with their
+# counterparts in isolation/isolation.py, which opening_book.py uses to key
+# the book this agent reads (see SymmetryTest in board_test.py)
+def symmetries(width, height):
+    """Return a pair of lists (permutations, inverses) for the symmetries of
+    a board of the given size, which all preserve knight moves. Each
+    permutation maps a cell index to the index of its image; the
+    symmetries are, in order: identity, column flip, row flip, half turn,
+    and on square boards only, transpose, quarter turn, three-quarter turn
+    and anti-transpose.
+    """
+    tables = _SYMMETRIES.get((width, height))
+    if tables is None:
+        h, w = height - 1, width - 1
+        maps = [lambda r, c: (r, c), lambda r, c: (r, w - c),
+                lambda r, c: (h - r, c), lambda r, c: (h - r, w - c)]
+        if width == height:
+            maps += [lambda r, c: (c, r), lambda r, c: (c, h - r),
+                     lambda r, c: (w - c, r), lambda r, c: (w - c, h - r)]
+        perms, inverses = [], []
+        for fn in maps:
+            perm = [0] * (width * height)
+            inverse = [0] * (width * height)
+            for idx in range(width * height):
+                r, c = fn(idx % height, idx // height)
+                perm[idx] = r + c * height
+                inverse[r + c * height] = idx
+            perms.append(perm)
+            inverses.append(inverse)
+        tables = _SYMMETRIES[(width, height)] = (perms, inverses)
+    return tables
 
-class SearchTimeout(Exception):
-    """Subclass base exception for code clarity. """
-    pass
 
+# must produce the same keys as isolation.isolation.canonical_key()
+def canonical_key(blocked, locs, width, height):
+    """Return a pair (key, symmetry) for a state in the form returned by
+    `encode()`. The key packs the blocked cells (one bit each) followed by
+    each player's location plus one (0 before the first move), and is the
+    smallest such key over the board's symmetries, so symmetric positions
+    share a key; `symmetry` is the index (into the lists returned by
+    `symmetries()`) of a symmetry that maps the state to its canonical form.
+    """
+    size = width * height
+    loc_bits = size.bit_length()
+    cells = [idx for idx, cell in enumerate(blocked) if cell]
+    best = None
+    for symmetry, perm in enumerate(symmetries(width, height)[0]):
+        key = 0
+        for idx in cells:
+            key |= 1 << perm[idx]
+        for player, loc in enumerate(locs):
+            if loc >= 0:
+                key |= (perm[loc] + 1) << (size + player * loc_bits)
+        if best is None or key < best[0]:
+            best = (key, symmetry)
+    return best
 
-def custom_score(game, player):
-    """Calculate the heuristic value of a game state from the point of view
-    of the given player.
 
-    This should be the best heuristic function for your project submission.
+def load_book(data):
+    """Load an opening book written by opening_book.py.
 
     Parameters
     ----------
-    game : `isolation.Board`
-        An instance of `isolation.Board` encoding the current state of the
-        game (e.g., player locations and blocked cells).
-
-    player : object
-        A player instance in the current game (i.e., an object corresponding to
-        one of the player objects `game.__player_1__` or `game.__player_2__`.)
+    data : dict, str or None
+        The parsed contents of the book file, the path of the file, or None
+        for no book.
 
     Returns
     -------
-    float
-        The heuristic value of the current game state to the specified player.
+    dict
+        A dict with the board size ("width", "height"), the number of plies
+        covered ("plies") and the "moves" table mapping each canonical
+        position key (see `canonical_key()`) to the canonical cell index of
+        the book move; an empty table if there is no book.
+    """
+    if data is None:
+        return {"width": 0, "height": 0, "plies": 0, "moves": {}}
+    if isinstance(data, str):
+        with open(data) as book_file:
+            data = json.load(book_file)
+    return {"width": data["width"], "height": data["height"],
+            "plies": data["plies"],
+            "moves": {int(key, 36): move for key, move in data["moves"].items()}}
+
+
+def legal_moves(blocked, locs, to_move, neighbors):
+    """Return the list of cell indices the player `to_move` can move to."""
+    loc = locs[to_move]
+    if loc < 0:
+        return [idx for idx, cell in enumerate(blocked) if not cell]
+    return [idx for idx in neighbors[loc] if not blocked[idx]]
+
+
+def rollout(blocked, locs, to_move, neighbors, rng=random):
+    """Play uniformly random moves from the given state until a player cannot
+    move, and return the index (0 or 1) of the winner. `blocked` and `locs`
+    are modified in place.
     """
-    raise NotImplementedError
+    choose = rng.random
+    while True:
+        loc = locs[to_move]
+        if loc < 0:
+            moves = [idx for idx, cell in enumerate(blocked) if not cell]
+        else:
+            moves = [idx for idx in neighbors[loc] if not blocked[idx]]
+        if not moves:
+            return 1 - to_move
+        move = moves[int(choose() * len(moves))]
+        blocked[move] = 1
+        locs[to_move] = move
+        to_move = 1 - to_move
+
+
+class Node:
+    """A node of the MCTS tree.
+
+    Parameters
+    ----------
+    move : int or None
+        The cell index moved to by the edge leading to this node.
+
+    parent : Node or None
+        The parent node; None for the root.
+
+    player : int
+        The index (0 or 1) of the player who made `move`; `wins` counts the
+        rollouts won by that player.
+
+    untried : list<int>
+        The legal moves from this node that have no child yet.
+    """
+    __slots__ = ("move", "parent", "player", "untried", "children",
+                 "visits", "wins")
+
+    def __init__(self, move, parent, player, untried):
+        self.move = move
+        self.parent = parent
+        self.player = player
+        self.untried = untried
+        self.children = []
+        self.visits = 0
+        self.wins = 0
+
+
+class SearchTimeout(Exception):
+    """Subclass base exception for code clarity. """
+    pass
 
 
 class CustomPlayer:
@@ -51,20 +219,52 @@ class CustomPlayer:
 
     Parameters
     ----------
-    data : string
-        The name of the search method to use in get_move().
+    data : dict or string (optional)
+        An opening book written by opening_book.py, either parsed from JSON
+        or as the path of the file. The book is loaded once; positions in
+        the book are answered without searching.
 
     timeout : float (optional)
         Time remaining (in milliseconds) when search is aborted.  Note that
         the PvP competition uses more accurate timers that are not cross-
         platform compatible, so a limit of 1ms (vs 10ms for the other classes)
         is generally sufficient.
+
+    exploration : float (optional)
+        The exploration constant C of the UCT formula
+        wins / visits + C * sqrt(ln(parent visits) / visits).
+
+    reuse_tree : bool (optional)
+        Keep the subtree below the opponent's reply between turns instead of
+        starting every search from an empty tree.
+
+    max_rollouts : int (optional)
+        Stop each search after this many rollouts even if time remains
+        (e.g., to search a fixed amount per position offline).
+
+    Notes
+    -----
+    The player runs Monte Carlo tree search with UCT selection. Rollouts
+    play uniformly random moves on a bytearray copy of the position (see
+    `encode()` and `rollout()`) rather than on `isolation.Board` objects.
+    After every call to get_move(), `rollouts` holds the number of rollouts
+    played and `rollouts_per_second` their rate, and `reused_visits` the
+    number of visits inherited from the previous turn's tree.
     """
 
-    def __init__(self, data=None, timeout=1.):
-        self.score = custom_score
+    def __init__(self, data=None, timeout=1., exploration=math.sqrt(2),
+                 reuse_tree=True, max_rollouts=None):
         self.time_left = None
         self.TIMER_THRESHOLD = timeout
+        self.exploration = exploration
+        self.reuse_tree = reuse_tree
+        self.max_rollouts = max_rollouts
+        self.rollouts = 0
+        self.rollouts_per_second = 0.
+        self.reused_visits = 0
+        self.book = load_book(data)
+        self._tree = None
+        self._tree_state = None
 
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
@@ -93,5 +293,111 @@ class CustomPlayer:
             Board coordinates corresponding to a legal move; may return
             (-1, -1) if there are no available legal moves.
         """
-        # OPTIONAL: Finish this function!
-        raise NotImplementedError
\ No newline at end of file
+        self.time_left = time_left
+        start = time_left()
+        neighbors = neighbor_table(game.width, game.height)
+        blocked, locs, to_move = encode(game)
+        moves = legal_moves(blocked, locs, to_move, neighbors)
+        if not moves:
+            return (-1, -1)
+
+        move = self.book_move(game, blocked, locs)
+        if move is not None and move in moves:
+            self._tree = self._tree_state = None
+            self.rollouts = 0
+            return (move % game.height, move // game.height)
+
+        root = self.reroot(blocked, locs, to_move)
+        if root is None:
+            random.shuffle(moves)
+            root = Node(None, None, 1 - to_move, moves)
+        self.reused_visits = root.visits
+
+        self.rollouts = 0
+        while (time_left() > self.TIMER_THRESHOLD and
+               (self.max_rollouts is None or self.rollouts < self.max_rollouts)):
+            self.search(root, blocked, locs, to_move, neighbors)
+            self.rollouts += 1
+        elapsed = (start - time_left()) / 1000.
+        self.rollouts_per_second = self.rollouts / elapsed if elapsed > 0 else 0.
+
+        if not root.children:
+            best = Node(random.choice(root.untried), root, to_move, [])
+        else:
+            best = max(root.children, key=lambda child: child.visits)
+        blocked[best.move] = 1
+        locs[to_move] = best.move
+        self._tree, self._tree_state = best, (blocked, locs, 1 - to_move)
+        return (best.move % game.height, best.move // game.height)
+
+    def book_move(self, game, blocked, locs):
+        """Return the cell index of the opening book move for the given state
+        of `game`, or None if the position is not in the book.
+        """
+        book = self.book
+        if (game.move_count >= book["plies"] or game.width != book["width"] or
+                game.height != book["height"]):
+            return None
+        key, symmetry = canonical_key(blocked, locs, game.width, game.height)
+        move = book["moves"].get(key)
+        if move is None:
+            return None
+        return symmetries(game.width, game.height)[1][symmetry][move]
+
+    def reroot(self, blocked, locs, to_move):
+        """Return the node of the previous turn's tree that matches the given
+        state (i.e., the child for the opponent's reply to our last move), or
+        None if the tree cannot be reused.
+        """
+        if not self.reuse_tree or self._tree is None:
+            return None
+        tree, (last_blocked, last_locs, last_to_move) = self._tree, self._tree_state
+        self._tree = self._tree_state = None
+        reply = locs[last_to_move]
+        if last_to_move == to_move or reply < 0 or last_blocked[reply]:
+            return None
+        last_blocked[reply] = 1
+        last_locs[last_to_move] = reply
+        if last_blocked != blocked or last_locs != locs:
+            return None
+        for child in tree.children:
+            if child.move == reply:
+                child.parent = None
+                return child
+        return None
+
+    def search(self, root, blocked, locs, to_move, neighbors):
+        """Run one MCTS iteration from `root`, whose state is (blocked, locs,
+        to_move): select a leaf by UCT, expand one untried move, play a
+        rollout from there and back up the result.
+        """
+        blocked = bytearray(blocked)
+        locs = list(locs)
+        node = root
+        exploration = self.exploration
+        while not node.untried and node.children:
+            log_visits = math.log(node.visits)
+            node = max(node.children, key=lambda child: (
+                child.wins / child.visits +
+                exploration * math.sqrt(log_visits / child.visits)))
+            blocked[node.move] = 1
+            locs[to_move] = node.move
+            to_move = 1 - to_move
+
+        if node.untried:
+            move = node.untried.pop()
+            blocked[move] = 1
+            locs[to_move] = move
+            to_move = 1 - to_move
+            untried = legal_moves(blocked, locs, to_move, neighbors)
+            random.shuffle(untried)
+            child = Node(move, node, 1 - to_move, untried)
+            node.children.append(child)
+            node = child
+
+        winner = rollout(blocked, locs, to_move, neighbors)
+        while node is not None:
+            node.visits += 1
+            if node.player == winner:
+                node.wins += 1
+            node = node.parent
\ No newline at end of file
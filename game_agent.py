@@ -2,7 +2,24 @@
 test your agent's strength against a set of known agents using tournament.py
 and include the results in your report.
 """
+import multiprocessing
+import queue
 import random
+import struct
+import time
+from collections import OrderedDict
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+
+from isolation.endgame import solve
+from isolation.isolation import knight_neighbors
+from isolation.tablebase import Tablebase
+from sample_players import improved_score
+
+try:
+    import numpy as np
+except ImportError:  # batched evaluation is unavailable without numpy
+    np = None
 
 
 class SearchTimeout(Exception):
@@ -10,6 +27,158 @@ class SearchTimeout(Exception):
     pass
 
 
+def forecast(game, move, in_place):
+    """Return the game state after the active player makes `move`. With
+    `in_place` the move is pushed onto `game` itself and must be undone with
+    `retract()` once the successor has been searched; otherwise a new board
+    is returned by `game.forecast_move()`.
+    """
+    if in_place:
+        game.push_move(move)
+        return game
+    return game.forecast_move(move)
+
+
+def retract(game, in_place):
+    """Undo the move made by the matching call to `forecast()`."""
+    if in_place:
+        game.pop_move()
+
+
+def onward_mobility(game, move, blank=None):
+    """Return the number of legal moves the active player would have after
+    moving to `move`, without making the move. `blank` is the board's
+    `blank_mask()`, if already known (e.g., when ranking all the moves of a
+    position).
+    """
+    height = game.height
+    if blank is None:
+        blank = game.blank_mask()
+    neighbors = knight_neighbors(game.width, height)[move[0] + move[1] * height]
+    return sum(blank >> idx & 1 for idx, _ in neighbors)
+
+
+# names of the per-cell features combined by WeightedEvaluator
+FEATURES = ("border", "centrality", "degree")
+
+# per-cell feature tables for each board size, shared by every evaluator
+_FEATURE_TABLES = {}
+
+
+def feature_tables(width, height):
+    """Return a dict mapping each feature name of `WeightedEvaluator` to a
+    list of the feature's value on every cell index of a board of the given
+    size. The tables are built once per board size and shared by all
+    callers.
+
+    - "border": the border term of the original heuristics, the sum over
+      the four sides of how many of the two outermost rows or columns away
+      from that side the cell lies in (0 to 2 each). Like those
+      heuristics, it compares rows with the width and columns with the
+      height, which only matters on boards that are not square.
+    - "centrality": the negated Manhattan distance from the board center.
+    - "degree": the number of knight moves from the cell on an empty board.
+    """
+    tables = _FEATURE_TABLES.get((width, height))
+    if tables is None:
+        neighbors = knight_neighbors(width, height)
+        cells = [(idx % height, idx // height) for idx in range(width * height)]
+        tables = {
+            "border": [min(max(2 - r, 0), 2) + min(max(3 + r - width, 0), 2) +
+                       min(max(2 - c, 0), 2) + min(max(3 + c - height, 0), 2)
+                       for r, c in cells],
+            "centrality": [-(abs(r - (height - 1) / 2) + abs(c - (width - 1) / 2))
+                           for r, c in cells],
+            "degree": [len(neighbors[idx]) for idx in range(width * height)],
+        }
+        _FEATURE_TABLES[(width, height)] = tables
+    return tables
+
+
+class WeightedEvaluator:
+    """Heuristic that scores a position for a player as a weighted sum of
+    both players' mobility and of per-cell features of both players'
+    locations, usable as the `score_fn` of any player.
+
+    The features (see `feature_tables()`) are combined with their weights
+    into one table per player and board size the first time a board of that
+    size is scored, so scoring a position takes two mobility queries and
+    two table lookups. Positions in which the player to move has no legal
+    moves score -inf or +inf as in the other heuristics, and the features
+    of a player that has not moved yet count as 0. With integer weights
+    the scores are exact.
+
+    Parameters
+    ----------
+    own_moves, opponent_moves : float (optional)
+        The weights of the player's and the opponent's number of legal
+        moves.
+
+    own, opponent : dict (optional)
+        The weights of the features of the player's and the opponent's
+        locations, keyed by feature name.
+    """
+    def __init__(self, own_moves=1, opponent_moves=-1, own=None,
+                 opponent=None):
+        self.own_moves = own_moves
+        self.opponent_moves = opponent_moves
+        self.own = dict(own or {})
+        self.opponent = dict(opponent or {})
+        unknown = (set(self.own) | set(self.opponent)) - set(FEATURES)
+        if unknown:
+            raise ValueError("Unknown features: {}".format(
+                ", ".join(sorted(unknown))))
+        self._tables = {}
+
+    def tables(self, width, height):
+        """Return the combined (player, opponent) cell tables for a board
+        of the given size."""
+        tables = self._tables.get((width, height))
+        if tables is None:
+            features = feature_tables(width, height)
+            tables = tuple(
+                [sum(weight * features[name][idx]
+                     for name, weight in sorted(weights.items()))
+                 for idx in range(width * height)]
+                for weights in (self.own, self.opponent))
+            self._tables[(width, height)] = tables
+        return tables
+
+    def __call__(self, game, player):
+        if player == game.active_player:
+            opponent = game.inactive_player
+            own_moves = game.mobility(player)
+            if not own_moves:
+                return float("-inf")
+            opp_moves = game.mobility(opponent)
+        else:
+            opponent = game.get_opponent(player)
+            opp_moves = game.mobility(opponent)
+            if not opp_moves:
+                return float("inf")
+            own_moves = game.mobility(player)
+
+        height = game.height
+        tables = self._tables.get((game.width, height))
+        if tables is None:
+            tables = self.tables(game.width, height)
+        own_table, opp_table = tables
+        score = self.own_moves * own_moves + self.opponent_moves * opp_moves
+        location = game.get_player_location(player)
+        if location is not None:
+            score += own_table[location[0] + location[1] * height]
+        location = game.get_player_location(opponent)
+        if location is not None:
+            score += opp_table[location[0] + location[1] * height]
+        return float(score)
+
+
+# the heuristics below as weight presets
+BORDER_BOTH = WeightedEvaluator(own={"border": -1}, opponent={"border": 1})
+BORDER_OPPONENT = WeightedEvaluator(opponent={"border": 1})
+BORDER_OWN = WeightedEvaluator(own={"border": -1})
+
+
 def custom_score(game, player):
     """Uses the improve score heuristic but also gives points for positions in the board
     where the opponent player is less than 2 squares away from the border.
@@ -37,31 +206,7 @@ def custom_score(game, player):
     float
         The heuristic value of the current game state to the specified player.
     """
-    if game.is_loser(player):
-        return float("-inf")
-
-    if game.is_winner(player):
-        return float("inf")
-
-    location = game.get_player_location(player)
-    borderx1_distance = min(max(2 - location[0], 0), 2)
-    borderx2_distance = min(max(3 + location[0] - game.width, 0), 2)
-    bordery1_distance = min(max(2 - location[1], 0), 2)
-    bordery2_distance = min(max(3 + location[1] - game.height, 0), 2)
-
-    total_player = borderx1_distance + borderx2_distance + bordery1_distance + bordery2_distance
-
-    location = game.get_player_location(game.get_opponent(player))
-    borderx1_distance = min(max(2 - location[0], 0), 2)
-    borderx2_distance = min(max(3 + location[0] - game.width, 0), 2)
-    bordery1_distance = min(max(2 - location[1], 0), 2)
-    bordery2_distance = min(max(3 + location[1] - game.height, 0), 2)
-
-    total_opponent = borderx1_distance + borderx2_distance + bordery1_distance + bordery2_distance
-
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
-    return float(own_moves - opp_moves + total_opponent - total_player)
+    return BORDER_BOTH(game, player)
 
 
 def custom_score_2(game, player):
@@ -89,23 +234,7 @@ def custom_score_2(game, player):
     float
         The heuristic value of the current game state to the specified player.
     """
-    if game.is_loser(player):
-        return float("-inf")
-
-    if game.is_winner(player):
-        return float("inf")
-
-    location = game.get_player_location(game.get_opponent(player))
-    borderx1_distance = min(max(2 - location[0], 0), 2)
-    borderx2_distance = min(max(3 + location[0] - game.width, 0), 2)
-    bordery1_distance = min(max(2 - location[1], 0), 2)
-    bordery2_distance = min(max(3 + location[1] - game.height, 0), 2)
-
-    total = borderx1_distance + borderx2_distance + bordery1_distance + bordery2_distance
-
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
-    return float(own_moves - opp_moves + total)
+    return BORDER_OPPONENT(game, player)
 
 
 def custom_score_3(game, player):
@@ -118,6 +247,119 @@ def custom_score_3(game, player):
     Note: this function should be called from within a Player instance as
     `self.score()` -- you should not need to call this function directly.
 
+    Parameters
+    ----------
+    game : `isolation.Board`
+        An instance of `isolation.Board` encoding the current state of the
+        game (e.g., player locations and blocked cells).
+
+    player : object
+        A player instance in the current game (i.e., an object corresponding to
+        one of the player objects `game.__player_1__` or `game.__player_2__`.)
+
+    Returns
+    -------
+    float
+        The heuristic value of the current game state to the specified player.
+    """
+    return BORDER_OWN(game, player)
+
+
+# masks of `territory()` for each board size: the bit offset of the
+# opponent's cells and the masks of the cells (of both players) that can
+# move one or two rows up or down
+_TERRITORY_MASKS = {}
+
+# factor applied to the territory difference once the players are walled off
+# from each other, when the regions can no longer change hands
+PARTITION_WEIGHT = 10
+
+
+def _territory_masks(width, height):
+    """Return the tuple (offset, up1, down1, up2, down2) used by territory()
+    on boards of the given size: the bit offset of the opponent's cells in
+    the packed int, and the masks of the cells (of both players) that can
+    move one or two rows up or down without leaving the board.
+    """
+    masks = _TERRITORY_MASKS.get((width, height))
+    if masks is None:
+        size = width * height
+        # two empty columns between the players' cells catch the bits
+        # shifted past the last column of the player's cells
+        offset = size + 2 * height
+
+        def rows(keep):
+            mask = sum(1 << idx for idx in range(size) if keep(idx % height))
+            return mask | mask << offset
+
+        masks = (offset,
+                 rows(lambda r: r < height - 1), rows(lambda r: r > 0),
+                 rows(lambda r: r < height - 2), rows(lambda r: r > 1))
+        _TERRITORY_MASKS[(width, height)] = masks
+    return masks
+
+
+def territory(game, player):
+    """Return a tuple (own, opponent, partitioned) of the numbers of blank
+    cells that `player` and its opponent can each reach before the other
+    (cells reached at the same time count for neither), and whether the two
+    players can no longer reach a common cell. Both players must have been
+    placed.
+
+    The cells are found by a breadth-first search of knight moves on the
+    bitmask of blank cells, advancing both players one move per step from
+    a single int holding the player's cells in its low bits and the
+    opponent's above them. A knight move is one row and two columns or two
+    rows and one column; the rows are shifted within the row masks and the
+    columns by shifting whole columns, which falls off the board or into
+    the gap between the two players' cells.
+    """
+    height = game.height
+    offset, up1, down1, up2, down2 = _territory_masks(game.width, height)
+
+    r, c = game.get_player_location(player)
+    own_start = 1 << (r + c * height)
+    r, c = game.get_player_location(game.get_opponent(player))
+    opp_start = 1 << (r + c * height)
+    free = game.blank_mask()
+    free |= free << offset
+    col1, col2 = height, 2 * height
+
+    # every cell is claimed at the step it is first reached, by one or both
+    # players, and leaves `free` at once; the search stops as soon as no
+    # front is left or every blank cell has been claimed
+    claimed = 0
+    front = own_start | opp_start << offset
+    while front and free:
+        cols1 = front << col1 | front >> col1
+        cols2 = front << col2 | front >> col2
+        front = ((cols2 & up1) << 1 | (cols2 & down1) >> 1 |
+                 (cols1 & up2) << 2 | (cols1 & down2) >> 2) & free
+        claimed |= front
+        free &= ~(front | front >> offset | front << offset)
+    own = claimed & ((1 << offset) - 1)
+    opp = claimed >> offset
+
+    # the players' regions only meet if both reach some cell at the same
+    # step or one of them can step into a cell claimed by the other
+    partitioned = False
+    if not own & opp:
+        front = own | own_start
+        cols1 = front << col1 | front >> col1
+        cols2 = front << col2 | front >> col2
+        partitioned = not ((cols2 & up1) << 1 | (cols2 & down1) >> 1 |
+                           (cols1 & up2) << 2 | (cols1 & down2) >> 2) & opp
+    own, opp = own & ~opp, opp & ~own
+    return bin(own).count("1"), bin(opp).count("1"), partitioned
+
+
+def territory_score(game, player):
+    """Score a position by territory: the number of blank cells the player
+    can reach before the opponent, minus the number the opponent can reach
+    first (see `territory()`), multiplied by `PARTITION_WEIGHT` once the
+    players are walled off from each other. Before both players have moved
+    it falls back to the difference in mobility.
+
     Parameters
     ----------
     game : `isolation.Board`
@@ -139,17 +381,444 @@ def custom_score_3(game, player):
     if game.is_winner(player):
         return float("inf")
 
-    location = game.get_player_location(player)
-    borderx1_distance = min(max(2 - location[0], 0), 2)
-    borderx2_distance = min(max(3 + location[0] - game.width, 0), 2)
-    bordery1_distance = min(max(2 - location[1], 0), 2)
-    bordery2_distance = min(max(3 + location[1] - game.height, 0), 2)
+    opponent = game.get_opponent(player)
+    if (game.get_player_location(player) is None or
+            game.get_player_location(opponent) is None):
+        return float(game.mobility(player) - game.mobility(opponent))
+
+    own, opp, partitioned = territory(game, player)
+    if partitioned:
+        return float(PARTITION_WEIGHT * (own - opp))
+    return float(own - opp)
+
+
+# batched versions of the heuristics above (and of the lecture's "improved"
+# score), mapping each score function to its (own_border, opponent_border)
+# weights: the score is the player's mobility minus the opponent's, plus
+# `opponent_border` times the opponent's border term, minus `own_border`
+# times the player's own; see batch_evaluate(). They score many positions at
+# once (e.g., to label the positions of a set of games); the search does not
+# use them. Stacking and scoring a batch costs as much as scoring about 25
+# positions one at a time, while alpha-beta only visits a fraction of the
+# leaves below a node, so batching whole depth-2 subtrees made depth 5-7
+# searches 1.5-2x slower (`python benchmark.py batch`).
+BATCH_HEURISTICS = {
+    improved_score: (0, 0),
+    custom_score: (1, 1),
+    custom_score_2: (0, 1),
+    custom_score_3: (1, 0),
+}
+
+
+# (knight neighbors, border term) lookup arrays of batch_evaluate() for each
+# board size, indexed by row-major cell index (row * width + col)
+_BATCH_TABLES = {}
+
+
+def _batch_tables(width, height):
+    """Return the lookup arrays of `batch_evaluate()` for a board size: the
+    (size, 8) array of the row-major indices of every cell's knight
+    neighbors, padded with the index `size` of an always-blocked cell, and
+    the border term of every cell.
+    """
+    tables = _BATCH_TABLES.get((width, height))
+    if tables is None:
+        size = width * height
+        neighbors = np.full((size, 8), size)
+        border = np.zeros(size)
+        cell_neighbors = knight_neighbors(width, height)
+        cell_border = feature_tables(width, height)["border"]
+        for idx in range(size):
+            r, c = idx % height, idx // height
+            cells = [nr * width + nc for _, (nr, nc) in cell_neighbors[idx]]
+            neighbors[r * width + c, :len(cells)] = cells
+            border[r * width + c] = cell_border[idx]
+        tables = neighbors, border
+        _BATCH_TABLES[(width, height)] = tables
+    return tables
+
+
+def _blocked_plane(game):
+    """Return the (height, width) boolean plane of the blocked cells."""
+    size = game.width * game.height
+    blank = np.frombuffer(game.blank_mask().to_bytes((size + 7) // 8, "little"),
+                          dtype=np.uint8)
+    # cell indices are row + col * height, so the bits list the cells
+    # column by column
+    bits = np.unpackbits(blank, count=size, bitorder="little")
+    return (bits == 0).reshape(game.width, game.height).T
+
+
+def _stack(game, player, blocked, first, second):
+    """Stack the positions in which the active player stands on the cells
+    `first` and the inactive player on the cells `second` (pairs of row and
+    column arrays), with those cells blocked in addition to `blocked`.
+    """
+    n = len(first[0])
+    batch = np.arange(n)
+    planes = np.zeros((n, 3, game.height, game.width), dtype=bool)
+    planes[:, 0] = blocked
+    planes[batch, 0, first[0], first[1]] = True
+    planes[batch, 0, second[0], second[1]] = True
+    mover = 1 if game.active_player == player else 2
+    planes[batch, mover, first[0], first[1]] = True
+    planes[batch, 3 - mover, second[0], second[1]] = True
+    return planes
+
+
+def stack_children(game, moves, player):
+    """Return the positions that follow each of the active player's `moves`
+    as a boolean array of shape (len(moves), 3, height, width) holding, for
+    each position, the planes of the blocked cells, of `player`'s location
+    and of its opponent's location. Both players must have been placed
+    before the moves (requires numpy).
+    """
+    n = len(moves)
+    r, c = game.get_player_location(game.inactive_player)
+    return _stack(game, player, _blocked_plane(game),
+                  (np.array([r for r, _ in moves]), np.array([c for _, c in moves])),
+                  (np.full(n, r), np.full(n, c)))
+
+
+def stack_grandchildren(game, moves, player):
+    """Return a pair (planes, lines) for the positions two plies below
+    `game`: `lines` lists every (move, reply) pair of one of the active
+    player's `moves` and a legal reply of the opponent, and `planes` stacks
+    the positions after each line as in `stack_children()`. Both players
+    must have been placed (requires numpy).
+    """
+    height = game.height
+    r, c = game.get_player_location(game.inactive_player)
+    neighbors = knight_neighbors(game.width, height)[r + c * height]
+    blank = game.blank_mask()
+    lines = [(move, reply) for move in moves
+             for idx, reply in neighbors
+             if blank >> idx & 1 and reply != move]
+    planes = _stack(game, player, _blocked_plane(game),
+                    (np.array([m[0] for m, _ in lines], dtype=int),
+                     np.array([m[1] for m, _ in lines], dtype=int)),
+                    (np.array([m[0] for _, m in lines], dtype=int),
+                     np.array([m[1] for _, m in lines], dtype=int)))
+    return planes, lines
+
+
+def batch_evaluate(planes, player_active, own_border=0, opponent_border=0):
+    """Score a batch of positions stacked by `stack_children()` for the
+    player of the second plane, returning a float array equal, position by
+    position, to the scalar heuristic of `BATCH_HEURISTICS` with the same
+    border weights.
 
-    total = borderx1_distance + borderx2_distance + bordery1_distance + bordery2_distance
+    Parameters
+    ----------
+    planes : numpy.ndarray
+        Boolean array of shape (n, 3, height, width).
+
+    player_active : bool
+        Whether the player is the one to move in the positions (which
+        decides whether a position without moves is a loss or a win).
+
+    own_border, opponent_border : int (optional)
+        The weights of the border terms of the player and the opponent.
+
+    Returns
+    -------
+    numpy.ndarray
+        The n scores.
+    """
+    n, _, height, width = planes.shape
+    size = height * width
+    neighbors, border = _batch_tables(width, height)
+    flat = planes.reshape(n, 3, size)
+    own = flat[:, 1].argmax(axis=1)
+    opp = flat[:, 2].argmax(axis=1)
+
+    # mobility: count the open cells a knight's move away, with an extra
+    # blocked cell standing in for the moves off the board
+    open_cells = np.zeros((n, size + 1), dtype=bool)
+    np.logical_not(flat[:, 0], out=open_cells[:, :size])
+    batch = np.arange(n)[:, None]
+    own_moves = open_cells[batch, neighbors[own]].sum(axis=1)
+    opp_moves = open_cells[batch, neighbors[opp]].sum(axis=1)
+
+    scores = (own_moves - opp_moves).astype(float)
+    if own_border:
+        scores -= own_border * border[own]
+    if opponent_border:
+        scores += opponent_border * border[opp]
+    if player_active:
+        scores[own_moves == 0] = float("-inf")
+    else:
+        scores[opp_moves == 0] = float("inf")
+    return scores
+
+
+# bound types of the scores stored in a TranspositionTable
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# width of the null windows used by principal variation search; scores are
+# floats, so any positive width smaller than the gap between distinct scores
+# makes the window empty
+NULL_WINDOW = 1e-6
+
+
+class TranspositionTable:
+    """Fixed-size cache of search results keyed by position hash (e.g., the
+    board's Zobrist key).
+
+    The table holds `max_entries` entries in buckets of two slots. The first
+    slot of each bucket is depth-preferred: it is only replaced by a result
+    from an equal or deeper search, and its previous entry is demoted to the
+    second slot. The second slot is always replaced.
+
+    Parameters
+    ----------
+    max_entries : int (optional)
+        The maximum number of entries held by the table.
+    """
+    def __init__(self, max_entries=2**16):
+        self.num_buckets = max(1, max_entries // 2)
+        self.clear()
+
+    def clear(self):
+        """Remove all entries and reset the hit/miss/collision counters."""
+        self._slots = [None] * (2 * self.num_buckets)
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    def probe(self, key):
+        """Return the entry stored for `key` as a tuple (key, depth, score,
+        bound, move), or None if the position is not in the table. A miss on
+        a bucket that holds other positions is counted as a collision.
+        """
+        idx = 2 * (key % self.num_buckets)
+        slots = self._slots
+        for entry in (slots[idx], slots[idx + 1]):
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry
+        self.misses += 1
+        if slots[idx] is not None:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        """Record the result of searching the position `key` to `depth`
+        plies. `bound` is one of EXACT, LOWER or UPPER, and `move` is the best
+        move found (or None).
+        """
+        idx = 2 * (key % self.num_buckets)
+        entry = (key, depth, score, bound, move)
+        deepest = self._slots[idx]
+        if deepest is None or depth >= deepest[1]:
+            if deepest is not None and deepest[0] != key:
+                self._slots[idx + 1] = deepest
+            self._slots[idx] = entry
+        else:
+            self._slots[idx + 1] = entry
+
+    def stats(self):
+        """Return a dict of the table size and probe counters."""
+        probes = self.hits + self.misses
+        return {"entries": sum(entry is not None for entry in self._slots),
+                "capacity": len(self._slots),
+                "hits": self.hits,
+                "misses": self.misses,
+                "collisions": self.collisions,
+                "hit_rate": self.hits / probes if probes else 0.}
+
+
+# layout of a SharedTranspositionTable slot: a check word (the position key
+# XORed with the two 64-bit words of the payload) followed by the payload:
+# score, depth, bound + 1 (0 marks an empty slot) and the move's row and
+# column (-1 for no move)
+_SHARED_TT_CHECK = struct.Struct("<Q")
+_SHARED_TT_PAYLOAD = struct.Struct("<dhBbb3x")
+_SHARED_TT_WORDS = struct.Struct("<QQ")
+_SHARED_TT_SLOT = _SHARED_TT_CHECK.size + _SHARED_TT_PAYLOAD.size
 
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
-    return float(own_moves - opp_moves - total)
+
+class SharedTranspositionTable:
+    """Transposition table stored in a `multiprocessing.shared_memory` block
+    so that several processes can read and write the same entries.
+
+    The table has the interface and the bucket layout of
+    `TranspositionTable`, but every entry is packed into a fixed-size
+    24-byte slot. Slots are read and written without locks; a torn slot
+    (one written by two processes at once) fails the check-word test and is
+    treated as empty. The hit/miss/collision counters are per process.
+
+    Keys must fit in 64 bits (e.g., `Board.zobrist_key`).
+
+    Parameters
+    ----------
+    max_entries : int (optional)
+        The maximum number of entries held by the table.
+
+    name : str (optional)
+        The name of an existing table's shared memory block to attach to;
+        by default a new block is created. Unpickling a table attaches to
+        the block of the original.
+    """
+    def __init__(self, max_entries=2**16, name=None):
+        self.num_buckets = max(1, max_entries // 2)
+        size = 2 * self.num_buckets * _SHARED_TT_SLOT
+        self._owner = name is None
+        self._shm = shared_memory.SharedMemory(name=name, create=self._owner,
+                                               size=size)
+        if not self._owner:
+            # only the creating process may unlink the block
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        self.name = self._shm.name
+        self._size = size
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    def __getstate__(self):
+        return {"max_entries": 2 * self.num_buckets, "name": self.name}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def close(self):
+        """Detach from the shared memory block, and free it if this table
+        created it."""
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def clear(self):
+        """Remove all entries and reset the hit/miss/collision counters."""
+        self._shm.buf[:self._size] = bytes(self._size)
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    def _read(self, slot):
+        """Return the entry in `slot` as a tuple (key, depth, score, bound,
+        move), or None if the slot is empty or torn."""
+        offset = slot * _SHARED_TT_SLOT
+        raw = bytes(self._shm.buf[offset:offset + _SHARED_TT_SLOT])
+        score, depth, bound, row, col = _SHARED_TT_PAYLOAD.unpack_from(raw, 8)
+        if not bound:
+            return None
+        check, = _SHARED_TT_CHECK.unpack_from(raw)
+        low, high = _SHARED_TT_WORDS.unpack_from(raw, 8)
+        return (check ^ low ^ high, depth, score, bound - 1,
+                None if row < 0 else (row, col))
+
+    def _write(self, slot, key, depth, score, bound, move):
+        row, col = (-1, -1) if move is None else move
+        payload = _SHARED_TT_PAYLOAD.pack(score, depth, bound + 1, row, col)
+        low, high = _SHARED_TT_WORDS.unpack(payload)
+        offset = slot * _SHARED_TT_SLOT
+        self._shm.buf[offset:offset + _SHARED_TT_SLOT] = \
+            _SHARED_TT_CHECK.pack(key ^ low ^ high) + payload
+
+    def probe(self, key):
+        """Return the entry stored for `key` as a tuple (key, depth, score,
+        bound, move), or None if the position is not in the table. A miss on
+        a bucket that holds other positions is counted as a collision.
+        """
+        idx = 2 * (key % self.num_buckets)
+        first = self._read(idx)
+        for entry in (first, self._read(idx + 1)):
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry
+        self.misses += 1
+        if first is not None:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        """Record the result of searching the position `key` to `depth`
+        plies. `bound` is one of EXACT, LOWER or UPPER, and `move` is the best
+        move found (or None).
+        """
+        idx = 2 * (key % self.num_buckets)
+        deepest = self._read(idx)
+        if deepest is None or depth >= deepest[1]:
+            if deepest is not None and deepest[0] != key:
+                self._write(idx + 1, *deepest)
+            self._write(idx, key, depth, score, bound, move)
+        else:
+            self._write(idx + 1, key, depth, score, bound, move)
+
+    def stats(self):
+        """Return a dict of the table size and probe counters."""
+        probes = self.hits + self.misses
+        buf = self._shm.buf
+        # the bound byte sits 10 bytes into each slot's payload
+        entries = sum(1 for offset in range(18, self._size, _SHARED_TT_SLOT)
+                      if buf[offset])
+        return {"entries": entries,
+                "capacity": 2 * self.num_buckets,
+                "hits": self.hits,
+                "misses": self.misses,
+                "collisions": self.collisions,
+                "hit_rate": self.hits / probes if probes else 0.}
+
+
+class EvalCache:
+    """Bounded cache of heuristic scores that wraps a score function and can
+    be passed as the `score_fn` of any player.
+
+    Scores are keyed by the board's Zobrist key and the player whose point
+    of view is scored, and the least recently used entry is evicted when
+    the cache is full. Re-searches (PVS, aspiration windows) score the same
+    leaves again, and the search for the player's next move reaches many
+    leaves of the previous one two plies shallower, so the cache may be
+    kept across calls to get_move() during a game; call `clear()` between
+    games (`AlphaBetaPlayer.new_game()` does).
+
+    Parameters
+    ----------
+    score_fn : callable
+        The score function whose results are cached; it must only depend
+        on the position and the player.
+
+    max_entries : int (optional)
+        The maximum number of scores held by the cache.
+    """
+    def __init__(self, score_fn, max_entries=2**16):
+        self.score_fn = score_fn
+        self.max_entries = max_entries
+        self.clear()
+
+    def __call__(self, game, player):
+        key = (game.zobrist_key, player)
+        entries = self._entries
+        score = entries.get(key)
+        if score is not None:
+            entries.move_to_end(key)
+            self.hits += 1
+            return score
+        self.misses += 1
+        score = self.score_fn(game, player)
+        entries[key] = score
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return score
+
+    def clear(self):
+        """Remove all entries and reset the hit/miss/eviction counters."""
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """Return a dict of the cache size and lookup counters."""
+        lookups = self.hits + self.misses
+        return {"entries": len(self._entries),
+                "capacity": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.}
 
 
 class IsolationPlayer:
@@ -185,7 +854,18 @@ class MinimaxPlayer(IsolationPlayer):
     """Game-playing agent that chooses a move using depth-limited minimax
     search. You must finish and test this player to make sure it properly uses
     minimax to return a good move before the search time limit expires.
+
+    Parameters
+    ----------
+    in_place : bool (optional)
+        Search by pushing and popping moves on a single scratch copy of the
+        board (`Board.push_move()`/`Board.pop_move()`) instead of creating a
+        new board with `forecast_move()` at every node.
     """
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.,
+                 in_place=False):
+        super().__init__(search_depth, score_fn, timeout)
+        self.in_place = in_place
 
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
@@ -216,6 +896,9 @@ class MinimaxPlayer(IsolationPlayer):
             (-1, -1) if there are no available legal moves.
         """
         self.time_left = time_left
+        if self.in_place:
+            # a timeout can leave moves pushed on the board being searched
+            game = game.copy()
 
         # Initialize the best move so that this function returns something
         # in case the search fails due to timeout
@@ -277,8 +960,9 @@ class MinimaxPlayer(IsolationPlayer):
         current_solution = (-1, -1)
         current_score = float('-inf')
         for m in game.get_legal_moves():
-            new_board = game.forecast_move(m)
+            new_board = forecast(game, m, self.in_place)
             new_score = self.min_value(new_board, depth - 1)
+            retract(game, self.in_place)
             if new_score > current_score:
                 current_score = new_score
                 current_solution = m
@@ -295,8 +979,9 @@ class MinimaxPlayer(IsolationPlayer):
 
         current_score = float('-inf')
         for m in game.get_legal_moves():
-            new_board = game.forecast_move(m)
+            new_board = forecast(game, m, self.in_place)
             current_score = max(current_score, self.min_value(new_board, depth - 1))
+            retract(game, self.in_place)
         return current_score
 
     def min_value(self, game, depth):
@@ -309,11 +994,11 @@ class MinimaxPlayer(IsolationPlayer):
 
         current_score = float('inf')
         for m in game.get_legal_moves():
-            new_board = game.forecast_move(m)
+            new_board = forecast(game, m, self.in_place)
             current_score = min(current_score, self.max_value(new_board, depth - 1))
+            retract(game, self.in_place)
         return current_score
 
-
     def terminal_test(self, depth):
         if depth == 0:
             return True
@@ -327,7 +1012,113 @@ class AlphaBetaPlayer(IsolationPlayer):
     """Game-playing agent that chooses a move using iterative deepening minimax
     search with alpha-beta pruning. You must finish and test this player to
     make sure it returns a good move before the search time limit expires.
+
+    Parameters
+    ----------
+    in_place : bool (optional)
+        Search by pushing and popping moves on a single scratch copy of the
+        board (`Board.push_move()`/`Board.pop_move()`) instead of creating a
+        new board with `forecast_move()` at every node.
+
+    tt_size : int (optional)
+        The maximum number of entries in a transposition table that caches
+        search results by the board's Zobrist key; 0 disables the table. The
+        table persists across calls to get_move() and is cleared when a new
+        game is detected.
+
+    symmetric_tt : bool (optional)
+        Key the transposition table by the symmetry-canonical position key
+        (`Board.canonical()`) instead of the Zobrist key, so that positions
+        related by a board symmetry share entries; table moves are stored in
+        the canonical orientation. The canonical key is much slower to
+        compute than the incremental Zobrist key, so this pays off mainly in
+        the opening, where symmetric positions are common.
+
+    move_ordering : bool (optional)
+        Search the principal variation of the previous iterative deepening
+        iteration first, then the transposition table move, then the other
+        moves by decreasing onward mobility (at nodes more than one ply
+        above the leaves).
+
+    killers : bool (optional)
+        Order moves at interior nodes using two killer-move slots per ply
+        and a history table indexed by (player, destination), both updated
+        on beta cutoffs. The tables are aged at the start of every call to
+        get_move(): history scores are halved and killers move up two plies.
+
+    search : {'alphabeta', 'pvs'} (optional)
+        The search algorithm below the root: 'alphabeta' uses the separate
+        max_value/min_value functions, 'pvs' uses principal variation search
+        (NegaScout) in negamax form, which searches the first move of every
+        node with the full window and the others with null windows,
+        re-searching only the moves that fail high.
+
+    aspiration_window : float (optional)
+        Half-width of the aspiration window centered on the previous
+        iteration's score for every iterative deepening step after the
+        first; None always searches with the full window.
+
+    aspiration_growth : float (optional)
+        Factor applied to the half-width on the failing side of the window
+        after each fail-low or fail-high.
+
+    aspiration_tries : int (optional)
+        The number of failed searches on one side of the window after which
+        that side is opened to infinity.
+
+    endgame_cells : int (optional)
+        Treat every position in which the players can no longer reach a
+        common cell, and neither player's region has more than this many
+        cells, as terminal and score it exactly with the longest-path solver
+        in `isolation.endgame`; at the root, play the solver's move without
+        searching. 0 disables the solver.
+
+    tablebase : isolation.tablebase.Tablebase or str (optional)
+        An endgame tablebase (or the path of a tablebase file) probed at the
+        leaves of the search: positions it covers are scored exactly
+        instead of with the heuristic. At the root, the tablebase move is
+        played without searching.
+
+    eval_cache_size : int (optional)
+        Wrap the score function in an `EvalCache` of this many entries,
+        kept across calls to get_move() and cleared when a new game is
+        detected; 0 scores every leaf afresh.
     """
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.,
+                 in_place=False, tt_size=0, move_ordering=False, killers=False,
+                 search="alphabeta", aspiration_window=None,
+                 aspiration_growth=2., aspiration_tries=2, endgame_cells=0,
+                 symmetric_tt=False, tablebase=None, eval_cache_size=0):
+        if eval_cache_size:
+            score_fn = EvalCache(score_fn, eval_cache_size)
+        super().__init__(search_depth, score_fn, timeout)
+        self.endgame_cells = endgame_cells
+        self.endgame_hits = 0
+        if isinstance(tablebase, str):
+            tablebase = Tablebase(tablebase)
+        self.tablebase = tablebase
+        self.tablebase_hits = 0
+        if search not in ("alphabeta", "pvs"):
+            raise ValueError("Unknown search algorithm: {}".format(search))
+        self.search = search
+        self.researches = 0
+        self.aspiration_window = aspiration_window
+        self.aspiration_growth = aspiration_growth
+        self.aspiration_tries = aspiration_tries
+        self.aspiration_researches = 0
+        self.in_place = in_place
+        self.tt = TranspositionTable(tt_size) if tt_size else None
+        self.symmetric_tt = symmetric_tt
+        self.move_ordering = move_ordering
+        self.killers = killers
+        self.nodes = 0
+        self._last_move_count = 0
+        self._root_depth = 0
+        self._pv = []
+        self._pv_table = []
+        self._follow_pv = False
+        self._killers = []
+        self._history = {}
 
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
@@ -360,14 +1151,23 @@ class AlphaBetaPlayer(IsolationPlayer):
             (-1, -1) if there are no available legal moves.
         """
         self.time_left = time_left
+        if self.in_place:
+            # a timeout can leave moves pushed on the board being searched
+            game = game.copy()
+        self.start_search(game)
+
+        move = self.exact_move(game)
+        if move is not None:
+            return move
 
         best_move = (-1, -1)
 
         try:
             depth = 0
+            score = None
             while True:
                 depth += 1
-                best_move = self.alphabeta(game, depth=depth)
+                best_move, score = self.aspiration_search(game, depth, score)
         except SearchTimeout:
             # Handle any actions required at timeout, if necessary
             pass
@@ -421,19 +1221,260 @@ class AlphaBetaPlayer(IsolationPlayer):
                 testing.
         """
 
+        return self.search_root(game, depth, alpha, beta)[0]
+
+    def search_root(self, game, depth, alpha=float("-inf"), beta=float("inf"),
+                    moves=None):
+        """Search the root of the game tree to `depth` plies in the window
+        (alpha, beta) and return a pair (move, score). The score fails soft:
+        it is an upper bound if it is not above alpha and a lower bound if it
+        is not below beta. The move is (-1, -1) if there are no legal moves.
+
+        If `moves` is given only those root moves are searched, and the
+        result is not stored in the transposition table.
+        """
         if self.time_left() < self.TIMER_THRESHOLD:
             raise SearchTimeout()
 
-        current_solution = (-1, -1)
-        current_score = float('-inf')
-        for m in game.get_legal_moves():
-            new_board = game.forecast_move(m)
-            current_score = self.min_value(new_board, depth - 1, alpha, beta)
+        self.nodes += 1
+        self._root_depth = depth
+        self._pv_table = [[] for _ in range(depth + 1)]
+        if len(self._killers) < depth:
+            self._killers += [[None, None]
+                              for _ in range(depth - len(self._killers))]
+        self._follow_pv = self.move_ordering and bool(self._pv)
+
+        tt_move = None
+        if self.tt is not None:
+            _, tt_move = self.tt_probe(game, depth, alpha, beta)
+        alpha_orig = alpha
+
+        best_move = (-1, -1)
+        best_score = float('-inf')
+        store = moves is None
+        if moves is None:
+            moves = game.get_legal_moves()
+        moves = self.order_moves(game, list(moves), depth, tt_move)
+        for idx, m in enumerate(moves):
+            new_board = forecast(game, m, self.in_place)
+            if self.search == "pvs":
+                current_score = self.scout(new_board, depth, alpha, beta, idx == 0)
+            else:
+                current_score = self.min_value(new_board, depth - 1, alpha, beta)
+            retract(game, self.in_place)
+            self._follow_pv = False
+            if current_score > best_score or best_move == (-1, -1):
+                best_move, best_score = m, current_score
             if current_score > alpha:
-                current_solution = m
                 alpha = current_score
+                if self.move_ordering:
+                    self._update_pv(0, depth, m)
+            if alpha >= beta:
+                break
+
+        if self.tt is not None and store and best_move != (-1, -1):
+            self.tt_store(game, depth, alpha_orig, beta, best_score, best_move)
+        if self._pv_table[0]:
+            self._pv = self._pv_table[0]
+        return best_move, best_score
+
+    def aspiration_search(self, game, depth, guess=None):
+        """Search the root to `depth` plies in an aspiration window around
+        `guess`, the score of the previous iteration, and return a pair
+        (move, score).
+
+        A search that fails low (or high) is repeated with the lower (or
+        upper) side of the window widened by `aspiration_growth`, and that
+        side is opened completely after `aspiration_tries` failures. Without
+        `aspiration_window`, or without a finite guess, the full window is
+        searched once.
+        """
+        inf = float("inf")
+        if self.aspiration_window is None or guess is None or abs(guess) == inf:
+            return self.search_root(game, depth)
+
+        below = above = self.aspiration_window
+        fails_low = fails_high = 0
+        while True:
+            alpha = guess - below if fails_low < self.aspiration_tries else -inf
+            beta = guess + above if fails_high < self.aspiration_tries else inf
+            move, score = self.search_root(game, depth, alpha, beta)
+            if (alpha < score or alpha == -inf) and (score < beta or beta == inf):
+                return move, score
+            self.aspiration_researches += 1
+            if score <= alpha:
+                fails_low += 1
+                below *= self.aspiration_growth
+            else:
+                fails_high += 1
+                above *= self.aspiration_growth
+
+    def start_search(self, game):
+        """Prepare the state kept between calls to get_move() for a search
+        from `game`: start over if a new game has begun, otherwise age the
+        killer and history tables by the number of moves played since the
+        last search.
+        """
+        if game.move_count < self._last_move_count:
+            self.new_game()
+        elif self.killers:
+            self.age_tables(game.move_count - self._last_move_count)
+        self._last_move_count = game.move_count
+        self._pv = []
+
+    def new_game(self):
+        """Discard the state kept between calls to get_move() (e.g., the
+        transposition table) because a new game has started.
+        """
+        self._pv = []
+        self._killers = []
+        self._history = {}
+        if self.tt is not None:
+            self.tt.clear()
+        if isinstance(self.score, EvalCache):
+            self.score.clear()
+
+    def age_tables(self, plies):
+        """Age the killer and history tables between searches from positions
+        `plies` moves apart: history scores are halved and the killer slots
+        move up by `plies` so that they stay aligned with the game position.
+        """
+        self._killers = self._killers[plies:]
+        self._history = {key: value // 2
+                         for key, value in self._history.items() if value > 1}
+
+    def tt_probe(self, game, depth, alpha, beta):
+        """Look up `game` in the transposition table. Return a pair (score,
+        move) where score is the stored score if it is usable at `depth` in
+        the window (alpha, beta) and None otherwise, and move is the stored
+        best move (or None).
+        """
+        key, transform = self.tt_key(game)
+        entry = self.tt.probe(key)
+        if entry is None:
+            return None, None
+        _, tt_depth, tt_score, bound, tt_move = entry
+        if transform is not None and tt_move is not None:
+            tt_move = game.from_canonical_move(tt_move, transform)
+        if tt_depth >= depth and (bound == EXACT or
+                                  (bound == LOWER and tt_score >= beta) or
+                                  (bound == UPPER and tt_score <= alpha)):
+            return tt_score, tt_move
+        return None, tt_move
+
+    def tt_store(self, game, depth, alpha, beta, score, move):
+        """Store the score of a node searched in the window (alpha, beta)."""
+        if score <= alpha:
+            bound = UPPER
+        elif score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        key, transform = self.tt_key(game)
+        if transform is not None and move is not None:
+            move = game.to_canonical_move(move, transform)
+        self.tt.store(key, depth, score, bound, move)
+
+    def tt_key(self, game):
+        """Return a pair (key, transform) locating `game` in the
+        transposition table: the canonical key and the symmetry mapping
+        `game` onto it with `symmetric_tt`, otherwise the Zobrist key and
+        None.
+        """
+        if self.symmetric_tt:
+            return game.canonical()
+        return game.zobrist_key, None
+
+    def order_moves(self, game, moves, depth, tt_move=None):
+        """Return the list of legal `moves` of `game` in the order they should
+        be searched at a node with `depth` plies left to search.
+
+        The transposition table move (if any) always goes first. With
+        `move_ordering` the moves are first sorted by decreasing onward
+        mobility. With `killers` they are then (stably) sorted by decreasing
+        history score and the killer moves for the ply are brought to the
+        front. Finally the table move and, with `move_ordering`, the move of
+        the previous iteration's principal variation go first.
+        """
+        ply = self._root_depth - depth
+        if self.move_ordering and depth > 1:
+            blank = game.blank_mask()
+            moves.sort(key=lambda m: onward_mobility(game, m, blank),
+                       reverse=True)
+        if self.killers:
+            history = self._history
+            side = game.active_player == self
+            moves.sort(key=lambda m: history.get((side, m), 0), reverse=True)
+            killer_1, killer_2 = self._killers[ply]
+            self._move_to_front(moves, killer_2)
+            self._move_to_front(moves, killer_1)
+        self._move_to_front(moves, tt_move)
+        if self._follow_pv:
+            if ply < len(self._pv) and self._pv[ply] in moves:
+                self._move_to_front(moves, self._pv[ply])
+            else:
+                self._follow_pv = False
+        return moves
+
+    def record_cutoff(self, game, depth, move):
+        """Update the killer and history tables after `move` caused a beta
+        cutoff at a node of `game` with `depth` plies left to search.
+        """
+        killers = self._killers[self._root_depth - depth]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        key = (game.active_player == self, move)
+        self._history[key] = self._history.get(key, 0) + depth * depth
+
+    def _update_pv(self, ply, depth, move):
+        """Record `move` followed by the best line below it as the principal
+        variation from `ply`.
+        """
+        self._pv_table[ply] = [move] + (self._pv_table[ply + 1] if depth > 1 else [])
 
-        return current_solution
+    def endgame_value(self, game):
+        """Return the exact value (+/- infinity) of a partitioned position
+        for this player, or None if the solver does not apply.
+        """
+        solution = solve(game, self.endgame_cells)
+        if solution is None:
+            return None
+        self.endgame_hits += 1
+        return float("inf") if solution[0] == self else float("-inf")
+
+    def exact_move(self, game):
+        """Return the move of the endgame solver or the tablebase for a root
+        position one of them covers, or None to search the position.
+        """
+        if self.endgame_cells:
+            solution = solve(game, self.endgame_cells)
+            if solution is not None:
+                return solution[1]
+        if self.tablebase is not None:
+            return self.tablebase.best_move(game)
+        return None
+
+    def leaf_score(self, game):
+        """Return the score of a leaf of the search for this player: the
+        exact value (+/- infinity) if the tablebase covers the position,
+        the heuristic score otherwise.
+        """
+        if self.tablebase is not None:
+            entry = self.tablebase.probe(game)
+            if entry is not None:
+                self.tablebase_hits += 1
+                if entry[0] == (game.active_player == self):
+                    return float("inf")
+                return float("-inf")
+        return self.score(game, self)
+
+    @staticmethod
+    def _move_to_front(moves, move):
+        """Move `move` to the front of the list `moves` if it is present."""
+        if move is not None and move in moves:
+            moves.remove(move)
+            moves.insert(0, move)
 
 
     def max_value(self, game, depth, alpha, beta):
@@ -441,17 +1482,44 @@ class AlphaBetaPlayer(IsolationPlayer):
         if self.time_left() < self.TIMER_THRESHOLD:
             raise SearchTimeout()
 
+        self.nodes += 1
+        if self.endgame_cells:
+            value = self.endgame_value(game)
+            if value is not None:
+                return value
         if self.terminal_test(depth):
-            return self.score(game, self)
+            return self.leaf_score(game)
+
+        if self.move_ordering:
+            ply = self._root_depth - depth
+            self._pv_table[ply] = []
+
+        tt_move = None
+        if self.tt is not None:
+            tt_score, tt_move = self.tt_probe(game, depth, alpha, beta)
+            if tt_score is not None:
+                return tt_score
+            alpha_orig = alpha
 
         current_score = float('-inf')
-        for m in game.get_legal_moves():
-            new_board = game.forecast_move(m)
-            current_score = max(current_score, self.min_value(new_board, depth - 1, alpha, beta))
+        best_move = None
+        for m in self.order_moves(game, game.get_legal_moves(), depth, tt_move):
+            new_board = forecast(game, m, self.in_place)
+            new_score = self.min_value(new_board, depth - 1, alpha, beta)
+            retract(game, self.in_place)
+            self._follow_pv = False
+            if new_score > current_score:
+                current_score, best_move = new_score, m
+                if self.move_ordering:
+                    self._update_pv(ply, depth, m)
             if current_score >= beta:
-                return current_score
+                if self.killers:
+                    self.record_cutoff(game, depth, m)
+                break
             alpha = max(alpha, current_score)
 
+        if self.tt is not None:
+            self.tt_store(game, depth, alpha_orig, beta, current_score, best_move)
         return current_score
 
 
@@ -460,22 +1528,547 @@ class AlphaBetaPlayer(IsolationPlayer):
         if self.time_left() < self.TIMER_THRESHOLD:
             raise SearchTimeout()
 
+        self.nodes += 1
+        if self.endgame_cells:
+            value = self.endgame_value(game)
+            if value is not None:
+                return value
         if self.terminal_test(depth):
-            return self.score(game, self)
+            return self.leaf_score(game)
+
+        if self.move_ordering:
+            ply = self._root_depth - depth
+            self._pv_table[ply] = []
+
+        tt_move = None
+        if self.tt is not None:
+            tt_score, tt_move = self.tt_probe(game, depth, alpha, beta)
+            if tt_score is not None:
+                return tt_score
+            beta_orig = beta
 
         current_score = float('inf')
-        for m in game.get_legal_moves():
-            new_board = game.forecast_move(m)
-            current_score = min(current_score, self.max_value(new_board, depth - 1, alpha, beta))
+        best_move = None
+        for m in self.order_moves(game, game.get_legal_moves(), depth, tt_move):
+            new_board = forecast(game, m, self.in_place)
+            new_score = self.max_value(new_board, depth - 1, alpha, beta)
+            retract(game, self.in_place)
+            self._follow_pv = False
+            if new_score < current_score:
+                current_score, best_move = new_score, m
+                if self.move_ordering:
+                    self._update_pv(ply, depth, m)
             if current_score <= alpha:
-                return current_score
+                if self.killers:
+                    self.record_cutoff(game, depth, m)
+                break
             beta = min(beta, current_score)
 
+        if self.tt is not None:
+            self.tt_store(game, depth, alpha, beta_orig, current_score, best_move)
+        return current_score
+
+
+    def pvs(self, game, depth, alpha, beta):
+        """Principal variation search in negamax form. Return the value of
+        `game` searched to `depth` plies from the perspective of the active
+        player, failing soft outside the window (alpha, beta).
+        """
+        if self.time_left() < self.TIMER_THRESHOLD:
+            raise SearchTimeout()
+
+        self.nodes += 1
+        if self.endgame_cells:
+            value = self.endgame_value(game)
+            if value is not None:
+                return value if game.active_player == self else -value
+        if self.terminal_test(depth):
+            score = self.leaf_score(game)
+            return score if game.active_player == self else -score
+
+        ply = self._root_depth - depth
+        if self.move_ordering:
+            self._pv_table[ply] = []
+
+        tt_move = None
+        if self.tt is not None:
+            tt_score, tt_move = self.tt_probe(game, depth, alpha, beta)
+            if tt_score is not None:
+                return tt_score
+            alpha_orig = alpha
+
+        current_score = float('-inf')
+        best_move = None
+        moves = self.order_moves(game, game.get_legal_moves(), depth, tt_move)
+        for idx, m in enumerate(moves):
+            new_board = forecast(game, m, self.in_place)
+            new_score = self.scout(new_board, depth, alpha, beta, idx == 0)
+            retract(game, self.in_place)
+            self._follow_pv = False
+            if new_score > current_score:
+                current_score, best_move = new_score, m
+                if self.move_ordering:
+                    self._update_pv(ply, depth, m)
+            if current_score >= beta:
+                if self.killers:
+                    self.record_cutoff(game, depth, m)
+                break
+            alpha = max(alpha, current_score)
+
+        if self.tt is not None:
+            self.tt_store(game, depth, alpha_orig, beta, current_score, best_move)
         return current_score
 
+    def scout(self, child, depth, alpha, beta, first):
+        """Search the successor `child` of a node with `depth` plies left and
+        window (alpha, beta), returning its value from the parent's point of
+        view. The first move is searched with the full window; later moves
+        get a null window and are re-searched only if they fail high.
+        """
+        if first or alpha == float('-inf'):
+            return -self.pvs(child, depth - 1, -beta, -alpha)
+        score = -self.pvs(child, depth - 1, -alpha - NULL_WINDOW, -alpha)
+        if alpha < score < beta:
+            self.researches += 1
+            score = -self.pvs(child, depth - 1, -beta, -alpha)
+        return score
 
     def terminal_test(self, depth):
         if depth == 0:
             return True
         else:
             return False
+
+
+# stand-ins for the players of a position sent to a root-splitting worker
+SEARCHER = "searcher"
+OPPONENT = "opponent"
+
+
+def relabel(game, searcher, opponent):
+    """Return a copy of `game` in which `searcher` is the player to move and
+    `opponent` the other player."""
+    if game.move_count % 2 == 0:
+        return game.copy_with_players(searcher, opponent)
+    return game.copy_with_players(opponent, searcher)
+
+
+# the searcher of each root-splitting worker process, created by the pool
+# initializer
+_root_split_worker = None
+
+
+def _init_root_split_worker(config, shared):
+    global _root_split_worker
+    _root_split_worker = RootSplitWorker(shared, **config)
+
+
+def _search_root_move(game, move, depth, deadline, generation):
+    return _root_split_worker.search_move(game, move, depth, deadline,
+                                          generation)
+
+
+class RootSplitWorker(AlphaBetaPlayer):
+    """The searcher run by each worker process of a ParallelAlphaBetaPlayer.
+
+    Every task searches the subtree of one root move. The best exact root
+    score found so far by any worker is kept in `shared`, a lock-protected
+    array of two doubles (search generation, alpha), and is read again at
+    every node where the opponent moves so that cutoffs found by one worker
+    immediately narrow the windows of the others.
+
+    Parameters
+    ----------
+    shared : multiprocessing.Array
+        The (generation, alpha) pair shared by the parent and all workers.
+
+    **kwargs
+        The AlphaBetaPlayer options of the parent player.
+    """
+    def __init__(self, shared, **kwargs):
+        super().__init__(**kwargs)
+        self._shared = shared
+        self._generation = 0
+        self._alpha_seen = float("-inf")
+
+    def shared_alpha(self):
+        """Return the best root score published for the current search
+        generation, remembering the largest value applied so far."""
+        generation, alpha = self._shared[0], self._shared[1]
+        if generation != self._generation:
+            return float("-inf")
+        self._alpha_seen = max(self._alpha_seen, alpha)
+        return alpha
+
+    def search_move(self, game, move, depth, deadline, generation):
+        """Search root move `move` of `game` (whose players are SEARCHER and
+        OPPONENT) to `depth` plies, stopping at `deadline` (a
+        time.monotonic() value).
+
+        Returns
+        -------
+        (float or None, int)
+            The exact score of the move (-inf if the search only proved that
+            the move is no better than the shared alpha, None if it timed
+            out) and the number of nodes searched.
+        """
+        game = relabel(game, self, OPPONENT)
+        self.time_left = lambda: (1000. * (deadline - time.monotonic()) +
+                                  self.TIMER_THRESHOLD)
+        self.start_search(game)
+        self._generation = generation
+        self._alpha_seen = float("-inf")
+        nodes = self.nodes
+        try:
+            _, score = self.search_root(game, depth, self.shared_alpha(),
+                                        moves=[move])
+        except SearchTimeout:
+            return None, self.nodes - nodes
+        if score <= self._alpha_seen and self._alpha_seen != float("-inf"):
+            return float("-inf"), self.nodes - nodes
+        with self._shared.get_lock():
+            if self._shared[0] == generation and score > self._shared[1]:
+                self._shared[1] = score
+        return score, self.nodes - nodes
+
+    def min_value(self, game, depth, alpha, beta):
+        return super().min_value(game, depth, max(alpha, self.shared_alpha()),
+                                 beta)
+
+    def pvs(self, game, depth, alpha, beta):
+        if game.active_player != self:
+            beta = min(beta, -self.shared_alpha())
+        return super().pvs(game, depth, alpha, beta)
+
+
+class ParallelAlphaBetaPlayer(AlphaBetaPlayer):
+    """Game-playing agent that splits the root of an iterative deepening
+    alpha-beta search across a persistent pool of worker processes.
+
+    Each iteration searches the best move of the previous iteration first
+    and then, once its score is known, all the other root moves in parallel
+    (young brothers wait at the root). Workers publish exact root scores in
+    shared memory and use the best of them as alpha at every node where the
+    opponent moves. All processes stop at the deadline derived from
+    `time_left` when get_move() is called, and the move of the last complete
+    iteration is returned, or the first legal move if none completed.
+
+    The pool is started when the player is created, because forking the
+    workers can take tens of milliseconds, and is reused for every move;
+    call close() to stop it (get_move() restarts it if needed). Each worker
+    keeps its own transposition and killer tables between moves.
+
+    Parameters
+    ----------
+    workers : int (optional)
+        The number of worker processes; defaults to the number of CPUs.
+
+    **kwargs
+        AlphaBetaPlayer options (e.g., `move_ordering`, `tt_size`) used by
+        the searcher in every worker.
+    """
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.,
+                 workers=None, **kwargs):
+        super().__init__(search_depth, score_fn, timeout, **kwargs)
+        self.workers = workers or multiprocessing.cpu_count()
+        self._config = dict(kwargs, search_depth=search_depth,
+                            score_fn=score_fn, timeout=timeout)
+        self._pool = None
+        self._shared = None
+        self._generation = 0
+        self.start()
+
+    def start(self):
+        """Start the worker pool if it is not running."""
+        if self._pool is None:
+            self._shared = multiprocessing.Array("d", [0., float("-inf")])
+            self._pool = multiprocessing.Pool(
+                self.workers, initializer=_init_root_split_worker,
+                initargs=(self._config, self._shared))
+
+    def close(self):
+        """Stop the worker pool."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+            self._shared = None
+
+    def get_move(self, game, time_left):
+        """Search for the best move with the worker pool and return it
+        before the time limit expires.
+
+        Parameters
+        ----------
+        game : `isolation.Board`
+            An instance of `isolation.Board` encoding the current state of the
+            game (e.g., player locations and blocked cells).
+
+        time_left : callable
+            A function that returns the number of milliseconds left in the
+            current turn. Returning with any less than 0 ms remaining forfeits
+            the game.
+
+        Returns
+        -------
+        (int, int)
+            Board coordinates corresponding to a legal move; may return
+            (-1, -1) if there are no available legal moves.
+        """
+        self.time_left = time_left
+        deadline = time.monotonic() + (time_left() - self.TIMER_THRESHOLD) / 1000.
+        moves = game.get_legal_moves()
+        if not moves:
+            return (-1, -1)
+        move = self.exact_move(game)
+        if move is not None:
+            return move
+        self.start()
+
+        best_move = moves[0]
+        depth = 0
+        while (depth < len(game.get_blank_spaces()) and
+               time.monotonic() < deadline):
+            depth += 1
+            scores = self.split_root(game, depth, deadline, moves)
+            if scores is None:
+                break
+            moves.sort(key=lambda m: -scores[m])
+            best_move = moves[0]
+            if abs(scores[best_move]) == float("inf"):
+                break
+        return best_move
+
+    def split_root(self, game, depth, deadline, moves=None):
+        """Search every root move of `game` to `depth` plies on the worker
+        pool, searching the first move (e.g., the previous best) before the
+        others.
+
+        Returns
+        -------
+        dict or None
+            A dict mapping each move to its score, where a move that was
+            shown to be no better than the best move scores -inf; None if
+            the deadline (a time.monotonic() value) passed first.
+        """
+        if moves is None:
+            moves = game.get_legal_moves()
+        root = relabel(game, SEARCHER, OPPONENT)
+        self._generation += 1
+        with self._shared.get_lock():
+            self._shared[1] = float("-inf")
+            self._shared[0] = self._generation
+
+        def submit(m):
+            return self._pool.apply_async(
+                _search_root_move, (root, m, depth, deadline, self._generation))
+
+        scores = {}
+        pending = [(moves[0], submit(moves[0]))]
+        while pending:
+            for m, result in pending:
+                try:
+                    score, nodes = result.get(
+                        max(0., deadline - time.monotonic()))
+                except multiprocessing.TimeoutError:
+                    return None
+                if score is None:
+                    return None
+                self.nodes += nodes
+                scores[m] = score
+            pending = [(m, submit(m)) for m in moves if m not in scores]
+        return scores
+
+
+def _lazy_smp_worker(index, config, tt, tasks, results):
+    # forked helpers would otherwise share the parent's move order
+    random.seed()
+    helper = LazySMPHelper(index, tt, **config)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        helper.search_until(*task, results=results)
+
+
+class LazySMPHelper(AlphaBetaPlayer):
+    """The searcher run by each helper process of a LazySMPPlayer.
+
+    Helpers run iterative deepening on the parent's position until the
+    deadline, sharing the parent's transposition table. Odd-numbered helpers
+    search one ply deeper at each iteration than even-numbered ones, and
+    every helper generates moves in its own random order, so the helpers
+    spread out over the tree and fill the shared table with results the
+    other searchers need next.
+
+    Parameters
+    ----------
+    index : int
+        The number of the helper, from 0.
+
+    tt : SharedTranspositionTable
+        The table shared with the parent player.
+
+    **kwargs
+        The AlphaBetaPlayer options of the parent player.
+    """
+    def __init__(self, index, tt, **kwargs):
+        super().__init__(**kwargs)
+        self.index = index
+        self.tt = tt
+
+    def new_game(self):
+        # the shared table is cleared by the parent player
+        tt, self.tt = self.tt, None
+        super().new_game()
+        self.tt = tt
+
+    def search_until(self, generation, game, deadline, results):
+        """Search `game` (whose players are SEARCHER and OPPONENT) by
+        iterative deepening until `deadline` (a time.monotonic() value),
+        putting a tuple (generation, depth, move, score) on the `results`
+        queue after every completed iteration.
+        """
+        game = relabel(game, self, OPPONENT)
+        self.time_left = lambda: (1000. * (deadline - time.monotonic()) +
+                                  self.TIMER_THRESHOLD)
+        self.start_search(game)
+        depth = self.index % 2
+        try:
+            while depth < len(game.get_blank_spaces()):
+                depth += 1
+                move, score = self.search_root(game, depth)
+                results.put((generation, depth, move, score))
+        except SearchTimeout:
+            pass
+
+
+class LazySMPPlayer(AlphaBetaPlayer):
+    """Game-playing agent that runs the iterative deepening alpha-beta search
+    of AlphaBetaPlayer together with helper processes searching the same
+    position (Lazy SMP).
+
+    The searchers share no work explicitly: they all use one
+    SharedTranspositionTable, so cutoffs, scores and best moves found by any
+    of them are reused by the others, which lets the main search reach a
+    greater depth in the same time. The helpers search with different depth
+    offsets and move orders (see LazySMPHelper). The move returned is that
+    of the deepest iteration completed by any searcher, preferring the main
+    search on ties, or the first legal move if none completed.
+
+    The helper processes are started when the player is created and reused
+    for every move; call close() to stop them and free the shared table.
+
+    Parameters
+    ----------
+    workers : int (optional)
+        The number of helper processes; defaults to one less than the number
+        of CPUs.
+
+    tt_size : int (optional)
+        The number of entries of the shared transposition table.
+
+    **kwargs
+        AlphaBetaPlayer options (e.g., `move_ordering`) used by the main
+        search and every helper.
+    """
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.,
+                 workers=None, tt_size=2**16, **kwargs):
+        super().__init__(search_depth, score_fn, timeout, **kwargs)
+        if workers is None:
+            workers = max(1, multiprocessing.cpu_count() - 1)
+        self.workers = workers
+        self.tt = SharedTranspositionTable(tt_size)
+        self.completed_depth = 0
+        self._config = dict(kwargs, search_depth=search_depth,
+                            score_fn=score_fn, timeout=timeout)
+        self._processes = []
+        self._tasks = []
+        self._results = None
+        self._generation = 0
+        self.start()
+
+    def start(self):
+        """Start the helper processes if they are not running."""
+        if self._processes:
+            return
+        self._results = multiprocessing.Queue()
+        for index in range(self.workers):
+            tasks = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=_lazy_smp_worker, daemon=True,
+                args=(index, self._config, self.tt, tasks, self._results))
+            process.start()
+            self._tasks.append(tasks)
+            self._processes.append(process)
+
+    def close(self):
+        """Stop the helper processes and free the shared table."""
+        for tasks in self._tasks:
+            tasks.put(None)
+        for process in self._processes:
+            process.join()
+        self._processes = []
+        self._tasks = []
+        self.tt.close()
+
+    def get_move(self, game, time_left):
+        """Search for the best move together with the helper processes and
+        return it before the time limit expires.
+
+        Parameters
+        ----------
+        game : `isolation.Board`
+            An instance of `isolation.Board` encoding the current state of the
+            game (e.g., player locations and blocked cells).
+
+        time_left : callable
+            A function that returns the number of milliseconds left in the
+            current turn. Returning with any less than 0 ms remaining forfeits
+            the game.
+
+        Returns
+        -------
+        (int, int)
+            Board coordinates corresponding to a legal move; may return
+            (-1, -1) if there are no available legal moves.
+        """
+        self.time_left = time_left
+        deadline = time.monotonic() + (time_left() - self.TIMER_THRESHOLD) / 1000.
+        if self.in_place:
+            # a timeout can leave moves pushed on the board being searched
+            game = game.copy()
+        self.start_search(game)
+
+        move = self.exact_move(game)
+        if move is not None:
+            return move
+
+        self._generation += 1
+        root = relabel(game, SEARCHER, OPPONENT)
+        for tasks in self._tasks:
+            tasks.put((self._generation, root, deadline))
+
+        # fall back on any legal move if no iteration completes in time
+        moves = game.get_legal_moves()
+        best_move = moves[0] if moves else (-1, -1)
+        self.completed_depth = 0
+        try:
+            depth = 0
+            score = None
+            while True:
+                depth += 1
+                best_move, score = self.aspiration_search(game, depth, score)
+                self.completed_depth = depth
+        except SearchTimeout:
+            pass
+
+        while True:
+            try:
+                generation, depth, move, _ = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if (generation == self._generation and depth > self.completed_depth
+                    and move != (-1, -1)):
+                best_move, self.completed_depth = move, depth
+        return best_move
@@ -10,6 +10,10 @@ import random
 
 import math
 
+from game_agent import BORDER_BOTH
+from game_agent import BORDER_OPPONENT
+from game_agent import BORDER_OWN
+
 
 class Timeout(Exception):
     """Subclass base exception for code clarity."""
@@ -35,32 +39,7 @@ def heuristic3(game, player):
     float
         The heuristic value of the current game state to the specified player.
     """
-
-    if game.is_loser(player):
-        return float("-inf")
-
-    if game.is_winner(player):
-        return float("inf")
-
-    location = game.get_player_location(player)
-    borderx1_distance = min(max(2 - location[0], 0), 2)
-    borderx2_distance = min(max(3 + location[0] - game.width, 0), 2)
-    bordery1_distance = min(max(2 - location[1], 0), 2)
-    bordery2_distance = min(max(3 + location[1] - game.height, 0), 2)
-
-    total_player = borderx1_distance + borderx2_distance + bordery1_distance + bordery2_distance
-
-    location = game.get_player_location(game.get_opponent(player))
-    borderx1_distance = min(max(2 - location[0], 0), 2)
-    borderx2_distance = min(max(3 + location[0] - game.width, 0), 2)
-    bordery1_distance = min(max(2 - location[1], 0), 2)
-    bordery2_distance = min(max(3 + location[1] - game.height, 0), 2)
-
-    total_opponent = borderx1_distance + borderx2_distance + bordery1_distance + bordery2_distance
-
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
-    return float(own_moves - opp_moves + total_opponent - total_player)
+    return BORDER_BOTH(game, player)
 
 
 def heuristic2(game, player):
@@ -82,24 +61,7 @@ def heuristic2(game, player):
     float
         The heuristic value of the current game state to the specified player.
     """
-
-    if game.is_loser(player):
-        return float("-inf")
-
-    if game.is_winner(player):
-        return float("inf")
-
-    location = game.get_player_location(game.get_opponent(player))
-    borderx1_distance = min(max(2 - location[0], 0), 2)
-    borderx2_distance = min(max(3 + location[0] - game.width, 0), 2)
-    bordery1_distance = min(max(2 - location[1], 0), 2)
-    bordery2_distance = min(max(3 + location[1] - game.height, 0), 2)
-
-    total = borderx1_distance + borderx2_distance + bordery1_distance + bordery2_distance
-
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
-    return float(own_moves - opp_moves + total)
+    return BORDER_OPPONENT(game, player)
 
 
 def heuristic1(game, player):
@@ -121,24 +83,7 @@ def heuristic1(game, player):
     float
         The heuristic value of the current game state to the specified player.
     """
-
-    if game.is_loser(player):
-        return float("-inf")
-
-    if game.is_winner(player):
-        return float("inf")
-
-    location = game.get_player_location(player)
-    borderx1_distance = min(max(2 - location[0], 0), 2)
-    borderx2_distance = min(max(3 + location[0] - game.width, 0), 2)
-    bordery1_distance = min(max(2 - location[1], 0), 2)
-    bordery2_distance = min(max(3 + location[1] - game.height, 0), 2)
-
-    total = borderx1_distance + borderx2_distance + bordery1_distance + bordery2_distance
-
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
-    return float(own_moves - opp_moves - total)
+    return BORDER_OWN(game, player)
 
 
 def custom_score(game, player):
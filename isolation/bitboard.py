@@ -0,0 +1,377 @@
+"""
+This file contains the `BitBoard` class, an alternative engine for the
+knight-move Isolation game that stores the blocked cells and the player
+locations as integer bitmasks rather than as a list of cells.
+
+Cells use the same indexing as `isolation.Board` (``row + col * height``), so
+bit ``i`` of every mask corresponds to ``_board_state[i]`` on the list-backed
+board. Copying a `BitBoard` only copies a handful of ints, which makes
+`forecast_move` much cheaper than on the list-backed board.
+"""
+import random
+
+from .isolation import Board
+from .isolation import zobrist_keys
+
+_KNIGHT_DIRECTIONS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                      (1, -2), (1, 2), (2, -1), (2, 1)]
+
+# knight attack masks shared by every board of the same size
+_ATTACK_MASKS = {}
+
+# (shift, source mask) pairs of the eight knight moves for each board size
+_KNIGHT_SHIFTS = {}
+
+
+def attack_masks(width, height):
+    """Return a list mapping each cell index on a board of the given size to
+    the bitmask of the cells a knight can reach from it. The tables are built
+    once per board size and shared by all callers.
+    """
+    masks = _ATTACK_MASKS.get((width, height))
+    if masks is None:
+        masks = []
+        for idx in range(width * height):
+            r, c = idx % height, idx // height
+            mask = 0
+            for dr, dc in _KNIGHT_DIRECTIONS:
+                if 0 <= r + dr < height and 0 <= c + dc < width:
+                    mask |= 1 << (r + dr + (c + dc) * height)
+            masks.append(mask)
+        _ATTACK_MASKS[(width, height)] = masks
+    return masks
+
+
+def knight_shifts(width, height):
+    """Return a list of (shift, source mask) pairs, one per knight move
+    direction, for a board of the given size. Shifting the cells of a mask
+    that lie in the source mask by `shift` bits (left for positive shifts)
+    moves every one of them by that knight move without leaving the board.
+    """
+    shifts = _KNIGHT_SHIFTS.get((width, height))
+    if shifts is None:
+        shifts = []
+        for dr, dc in _KNIGHT_DIRECTIONS:
+            source = 0
+            for idx in range(width * height):
+                r, c = idx % height, idx // height
+                if 0 <= r + dr < height and 0 <= c + dc < width:
+                    source |= 1 << idx
+            shifts.append((dr + dc * height, source))
+        _KNIGHT_SHIFTS[(width, height)] = shifts
+    return shifts
+
+
+def knight_spread(mask, shifts):
+    """Return the mask of every cell one knight move away from a cell of
+    `mask`, using the direction table returned by `knight_shifts()`.
+    """
+    spread = 0
+    for shift, source in shifts:
+        if shift > 0:
+            spread |= (mask & source) << shift
+        else:
+            spread |= (mask & source) >> -shift
+    return spread
+
+
+def flood_fill(start, blank, width, height):
+    """Return the mask of the cells of `blank` that can be reached from any
+    cell of `start` by a sequence of knight moves through cells of `blank`.
+    """
+    shifts = knight_shifts(width, height)
+    reached = 0
+    frontier = start
+    while frontier:
+        frontier = knight_spread(frontier, shifts) & blank & ~reached
+        reached |= frontier
+    return reached
+
+
+class BitBoard(Board):
+    """Implement the knight-move Isolation rules on top of integer bitmasks.
+
+    `BitBoard` is a drop-in replacement for `isolation.Board`; it exposes the
+    same public interface and may be selected for any game by constructing it
+    in place of `Board`.
+
+    Parameters
+    ----------
+    player_1 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    player_2 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    width : int (optional)
+        The number of columns that the board should have.
+
+    height : int (optional)
+        The number of rows that the board should have.
+    """
+
+    def __init__(self, player_1, player_2, width=7, height=7):
+        # Board.__init__ is deliberately not called; it would allocate the
+        # list-backed state that this engine replaces.
+        self.width = width
+        self.height = height
+        self.move_count = 0
+        self._player_1 = player_1
+        self._player_2 = player_2
+        self._active_player = player_1
+        self._inactive_player = player_2
+
+        self._attacks = attack_masks(width, height)
+        self._full = (1 << (width * height)) - 1
+        self._blocked = 0
+        # single-bit masks of each player's location; 0 before the first move
+        self._p1_loc = 0
+        self._p2_loc = 0
+
+        self._zobrist_keys = zobrist_keys(width, height)
+        self._zobrist = 0
+
+        # (move, previous location, previous key) for each move applied
+        # with push_move()
+        self._undo_stack = []
+
+    def hash(self):
+        return self._zobrist
+
+    @property
+    def zobrist_key(self):
+        """A 64-bit Zobrist key identifying the blocked cells, the location
+        of each player and the player to move (see `Board.zobrist_key`).
+        Every change to the masks goes through `apply_move()` or
+        `pop_move()`, so the key is always current.
+        """
+        return self._zobrist
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_attacks"], state["_zobrist_keys"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._attacks = attack_masks(self.width, self.height)
+        self._zobrist_keys = zobrist_keys(self.width, self.height)
+
+    def copy(self):
+        """ Return a deep copy of the current board. """
+        new_board = BitBoard(self._player_1, self._player_2,
+                             width=self.width, height=self.height)
+        new_board.move_count = self.move_count
+        new_board._active_player = self._active_player
+        new_board._inactive_player = self._inactive_player
+        new_board._blocked = self._blocked
+        new_board._p1_loc = self._p1_loc
+        new_board._p2_loc = self._p2_loc
+        new_board._zobrist = self._zobrist
+        return new_board
+
+    def move_is_legal(self, move):
+        """Test whether a move is legal in the current game state.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+
+        Returns
+        -------
+        bool
+            Returns True if the move is legal, False otherwise
+        """
+        return (0 <= move[0] < self.height and 0 <= move[1] < self.width and
+                not self._blocked >> (move[0] + move[1] * self.height) & 1)
+
+    def get_blank_spaces(self):
+        """Return a list of the locations that are still available on the board.
+        """
+        return self._mask_to_moves(self._full & ~self._blocked)
+
+    def blank_mask(self):
+        """Return an int with bit `row + col * height` set for every blank
+        cell on the board.
+        """
+        return self._full & ~self._blocked
+
+    def get_player_location(self, player):
+        """Find the current location of the specified player on the board.
+
+        Parameters
+        ----------
+        player : object
+            An object registered as a player in the current game.
+
+        Returns
+        -------
+        (int, int) or None
+            The coordinate pair (row, column) of the input player, or None
+            if the player has not moved.
+        """
+        if player == self._player_1:
+            loc = self._p1_loc
+        elif player == self._player_2:
+            loc = self._p2_loc
+        else:
+            raise RuntimeError(
+                "Invalid player in get_player_location: {}".format(player))
+        if not loc:
+            return Board.NOT_MOVED
+        idx = loc.bit_length() - 1
+        return (idx % self.height, idx // self.height)
+
+    def get_legal_moves(self, player=None):
+        """Return the list of all legal moves for the specified player.
+
+        Parameters
+        ----------
+        player : object (optional)
+            An object registered as a player in the current game. If None,
+            return the legal moves for the active player on the board.
+
+        Returns
+        -------
+        list<(int, int)>
+            The list of coordinate pairs (row, column) of all legal moves
+            for the player constrained by the current game state.
+        """
+        if player is None:
+            player = self._active_player
+        loc = self._p1_loc if player == self._player_1 else self._p2_loc
+        if not loc:
+            return self.get_blank_spaces()
+        valid_moves = self._mask_to_moves(
+            self._attacks[loc.bit_length() - 1] & ~self._blocked)
+        random.shuffle(valid_moves)
+        return valid_moves
+
+    def mobility(self, player):
+        """Return the number of legal moves of the specified player, i.e.,
+        `len(self.get_legal_moves(player))`, without generating the moves.
+
+        Parameters
+        ----------
+        player : object
+            An object registered as a player in the current game.
+
+        Returns
+        -------
+        int
+            The number of legal moves of the player.
+        """
+        if player == self._player_1:
+            loc = self._p1_loc
+        elif player == self._player_2:
+            loc = self._p2_loc
+        else:
+            raise RuntimeError(
+                "Invalid player in mobility: {}".format(player))
+        if not loc:
+            return bin(self._full & ~self._blocked).count("1")
+        return bin(self._attacks[loc.bit_length() - 1] &
+                   ~self._blocked).count("1")
+
+    def apply_move(self, move):
+        """Move the active player to a specified location.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+        """
+        idx = move[0] + move[1] * self.height
+        bit = 1 << idx
+        if self._active_player == self._player_1:
+            last_loc, loc_keys = self._p1_loc, self._zobrist_keys[1]
+            self._p1_loc = bit
+        else:
+            last_loc, loc_keys = self._p2_loc, self._zobrist_keys[2]
+            self._p2_loc = bit
+        if last_loc:
+            self._zobrist ^= loc_keys[last_loc.bit_length() - 1]
+        self._zobrist ^= (self._zobrist_keys[0][idx] ^ loc_keys[idx] ^
+                          self._zobrist_keys[3])
+        self._blocked |= bit
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+        self.move_count += 1
+
+    def push_move(self, move):
+        """Move the active player to a specified location in place, recording
+        enough information for `pop_move()` to restore the current state.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+        """
+        if self._active_player == self._player_1:
+            self._undo_stack.append((move, self._p1_loc, self._zobrist))
+        else:
+            self._undo_stack.append((move, self._p2_loc, self._zobrist))
+        self.apply_move(move)
+
+    def pop_move(self):
+        """Undo the most recent move applied with `push_move()`, restoring the
+        board, the player order and the move count exactly.
+
+        Returns
+        -------
+        (int, int)
+            The move that was undone.
+        """
+        move, last_loc, self._zobrist = self._undo_stack.pop()
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+        if self._active_player == self._player_1:
+            self._p1_loc = last_loc
+        else:
+            self._p2_loc = last_loc
+        self._blocked &= ~(1 << (move[0] + move[1] * self.height))
+        self.move_count -= 1
+        return move
+
+    def to_string(self, symbols=['1', '2']):
+        """Generate a string representation of the current game state, marking
+        the location of each player and indicating which cells have been
+        blocked, and which remain open.
+        """
+        col_margin = len(str(self.height - 1)) + 1
+        prefix = "{:<" + "{}".format(col_margin) + "}"
+        offset = " " * (col_margin + 3)
+        out = offset + '   '.join(map(str, range(self.width))) + '\n\r'
+        for i in range(self.height):
+            out += prefix.format(i) + ' | '
+            for j in range(self.width):
+                bit = 1 << (i + j * self.height)
+                if not self._blocked & bit:
+                    out += ' '
+                elif self._p1_loc == bit:
+                    out += symbols[0]
+                elif self._p2_loc == bit:
+                    out += symbols[1]
+                else:
+                    out += '-'
+                out += ' | '
+            out += '\n\r'
+
+        return out
+
+    def _mask_to_moves(self, mask):
+        """Convert a bitmask of cells to a list of (row, column) pairs in
+        increasing cell index order.
+        """
+        moves = []
+        height = self.height
+        while mask:
+            low = mask & -mask
+            idx = low.bit_length() - 1
+            moves.append((idx % height, idx // height))
+            mask ^= low
+        return moves
@@ -0,0 +1,133 @@
+"""
+This file contains an exact solver for partitioned Isolation positions.
+
+Once no blank cell can be reached by both players, the two knights can no
+longer interfere with each other and the game reduces to a single-agent
+problem: each player makes as many moves as the longest knight's path through
+its own region allows, and the player to move loses if its path is not
+strictly longer than its opponent's. The solver detects that case with a
+flood fill over the blank cells and computes both longest paths with a
+memoized depth-first search on bitmasks, using the same cell indexing
+(``row + col * height``) as the board engines.
+"""
+import functools
+
+from .bitboard import attack_masks
+from .bitboard import flood_fill
+from .bitboard import knight_shifts
+from .bitboard import knight_spread
+
+
+def _popcount(mask):
+    return bin(mask).count("1")
+
+
+def separate_regions(game, max_cells=None):
+    """Return a pair (active region, inactive region) of cell masks holding
+    the blank cells each player can still reach, or None if some blank cell
+    can be reached by both players, if a player has not been placed yet, or
+    if either region has more than `max_cells` cells.
+
+    Both regions are grown one knight move at a time, so the search stops as
+    soon as they meet, which is cheap in open positions.
+    """
+    active_loc = game.get_player_location(game.active_player)
+    inactive_loc = game.get_player_location(game.inactive_player)
+    if active_loc is None or inactive_loc is None:
+        return None
+
+    height = game.height
+    blank = game.blank_mask()
+    shifts = knight_shifts(game.width, height)
+    active_front = 1 << (active_loc[0] + active_loc[1] * height)
+    inactive_front = 1 << (inactive_loc[0] + inactive_loc[1] * height)
+    active_region = inactive_region = 0
+    while active_front or inactive_front:
+        active_front = knight_spread(active_front, shifts) & blank & ~active_region
+        active_region |= active_front
+        inactive_front = knight_spread(inactive_front, shifts) & blank & ~inactive_region
+        inactive_region |= inactive_front
+        if active_region & inactive_region:
+            return None
+        if max_cells is not None and (_popcount(active_region) > max_cells or
+                                      _popcount(inactive_region) > max_cells):
+            return None
+    return active_region, inactive_region
+
+
+@functools.lru_cache(maxsize=2**18)
+def longest_path(idx, region, width, height):
+    """Return the largest number of knight moves that can be made from cell
+    `idx` visiting distinct cells of the mask `region` (which must not
+    contain `idx`).
+
+    Each successor is searched on the part of the region it can still
+    reach, which both bounds the search (a path cannot be longer than the
+    reachable region) and lets transpositions share cache entries.
+    """
+    attacks = attack_masks(width, height)
+    moves = attacks[idx] & region
+    size = _popcount(region)
+    best = 0
+    while moves and best < size:
+        low = moves & -moves
+        moves ^= low
+        reach = flood_fill(low, region & ~low, width, height)
+        if 1 + _popcount(reach) <= best:
+            continue
+        best = max(best, 1 + longest_path(low.bit_length() - 1, reach,
+                                          width, height))
+    return best
+
+
+def solve(game, max_cells=None):
+    """Solve a partitioned position exactly.
+
+    Parameters
+    ----------
+    game : isolation.Board
+        The position to solve; any board engine with `blank_mask()`.
+
+    max_cells : int (optional)
+        Give up (return None) if either player's region has more cells than
+        this, to bound the time spent in the solver.
+
+    Returns
+    -------
+    (object, (int, int), int, int) or None
+        None if the players are not separated (or a region is too large);
+        otherwise a tuple (winner, move, active length, inactive length):
+        the player who wins with best play, a move for the active player
+        that starts one of its longest paths ((-1, -1) if it has no legal
+        moves), and the lengths of both players' longest paths.
+    """
+    regions = separate_regions(game, max_cells)
+    if regions is None:
+        return None
+    active_region, inactive_region = regions
+    width, height = game.width, game.height
+    attacks = attack_masks(width, height)
+
+    r, c = game.get_player_location(game.active_player)
+    moves = attacks[r + c * height] & active_region
+    active_length, best_move = 0, (-1, -1)
+    while moves:
+        low = moves & -moves
+        moves ^= low
+        idx = low.bit_length() - 1
+        rest = active_region & ~low
+        length = 1 + longest_path(idx, flood_fill(low, rest, width, height),
+                                  width, height)
+        if length > active_length:
+            active_length, best_move = length, (idx % height, idx // height)
+
+    r, c = game.get_player_location(game.inactive_player)
+    inactive_length = longest_path(r + c * height, inactive_region,
+                                   width, height)
+
+    # the active player moves first, so it runs out of moves first on a tie
+    if active_length > inactive_length:
+        winner = game.active_player
+    else:
+        winner = game.inactive_player
+    return winner, best_move, active_length, inactive_length
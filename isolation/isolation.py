@@ -8,11 +8,140 @@ remain compatible with the defaults provided, and none of your changes will
 be available to project reviewers.
 """
 import random
+import time
 import timeit
-from copy import copy
 
 TIME_LIMIT_MILLIS = 150
 
+# milliseconds charged for every call to time_left() under the "nodes" time
+# control; calibrated so that the iterative deepening alpha-beta agents of
+# this project, which check the clock once per node, search about as deep as
+# they do in 150 ms of wall-clock time on an idle machine
+NODE_MILLIS = 0.0125
+
+TIME_CONTROLS = ("wall", "cpu", "nodes")
+
+# seed for the Zobrist keys; fixed so that position keys are reproducible
+# across processes (unlike the builtin string hash)
+ZOBRIST_SEED = 0x15014710
+
+# Zobrist key tables shared by every board of the same size
+_ZOBRIST = {}
+
+# knight-move neighbor tables shared by every board of the same size
+_NEIGHBORS = {}
+
+# (permutations, inverses) of the board symmetries for each board size
+_SYMMETRIES = {}
+
+# maps the cell values of the board state (BLANK or 1 for blocked) to the
+# binary digits of `Board.blank_mask()`
+_BLANK_DIGITS = bytes.maketrans(b"\x00\x01", b"10")
+
+
+def knight_neighbors(width, height):
+    """Return a list mapping each cell index on a board of the given size to
+    a tuple of (index, (row, column)) pairs for the in-bounds cells a knight
+    can reach from it. The tables are built once per board size and shared
+    by all boards.
+    """
+    table = _NEIGHBORS.get((width, height))
+    if table is None:
+        directions = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                      (1, -2), (1, 2), (2, -1), (2, 1)]
+        table = []
+        for idx in range(width * height):
+            r, c = idx % height, idx // height
+            table.append(tuple(
+                (r + dr + (c + dc) * height, (r + dr, c + dc))
+                for dr, dc in directions
+                if 0 <= r + dr < height and 0 <= c + dc < width))
+        _NEIGHBORS[(width, height)] = table
+    return table
+
+
+def zobrist_keys(width, height):
+    """Return the random 64-bit Zobrist keys for a board of the given size as
+    a tuple (blocked cell keys, player 1 location keys, player 2 location
+    keys, side-to-move key). The cell and location keys are lists indexed by
+    cell index. The keys are generated from `ZOBRIST_SEED`, so every process
+    derives the same keys.
+    """
+    keys = _ZOBRIST.get((width, height))
+    if keys is None:
+        rng = random.Random(ZOBRIST_SEED)
+        size = width * height
+        keys = ([rng.getrandbits(64) for _ in range(size)],
+                [rng.getrandbits(64) for _ in range(size)],
+                [rng.getrandbits(64) for _ in range(size)],
+                rng.getrandbits(64))
+        _ZOBRIST[(width, height)] = keys
+    return keys
+
+
+# symmetries() and canonical_key() are duplicated in competition_agent.py,
+# which must stay self-contained; keep both copies in sync so the opening
+# book keys agree (see SymmetryTest in board_test.py)
+def symmetries(width, height):
+    """Return a pair of lists (permutations, inverses) for the symmetries of
+    a board of the given size, which all map knight moves to knight moves.
+    Each permutation maps a cell index to the index of its image, and the
+    matching inverse maps it back. The symmetries (transforms) are, in
+    order: identity, column flip, row flip, half turn, and on square boards
+    only, transpose, quarter turn, three-quarter turn and anti-transpose.
+    """
+    tables = _SYMMETRIES.get((width, height))
+    if tables is None:
+        h, w = height - 1, width - 1
+        maps = [lambda r, c: (r, c), lambda r, c: (r, w - c),
+                lambda r, c: (h - r, c), lambda r, c: (h - r, w - c)]
+        if width == height:
+            maps += [lambda r, c: (c, r), lambda r, c: (c, h - r),
+                     lambda r, c: (w - c, r), lambda r, c: (w - c, h - r)]
+        perms, inverses = [], []
+        for fn in maps:
+            perm = [0] * (width * height)
+            inverse = [0] * (width * height)
+            for idx in range(width * height):
+                r, c = fn(idx % height, idx // height)
+                perm[idx] = r + c * height
+                inverse[r + c * height] = idx
+            perms.append(perm)
+            inverses.append(inverse)
+        tables = _SYMMETRIES[(width, height)] = (perms, inverses)
+    return tables
+
+
+# must produce the same keys as competition_agent.canonical_key()
+def canonical_key(cells, locs, width, height):
+    """Return the pair (key, transform) of the smallest packed key of a
+    position over the symmetries of a board of the given size.
+
+    The key packs the cell mask `cells` (bit `row + col * height` per cell)
+    followed by each entry of `locs` (a cell index, or -1 for none) plus one
+    in `(width * height).bit_length()` bits, and `transform` is the index
+    (into the lists returned by `symmetries()`) of a symmetry that maps the
+    position to the smallest key. See `Board.canonical()`.
+    """
+    size = width * height
+    loc_bits = size.bit_length()
+    indices = []
+    while cells:
+        low = cells & -cells
+        indices.append(low.bit_length() - 1)
+        cells ^= low
+    best = None
+    for transform, perm in enumerate(symmetries(width, height)[0]):
+        key = 0
+        for idx in indices:
+            key |= 1 << perm[idx]
+        for player, loc in enumerate(locs):
+            if loc >= 0:
+                key |= (perm[loc] + 1) << (size + player * loc_bits)
+        if best is None or key < best[0]:
+            best = (key, transform)
+    return best
+
 
 class Board(object):
     """Implement a model for the game Isolation assuming each player moves like
@@ -51,9 +180,41 @@ class Board(object):
         self._board_state = [Board.BLANK] * (width * height + 3)
         self._board_state[-1] = Board.NOT_MOVED
         self._board_state[-2] = Board.NOT_MOVED
+        self._neighbors = knight_neighbors(width, height)
+
+        # number of blank knight neighbors of every cell, updated
+        # incrementally by apply_move() and pop_move(). The counts are
+        # valid while `_mobility_move_count` equals `move_count`; a board
+        # whose state was set without them (e.g., by a subclass's copy())
+        # recounts them on the next call to mobility()
+        self._mobility = [len(cells) for cells in self._neighbors]
+        self._mobility_move_count = 0
+
+        # Zobrist key of the current state, updated incrementally by
+        # apply_move(); the key of the empty board is 0. Like the mobility
+        # counts, the key is valid while `_zobrist_move_count` equals
+        # `move_count`, and is recomputed from the cells otherwise
+        self._zobrist_keys = zobrist_keys(width, height)
+        self._zobrist = 0
+        self._zobrist_move_count = 0
+
+        # (move, previous location, previous key) for each move applied
+        # with push_move()
+        self._undo_stack = []
 
     def hash(self):
-        return str(self._board_state).__hash__()
+        return self.zobrist_key
+
+    @property
+    def zobrist_key(self):
+        """A 64-bit Zobrist key identifying the blocked cells, the location
+        of each player and the player to move. The key is maintained
+        incrementally as moves are applied, and equal positions have equal
+        keys in every process and on every board engine.
+        """
+        if self._zobrist_move_count != self.move_count:
+            self._compute_zobrist()
+        return self._zobrist
 
     @property
     def active_player(self):
@@ -92,11 +253,50 @@ class Board(object):
 
     def copy(self):
         """ Return a deep copy of the current board. """
-        new_board = Board(self._player_1, self._player_2, width=self.width, height=self.height)
+        # Board.__init__ is deliberately bypassed; it would build a fresh
+        # state and mobility list only for them to be overwritten here.
+        new_board = Board.__new__(Board)
+        new_board.width = self.width
+        new_board.height = self.height
         new_board.move_count = self.move_count
+        new_board._player_1 = self._player_1
+        new_board._player_2 = self._player_2
         new_board._active_player = self._active_player
         new_board._inactive_player = self._inactive_player
-        new_board._board_state = copy(self._board_state)
+        new_board._board_state = self._board_state[:]
+        new_board._neighbors = self._neighbors
+        new_board._mobility = self._mobility[:]
+        new_board._mobility_move_count = self._mobility_move_count
+        new_board._zobrist_keys = self._zobrist_keys
+        new_board._zobrist = self._zobrist
+        new_board._zobrist_move_count = self._zobrist_move_count
+        new_board._undo_stack = []
+        return new_board
+
+    def __getstate__(self):
+        # the lookup tables are shared by all boards of the same size, so
+        # they are rebuilt from the module caches instead of being pickled
+        state = self.__dict__.copy()
+        del state["_neighbors"], state["_zobrist_keys"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._neighbors = knight_neighbors(self.width, self.height)
+        self._zobrist_keys = zobrist_keys(self.width, self.height)
+
+    def copy_with_players(self, player_1, player_2):
+        """Return a deep copy of the current board in which `player_1` and
+        `player_2` take the places of the original first and second players
+        (e.g., to send a position to another process without its players).
+        """
+        new_board = self.copy()
+        new_board._player_1 = player_1
+        new_board._player_2 = player_2
+        if self._active_player == self._player_1:
+            new_board._active_player, new_board._inactive_player = player_1, player_2
+        else:
+            new_board._active_player, new_board._inactive_player = player_2, player_1
         return new_board
 
     def forecast_move(self, move):
@@ -142,6 +342,53 @@ class Board(object):
         return [(i, j) for j in range(self.width) for i in range(self.height)
                 if self._board_state[i + j * self.height] == Board.BLANK]
 
+    def blank_mask(self):
+        """Return an int with bit `row + col * height` set for every blank
+        cell on the board.
+        """
+        # one binary digit per cell, the last cell first
+        return int(bytes(self._board_state[-4::-1]).translate(_BLANK_DIGITS), 2)
+
+    def canonical(self):
+        """Return a pair (key, transform) identifying the current position up
+        to the symmetries of the board.
+
+        The key packs the blocked cells (bit `row + col * height` each)
+        followed by the location of player 1 and then player 2, each stored
+        as its cell index plus one (0 before the player's first move) in
+        `(width * height).bit_length()` bits. The returned key is the
+        smallest such key over the symmetries listed by `symmetries()`, so
+        symmetric positions share a key; `transform` is the index of a
+        symmetry that maps this board onto that canonical form. Keys fit in
+        64 bits on boards of up to 7x7 cells.
+
+        Moves are mapped to and from the canonical orientation with
+        `to_canonical_move()` and `from_canonical_move()`.
+        """
+        blocked = ((1 << (self.width * self.height)) - 1) & ~self.blank_mask()
+        locs = []
+        for player in (self._player_1, self._player_2):
+            loc = self.get_player_location(player)
+            locs.append(-1 if loc is None else loc[0] + loc[1] * self.height)
+        return canonical_key(blocked, locs, self.width, self.height)
+
+    def to_canonical_move(self, move, transform):
+        """Map a (row, column) move on this board to the matching move in the
+        orientation given by `transform` (as returned by `canonical()`).
+        """
+        idx = symmetries(self.width, self.height)[0][transform][
+            move[0] + move[1] * self.height]
+        return (idx % self.height, idx // self.height)
+
+    def from_canonical_move(self, move, transform):
+        """Map a (row, column) move in the orientation given by `transform`
+        back to the matching move on this board; the inverse of
+        `to_canonical_move()`.
+        """
+        idx = symmetries(self.width, self.height)[1][transform][
+            move[0] + move[1] * self.height]
+        return (idx % self.height, idx // self.height)
+
     def get_player_location(self, player):
         """Find the current location of the specified player on the board.
 
@@ -190,6 +437,58 @@ class Board(object):
             player = self.active_player
         return self.__get_moves(self.get_player_location(player))
 
+    def mobility(self, player):
+        """Return the number of legal moves of the specified player, i.e.,
+        `len(self.get_legal_moves(player))`, without generating the moves.
+        Once the player has moved, this is a lookup in the per-cell counts
+        of blank knight neighbors maintained by `apply_move()`.
+
+        Parameters
+        ----------
+        player : object
+            An object registered as a player in the current game.
+
+        Returns
+        -------
+        int
+            The number of legal moves of the player.
+        """
+        if player == self._player_1:
+            idx = self._board_state[-1]
+        elif player == self._player_2:
+            idx = self._board_state[-2]
+        else:
+            raise RuntimeError(
+                "Invalid player in mobility: {}".format(player))
+        if idx == Board.NOT_MOVED:
+            return len(self.get_blank_spaces())
+        if self._mobility_move_count != self.move_count:
+            self._count_mobility()
+        return self._mobility[idx]
+
+    def _count_mobility(self):
+        """Recount the blank knight neighbors of every cell."""
+        board_state = self._board_state
+        self._mobility = [sum(board_state[idx] == Board.BLANK
+                              for idx, _ in cells)
+                          for cells in self._neighbors]
+        self._mobility_move_count = self.move_count
+
+    def _compute_zobrist(self):
+        """Recompute the Zobrist key from the cells."""
+        cell_keys, p1_keys, p2_keys, side_key = self._zobrist_keys
+        board_state = self._board_state
+        key = side_key if board_state[-3] else 0
+        for idx in range(self.width * self.height):
+            if board_state[idx] != Board.BLANK:
+                key ^= cell_keys[idx]
+        for loc, loc_keys in ((board_state[-1], p1_keys),
+                              (board_state[-2], p2_keys)):
+            if loc != Board.NOT_MOVED:
+                key ^= loc_keys[loc]
+        self._zobrist = key
+        self._zobrist_move_count = self.move_count
+
     def apply_move(self, move):
         """Move the active player to a specified location.
 
@@ -201,19 +500,78 @@ class Board(object):
         """
         idx = move[0] + move[1] * self.height
         last_move_idx = int(self.active_player == self._player_2) + 1
+        cell_keys, loc_keys, side_key = (self._zobrist_keys[0],
+                                         self._zobrist_keys[last_move_idx],
+                                         self._zobrist_keys[3])
+        if self._zobrist_move_count == self.move_count:
+            last_idx = self._board_state[-last_move_idx]
+            if last_idx != Board.NOT_MOVED:
+                self._zobrist ^= loc_keys[last_idx]
+            self._zobrist ^= cell_keys[idx] ^ loc_keys[idx] ^ side_key
+            self._zobrist_move_count += 1
         self._board_state[-last_move_idx] = idx
         self._board_state[idx] = 1
         self._board_state[-3] ^= 1
+        if self._mobility_move_count == self.move_count:
+            mobility = self._mobility
+            for neighbor, _ in self._neighbors[idx]:
+                mobility[neighbor] -= 1
+            self._mobility_move_count += 1
         self._active_player, self._inactive_player = self._inactive_player, self._active_player
         self.move_count += 1
 
+    def push_move(self, move):
+        """Move the active player to a specified location in place, recording
+        enough information for `pop_move()` to restore the current state.
+
+        Unlike `forecast_move()`, no copy of the board is made. Moves must be
+        undone in the reverse order they were pushed, and `apply_move()` must
+        not be called on the board while pushed moves remain on the stack.
+        Copies of the board start with an empty undo stack.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+        """
+        last_move_idx = int(self._active_player == self._player_2) + 1
+        self._undo_stack.append(
+            (move, self._board_state[-last_move_idx], self.zobrist_key))
+        self.apply_move(move)
+
+    def pop_move(self):
+        """Undo the most recent move applied with `push_move()`, restoring the
+        board, the player order and the move count exactly.
+
+        Returns
+        -------
+        (int, int)
+            The move that was undone.
+        """
+        move, last_loc, self._zobrist = self._undo_stack.pop()
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+        last_move_idx = int(self._active_player == self._player_2) + 1
+        self._board_state[-last_move_idx] = last_loc
+        idx = move[0] + move[1] * self.height
+        self._board_state[idx] = Board.BLANK
+        self._board_state[-3] ^= 1
+        if self._mobility_move_count == self.move_count:
+            mobility = self._mobility
+            for neighbor, _ in self._neighbors[idx]:
+                mobility[neighbor] += 1
+            self._mobility_move_count -= 1
+        self.move_count -= 1
+        self._zobrist_move_count = self.move_count
+        return move
+
     def is_winner(self, player):
         """ Test whether the specified player has won the game. """
-        return player == self._inactive_player and not self.get_legal_moves(self._active_player)
+        return player == self._inactive_player and not self.mobility(self._active_player)
 
     def is_loser(self, player):
         """ Test whether the specified player has lost the game. """
-        return player == self._active_player and not self.get_legal_moves(self._active_player)
+        return player == self._active_player and not self.mobility(self._active_player)
 
     def utility(self, player):
         """Returns the utility of the current game state from the perspective
@@ -237,7 +595,7 @@ class Board(object):
             a value of -inf if the player has lost, and a value of 0
             otherwise.
         """
-        if not self.get_legal_moves(self._active_player):
+        if not self.mobility(self._active_player):
 
             if player == self._inactive_player:
                 return float("inf")
@@ -254,11 +612,10 @@ class Board(object):
         if loc == Board.NOT_MOVED:
             return self.get_blank_spaces()
 
-        r, c = loc
-        directions = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                      (1, -2), (1, 2), (2, -1), (2, 1)]
-        valid_moves = [(r + dr, c + dc) for dr, dc in directions
-                       if self.move_is_legal((r + dr, c + dc))]
+        board_state = self._board_state
+        valid_moves = [move for idx, move in
+                       self._neighbors[loc[0] + loc[1] * self.height]
+                       if board_state[idx] == Board.BLANK]
         random.shuffle(valid_moves)
         return valid_moves
 
@@ -295,7 +652,8 @@ class Board(object):
 
         return out
 
-    def play(self, time_limit=TIME_LIMIT_MILLIS):
+    def play(self, time_limit=TIME_LIMIT_MILLIS, time_control="wall",
+             node_millis=NODE_MILLIS, move_times=None):
         """Execute a match between the players by alternately soliciting them
         to select a move and applying it in the game.
 
@@ -305,6 +663,24 @@ class Board(object):
             The maximum number of milliseconds to allow before timeout
             during each turn.
 
+        time_control : {'wall', 'cpu', 'nodes'} (optional)
+            The clock each turn is charged on: 'wall' uses wall-clock time;
+            'cpu' uses the CPU time of the current process, which does not
+            advance while the process waits for the CPU on a loaded machine
+            (but does not count the time of any processes an agent starts);
+            'nodes' charges a fixed `node_millis` for every call to
+            `time_left()`, a node budget for agents that check the clock once
+            per search node, which makes the outcome independent of the
+            machine and its load.
+
+        node_millis : float (optional)
+            The milliseconds charged per call to `time_left()` under the
+            'nodes' time control.
+
+        move_times : list (optional)
+            A list to which the milliseconds charged for each turn (on the
+            `time_control` clock) are appended, including the final turn.
+
         Returns
         ----------
         (player, list<[(int, int),]>, str)
@@ -314,7 +690,18 @@ class Board(object):
         """
         move_history = []
 
-        time_millis = lambda: 1000 * timeit.default_timer()
+        if time_control == "wall":
+            time_millis = lambda: 1000 * timeit.default_timer()
+        elif time_control == "cpu":
+            time_millis = lambda: 1000 * time.process_time()
+        elif time_control == "nodes":
+            queries = [0]
+
+            def time_millis():
+                queries[0] += 1
+                return queries[0] * node_millis
+        else:
+            raise ValueError("Unknown time control: {}".format(time_control))
 
         while True:
 
@@ -326,6 +713,8 @@ class Board(object):
             curr_move = self._active_player.get_move(
                 game_copy, legal_player_moves, time_left)
             move_end = time_left()
+            if move_times is not None:
+                move_times.append(time_limit - move_end)
 
             if curr_move is None:
                 curr_move = Board.NOT_MOVED
@@ -0,0 +1,318 @@
+"""
+This file contains a retrograde endgame tablebase for Isolation positions in
+which only a few blank cells remain reachable.
+
+Cells that neither player can reach can never be entered again, so a
+position is fully described by the location of the player to move, the
+location of its opponent and the region of blank cells reachable from
+either of them. Every move blocks a cell of the region, so the region of a
+successor is strictly smaller. The generator therefore enumerates every
+region of at most `max_cells` cells around every pair of locations and
+solves the positions level by level in increasing region size, each from
+the already solved positions one move later. Each position is stored once
+per class of symmetric positions, under the canonical key computed by
+`isolation.isolation.canonical_key()` from the region and the (mover,
+opponent) locations.
+
+The table is written as a binary file: a fixed header, the sorted 64-bit
+keys and one value byte per key, holding `WIN` for a win of the player to
+move plus the number of plies until the game ends with best play (the
+winner hurrying, the loser delaying). `Tablebase` maps the file into memory
+and binary searches the keys in place, without reading or copying the
+table. Generate a table with ``python -m isolation.tablebase``.
+"""
+import argparse
+import bisect
+import mmap
+import struct
+import sys
+import timeit
+from array import array
+
+from .bitboard import attack_masks
+from .bitboard import flood_fill
+from .bitboard import knight_shifts
+from .bitboard import knight_spread
+from .isolation import canonical_key
+from .isolation import symmetries
+
+MAX_CELLS = 4  # default largest region size covered by a generated table
+
+# value bit set for positions won by the player to move; the low bits hold
+# the distance to the end of the game in plies
+WIN = 0x80
+
+# file header: magic, format version, board width and height, largest
+# region size and number of positions, padded to align the keys
+_MAGIC = b"ISTB"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHBBH6xQ")
+
+
+def _popcount(mask):
+    return bin(mask).count("1")
+
+
+def position(game, max_cells):
+    """Return the tablebase position of a board as a tuple (mover, opponent,
+    region) of the cell indices of the two players and the mask of the blank
+    cells either of them can reach, or None if a player has not been placed
+    yet or the region has more than `max_cells` cells.
+    """
+    mover = game.get_player_location(game.active_player)
+    opponent = game.get_player_location(game.inactive_player)
+    if mover is None or opponent is None:
+        return None
+    height = game.height
+    mover = mover[0] + mover[1] * height
+    opponent = opponent[0] + opponent[1] * height
+
+    # grow the region one knight move at a time to give up early in open
+    # positions
+    blank = game.blank_mask()
+    shifts = knight_shifts(game.width, height)
+    front = (1 << mover) | (1 << opponent)
+    region = 0
+    while front:
+        front = knight_spread(front, shifts) & blank & ~region
+        region |= front
+        if _popcount(region) > max_cells:
+            return None
+    return mover, opponent, region
+
+
+def position_key(mover, opponent, region, width, height):
+    """Return the canonical key of a tablebase position."""
+    return canonical_key(region, [mover, opponent], width, height)[0]
+
+
+def decode(key, width, height):
+    """Return the position (mover, opponent, region) of a canonical key."""
+    size = width * height
+    loc_bits = size.bit_length()
+    region = key & ((1 << size) - 1)
+    mover = ((key >> size) & ((1 << loc_bits) - 1)) - 1
+    opponent = (key >> (size + loc_bits)) - 1
+    return mover, opponent, region
+
+
+def successors(mover, opponent, region, width, height):
+    """Yield a pair (move, position) for every move of the player to move,
+    where move is the destination cell index and position is the tablebase
+    position that follows it (with the players' roles swapped).
+    """
+    moves = attack_masks(width, height)[mover] & region
+    while moves:
+        low = moves & -moves
+        moves ^= low
+        yield low.bit_length() - 1, (
+            opponent, low.bit_length() - 1,
+            flood_fill((1 << opponent) | low, region & ~low, width, height))
+
+
+def solve_position(mover, opponent, region, width, height, table):
+    """Return the value byte of a position from the values in `table` (a
+    mapping from canonical keys to value bytes) of all its successors.
+    """
+    best = None
+    for _, child in successors(mover, opponent, region, width, height):
+        value = table[position_key(*child, width=width, height=height)]
+        distance = 1 + (value & ~WIN)
+        if not value & WIN:
+            # the opponent loses: prefer the quickest win
+            if best is None or not best & WIN or distance < best & ~WIN:
+                best = WIN | distance
+        elif best is None or not best & WIN and distance > best:
+            # every move loses so far: prefer the slowest loss
+            best = distance
+    return 0 if best is None else best
+
+
+def generate(max_cells=MAX_CELLS, width=7, height=7, verbose=False):
+    """Solve every position with at most `max_cells` reachable blank cells.
+
+    Parameters
+    ----------
+    max_cells : int (optional)
+        The largest region size covered by the table.
+
+    width, height : int (optional)
+        The board size.
+
+    verbose : bool (optional)
+        Print the number of positions and the time spent on each level.
+
+    Returns
+    -------
+    dict
+        A dict mapping the canonical key of every position to its value
+        byte.
+    """
+    size = width * height
+    if size + 2 * size.bit_length() > 64:
+        raise ValueError("Tablebase keys do not fit in 64 bits on a "
+                         "{}x{} board".format(width, height))
+    attacks = attack_masks(width, height)
+    perms = symmetries(width, height)[0]
+
+    # enumerate the regions of each size around every pair of locations
+    # with Redelmeier's algorithm; every region is grown from the cells next
+    # to the players, so it only holds cells reachable from them. Positions
+    # related by a symmetry are enumerated once per mover location orbit
+    levels = [set() for _ in range(max_cells + 1)]
+
+    def grow(mover, opponent, region, cells, untried, seen):
+        level = levels[cells + 1]
+        while untried:
+            low = untried & -untried
+            untried ^= low
+            level.add(position_key(mover, opponent, region | low,
+                                   width, height))
+            if cells + 1 < max_cells:
+                new = attacks[low.bit_length() - 1] & ~seen
+                grow(mover, opponent, region | low, cells + 1,
+                     untried | new, seen | new)
+
+    movers = {min(perm[idx] for perm in perms) for idx in range(size)}
+    for mover in sorted(movers):
+        for opponent in range(size):
+            if opponent == mover:
+                continue
+            players = (1 << mover) | (1 << opponent)
+            neighbors = (attacks[mover] | attacks[opponent]) & ~players
+            levels[0].add(position_key(mover, opponent, 0, width, height))
+            if max_cells:
+                grow(mover, opponent, 0, 0, neighbors, players | neighbors)
+
+    table = {}
+    for cells, level in enumerate(levels):
+        start = timeit.default_timer()
+        for key in level:
+            table[key] = solve_position(*decode(key, width, height),
+                                        width=width, height=height,
+                                        table=table)
+        if verbose:
+            print("{:>2} cells: {:>8} positions in {:.1f}s".format(
+                cells, len(level), timeit.default_timer() - start))
+    return table
+
+
+def write_table(path, table, max_cells, width=7, height=7):
+    """Write a table returned by `generate()` to the binary file `path`."""
+    keys = array("Q", sorted(table))
+    values = bytes(table[key] for key in keys)
+    if sys.byteorder != "little":
+        keys.byteswap()
+    with open(path, "wb") as table_file:
+        table_file.write(_HEADER.pack(_MAGIC, _VERSION, width, height,
+                                      max_cells, len(keys)))
+        table_file.write(keys.tobytes())
+        table_file.write(values)
+
+
+class Tablebase:
+    """Read-only view of a tablebase file written by `write_table()`.
+
+    The file is memory-mapped and the keys are binary searched in place
+    through a memoryview, so opening a table is instant and lookups neither
+    read the whole file nor copy it. Tablebases are pickled by path and
+    mapped again when unpickled.
+
+    Parameters
+    ----------
+    path : str
+        The path of the tablebase file.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as table_file:
+            self._mmap = mmap.mmap(table_file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        magic, version, self.width, self.height, self.max_cells, count = \
+            _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC or version != _VERSION:
+            self._mmap.close()
+            raise ValueError("Not a tablebase file: {}".format(path))
+        if sys.byteorder != "little":
+            self._mmap.close()
+            raise ValueError("Tablebase files require a little-endian host")
+        view = memoryview(self._mmap)
+        end = _HEADER.size + 8 * count
+        self._keys = view[_HEADER.size:end].cast("Q")
+        self._values = view[end:end + count]
+        view.release()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def close(self):
+        """Unmap the file."""
+        self._keys.release()
+        self._values.release()
+        self._mmap.close()
+
+    def lookup(self, key):
+        """Return the value byte stored for a canonical key, or None."""
+        idx = bisect.bisect_left(self._keys, key)
+        if idx < len(self._keys) and self._keys[idx] == key:
+            return self._values[idx]
+        return None
+
+    def probe(self, game):
+        """Return a pair (win, distance) for a board covered by the table:
+        whether the player to move wins with best play and the number of
+        plies until the game ends. Return None if the board is not covered.
+        """
+        if game.width != self.width or game.height != self.height:
+            return None
+        found = position(game, self.max_cells)
+        if found is None:
+            return None
+        value = self.lookup(position_key(*found, width=self.width,
+                                         height=self.height))
+        if value is None:
+            return None
+        return bool(value & WIN), value & ~WIN
+
+    def best_move(self, game):
+        """Return an optimal move for the player to move on a board covered
+        by the table: the quickest win or, in a lost position, the slowest
+        loss, taking the first such move in (row, column) order; (-1, -1) if
+        the player has no legal moves. Return None if the board is not
+        covered.
+        """
+        entry = self.probe(game)
+        if entry is None:
+            return None
+        win, distance = entry
+        for move in sorted(game.get_legal_moves()):
+            child_win, child_distance = self.probe(game.forecast_move(move))
+            if child_win != win and child_distance == distance - 1:
+                return move
+        return (-1, -1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--max-cells", type=int, default=MAX_CELLS,
+                        help="largest number of reachable blank cells "
+                             "(default: %(default)s)")
+    parser.add_argument("--width", type=int, default=7)
+    parser.add_argument("--height", type=int, default=7)
+    parser.add_argument("--output", default="tablebase.bin",
+                        help="file to write (default: %(default)s)")
+    args = parser.parse_args()
+
+    table = generate(args.max_cells, args.width, args.height, verbose=True)
+    write_table(args.output, table, args.max_cells, args.width, args.height)
+    print("{} positions written to {}".format(len(table), args.output))
+
+
+if __name__ == "__main__":
+    main()
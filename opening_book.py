@@ -0,0 +1,157 @@
+"""
+Generate an opening book for `competition_agent.CustomPlayer`.
+
+The book holds a move for every position the agent can face in the first
+`--plies` plies of a game, playing either side, when it follows the book
+itself: at the book side's turns only the book move is expanded, while every
+reply of the opponent is. Each book move is chosen by a long search of the
+agent's own Monte Carlo tree search (`--rollouts` per position) or, with
+`--search alphabeta`, by a fixed-depth iterative deepening alpha-beta search
+from game_agent.py (`--depth` plies).
+
+Positions are stored under their symmetry-canonical key (`isolation.Board.
+canonical()`, which `competition_agent.canonical_key()` reproduces for the
+self-contained agent), so each class of positions related by a board symmetry is
+searched and stored only once. The book is written as compact JSON: keys are
+the canonical position keys in base 36 and values are the canonical cell
+indices (``row + col * height``) of the book moves.
+
+Run `python opening_book.py` to write data.json with the default settings
+(several minutes), then construct the agent with
+`CustomPlayer(data="data.json")` or with the parsed contents of the file.
+"""
+
+import argparse
+import json
+import timeit
+
+from isolation import BitBoard
+from competition_agent import CustomPlayer
+from game_agent import AlphaBetaPlayer
+from game_agent import OPPONENT
+from game_agent import relabel
+from sample_players import improved_score
+
+PLIES = 6  # number of plies covered by the book
+ROLLOUTS = 20000  # MCTS rollouts per book move
+DEPTH = 8  # alpha-beta search depth per book move
+WIDTH, HEIGHT = 7, 7
+
+
+def make_searcher(search, effort):
+    """Return a function that chooses a move for a board, using either
+    Monte Carlo tree search with `effort` rollouts ("mcts") or iterative
+    deepening alpha-beta search to `effort` plies ("alphabeta").
+    """
+    if search == "mcts":
+        player = CustomPlayer(reuse_tree=False, max_rollouts=effort)
+
+        def search_move(game):
+            return player.get_move(relabel(game, player, OPPONENT),
+                                   lambda: float("inf"))
+    else:
+        # custom_score needs both players on the board, so the book is
+        # searched with the improved score
+        player = AlphaBetaPlayer(score_fn=improved_score, move_ordering=True,
+                                 killers=True, tt_size=2**18,
+                                 aspiration_window=1.)
+        player.time_left = lambda: float("inf")
+
+        def search_move(game):
+            player.new_game()
+            game = relabel(game, player, OPPONENT)
+            move, score = None, None
+            for depth in range(1, effort + 1):
+                move, score = player.aspiration_search(game, depth, score)
+            return move
+    return search_move
+
+
+def build_book(plies=PLIES, search="mcts", effort=ROLLOUTS, width=WIDTH,
+               height=HEIGHT, verbose=False):
+    """Search every position of the book and return a dict mapping each
+    canonical position key to the canonical cell index of its book move.
+    See `make_searcher()` for the `search` and `effort` arguments.
+    """
+    search_move = make_searcher(search, effort)
+    book = {}
+    for side in (0, 1):
+        root = BitBoard("player1", "player2", width, height)
+        frontier = {root.canonical()[0]: root}
+        for ply in range(plies):
+            start = timeit.default_timer()
+            searched = 0
+            children = {}
+            for key, game in frontier.items():
+                if ply % 2 == side:
+                    if key not in book:
+                        move = search_move(game)
+                        r, c = game.to_canonical_move(move, game.canonical()[1])
+                        book[key] = r + c * height
+                        searched += 1
+                    moves = [move_of(book[key], game)]
+                else:
+                    moves = game.get_legal_moves()
+                for move in moves:
+                    child = game.forecast_move(move)
+                    children.setdefault(child.canonical()[0], child)
+            if verbose:
+                print("side {} ply {}: {:>5} positions, {:>4} searched in {:.1f}s"
+                      .format(side + 1, ply, len(frontier), searched,
+                              timeit.default_timer() - start))
+            frontier = children
+    return book
+
+
+def move_of(book_move, game):
+    """Map the canonical cell index of a book move back to a (row, column)
+    move on `game`."""
+    move = (book_move % game.height, book_move // game.height)
+    return game.from_canonical_move(move, game.canonical()[1])
+
+
+def book_data(book, plies, width=WIDTH, height=HEIGHT, **info):
+    """Return the JSON-serializable form of a book returned by
+    `build_book()`, as read by `competition_agent.load_book()`. Keyword
+    arguments (e.g., the search settings) are recorded with the book.
+    """
+    data = dict(info, width=width, height=height, plies=plies)
+    data["moves"] = {to_base36(key): move for key, move in sorted(book.items())}
+    return data
+
+
+def to_base36(number):
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    out = ""
+    while True:
+        number, digit = divmod(number, 36)
+        out = digits[digit] + out
+        if not number:
+            return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--plies", type=int, default=PLIES,
+                        help="number of plies covered (default: %(default)s)")
+    parser.add_argument("--search", choices=["mcts", "alphabeta"],
+                        default="mcts",
+                        help="search used to choose book moves (default: %(default)s)")
+    parser.add_argument("--rollouts", type=int, default=ROLLOUTS,
+                        help="MCTS rollouts per book move (default: %(default)s)")
+    parser.add_argument("--depth", type=int, default=DEPTH,
+                        help="alpha-beta depth per book move (default: %(default)s)")
+    parser.add_argument("--output", default="data.json",
+                        help="file to write (default: %(default)s)")
+    args = parser.parse_args()
+
+    effort = args.rollouts if args.search == "mcts" else args.depth
+    book = build_book(args.plies, args.search, effort, verbose=True)
+    data = book_data(book, args.plies, search=args.search, effort=effort)
+    with open(args.output, "w") as book_file:
+        json.dump(data, book_file, separators=(",", ":"))
+    print("{} positions written to {}".format(len(book), args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,998 @@
+"""
+This file contains test cases for the optional search features of the agents
+in game_agent.py and of the scripts built on them.
+"""
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import time
+import unittest
+import warnings
+
+import competition_agent
+import isolation
+import game_agent
+import game_agent2
+import opening_book
+import tournament
+from isolation import endgame
+from isolation import tablebase
+
+from sample_players import GreedyPlayer
+from sample_players import RandomPlayer
+from sample_players import improved_score
+
+
+def make_game(board_class, player, seed, plies=4):
+    """Return a board with `player` to move after `plies` random moves."""
+    rng = random.Random(seed)
+    game = board_class(player, "opponent")
+    for _ in range(plies):
+        game.apply_move(rng.choice(sorted(game.get_legal_moves())))
+    return game
+
+
+class InPlaceSearchTest(unittest.TestCase):
+
+    def test_in_place_matches_forecast(self):
+        """In-place search chooses the same moves as copy-based search"""
+        for board_class in (isolation.Board, isolation.BitBoard):
+            for seed in range(5):
+                results = []
+                for in_place in (False, True):
+                    random.seed(seed)
+                    player = game_agent.AlphaBetaPlayer(
+                        score_fn=improved_score, in_place=in_place)
+                    player.time_left = lambda: 1e3
+                    game = make_game(board_class, player, seed)
+                    before = game.to_string()
+                    results.append(player.alphabeta(game, 4))
+                    self.assertEqual(before, game.to_string())
+                self.assertEqual(results[0], results[1])
+
+    def test_minimax_in_place(self):
+        """In-place minimax returns a legal move and leaves the board intact"""
+        player = game_agent.MinimaxPlayer(score_fn=improved_score,
+                                          in_place=True)
+        game = make_game(isolation.Board, player, 0)
+        before = game.to_string()
+        move = player.get_move(game, lambda: 1e3)
+        self.assertIn(move, game.get_legal_moves())
+        self.assertEqual(before, game.to_string())
+
+
+class TranspositionTableTest(unittest.TestCase):
+
+    def test_probe_and_store(self):
+        """Stored entries are returned by key and counted as hits"""
+        tt = game_agent.TranspositionTable(8)
+        self.assertIsNone(tt.probe(5))
+        tt.store(5, 3, 1.5, game_agent.EXACT, (1, 2))
+        self.assertEqual(tt.probe(5), (5, 3, 1.5, game_agent.EXACT, (1, 2)))
+        self.assertEqual((tt.hits, tt.misses, tt.collisions), (1, 1, 0))
+        self.assertIsNone(tt.probe(9))  # same bucket as key 5
+        self.assertEqual(tt.collisions, 1)
+        tt.clear()
+        self.assertIsNone(tt.probe(5))
+        self.assertEqual(tt.stats()["entries"], 0)
+
+    def test_replacement_policy(self):
+        """Deep entries survive shallow stores; the second slot is always
+        replaced"""
+        tt = game_agent.TranspositionTable(2)  # a single bucket
+        tt.store(1, 5, 0., game_agent.EXACT, None)
+        tt.store(2, 2, 0., game_agent.EXACT, None)
+        tt.store(3, 1, 0., game_agent.EXACT, None)
+        self.assertIsNotNone(tt.probe(1))
+        self.assertIsNone(tt.probe(2))
+        self.assertIsNotNone(tt.probe(3))
+        tt.store(4, 6, 0., game_agent.EXACT, None)
+        self.assertIsNotNone(tt.probe(4))
+        self.assertIsNotNone(tt.probe(1))  # demoted to the second slot
+        self.assertIsNone(tt.probe(3))
+        self.assertEqual(tt.stats()["entries"], 2)
+
+    def test_table_persists_within_game(self):
+        """The player's table is kept between moves and cleared for a new
+        game"""
+        player = game_agent.AlphaBetaPlayer(score_fn=improved_score,
+                                            tt_size=1000)
+        game = make_game(isolation.Board, player, 1)
+        player.get_move(game, lambda: 1e3 if player.tt.hits < 50 else 0)
+        self.assertGreater(player.tt.stats()["entries"], 0)
+        game.apply_move(game.get_legal_moves()[0])
+        game.apply_move(game.get_legal_moves()[0])
+        move = player.get_move(game, lambda: 1e3 if player.tt.hits < 100 else 0)
+        self.assertIn(move, game.get_legal_moves())
+        self.assertGreaterEqual(player.tt.hits, 100)
+        player.get_move(make_game(isolation.Board, player, 2), lambda: 0)
+        self.assertEqual(player.tt.stats()["entries"], 0)
+
+    def test_symmetric_table(self):
+        """Symmetric keys share entries between symmetric positions without
+        changing the search result"""
+        searches = []
+        for symmetric_tt in (False, True):
+            player = game_agent.AlphaBetaPlayer(
+                score_fn=improved_score, tt_size=2**16,
+                symmetric_tt=symmetric_tt)
+            player.time_left = lambda: 1e3
+            game = isolation.Board(player, "opponent", 5, 5)
+            _, score = player.search_root(game, 4)
+            searches.append((score, player.tt.stats()["entries"]))
+            # the table move is stored in the canonical orientation and
+            # mapped back to a legal move of the searched position
+            _, tt_move = player.tt_probe(game, 4, float("-inf"), float("inf"))
+            self.assertIn(tt_move, game.get_legal_moves())
+        self.assertEqual(searches[0][0], searches[1][0])
+        self.assertLess(2 * searches[1][1], searches[0][1])
+
+
+def border_distance(game, location):
+    """The border term of the original heuristics, computed as they did."""
+    borderx1_distance = min(max(2 - location[0], 0), 2)
+    borderx2_distance = min(max(3 + location[0] - game.width, 0), 2)
+    bordery1_distance = min(max(2 - location[1], 0), 2)
+    bordery2_distance = min(max(3 + location[1] - game.height, 0), 2)
+    return borderx1_distance + borderx2_distance + bordery1_distance + bordery2_distance
+
+
+def border_score(game, player, own_border, opponent_border):
+    """Reference implementation of the hand-coded border heuristics."""
+    if game.is_loser(player):
+        return float("-inf")
+    if game.is_winner(player):
+        return float("inf")
+    opponent = game.get_opponent(player)
+    total = (opponent_border * border_distance(game, game.get_player_location(opponent)) -
+             own_border * border_distance(game, game.get_player_location(player)))
+    own_moves = len(game.get_legal_moves(player))
+    opp_moves = len(game.get_legal_moves(opponent))
+    return float(own_moves - opp_moves + total)
+
+
+class WeightedEvaluatorTest(unittest.TestCase):
+
+    def test_presets_match_hand_coded_heuristics(self):
+        """The heuristics of game_agent.py and game_agent2.py give exactly
+        the scores of the original border arithmetic"""
+        heuristics = [(game_agent.custom_score, 1, 1),
+                      (game_agent.custom_score_2, 0, 1),
+                      (game_agent.custom_score_3, 1, 0),
+                      (game_agent2.heuristic3, 1, 1),
+                      (game_agent2.heuristic2, 0, 1),
+                      (game_agent2.heuristic1, 1, 0),
+                      (game_agent.WeightedEvaluator(), 0, 0),
+                      (improved_score, 0, 0)]
+        for width, height in [(7, 7), (5, 8), (8, 4)]:
+            for seed in range(10):
+                rng = random.Random(seed)
+                game = isolation.Board("player", "opponent", width, height)
+                while True:
+                    if game.move_count >= 2:
+                        for player in ("player", "opponent"):
+                            for score_fn, own, opponent in heuristics:
+                                self.assertEqual(
+                                    score_fn(game, player),
+                                    border_score(game, player, own, opponent))
+                    moves = sorted(game.get_legal_moves())
+                    if not moves:
+                        break
+                    game.apply_move(rng.choice(moves))
+
+    def test_feature_tables(self):
+        """Feature tables hold the knight degree and a central maximum"""
+        tables = game_agent.feature_tables(5, 6)
+        self.assertIs(tables, game_agent.feature_tables(5, 6))
+        for idx, degree in enumerate(tables["degree"]):
+            game = isolation.Board("player", "opponent", 5, 6)
+            game.apply_move((idx % 6, idx // 6))
+            self.assertEqual(degree, game.mobility("player"))
+        centrality = tables["centrality"]
+        self.assertEqual(max(centrality), centrality[2 + 2 * 6])
+        self.assertEqual(min(centrality), centrality[0])
+
+    def test_weights(self):
+        """Features are weighted per player and unplaced players add none"""
+        evaluator = game_agent.WeightedEvaluator(
+            own_moves=2, opponent_moves=0, own={"degree": 1},
+            opponent={"centrality": -1})
+        game = isolation.Board("player", "opponent")
+        self.assertEqual(evaluator(game, "player"), 98.)
+        game.apply_move((0, 0))
+        # two moves from the corner, whose degree is 2
+        self.assertEqual(evaluator(game, "player"), 2. * 2 + 2)
+        game.apply_move((3, 3))
+        self.assertEqual(evaluator(game, "player"), 2. * 2 + 2)
+        with self.assertRaises(ValueError):
+            game_agent.WeightedEvaluator(own={"parity": 1})
+
+
+def knight_distances(game, start):
+    """Return a dict mapping every blank cell reachable from the (row,
+    column) cell `start` to its distance in knight moves."""
+    neighbors = isolation.isolation.knight_neighbors(game.width, game.height)
+    distances = {}
+    front = [start]
+    distance = 0
+    while front:
+        distance += 1
+        reached = []
+        for r, c in front:
+            for _, move in neighbors[r + c * game.height]:
+                if game.move_is_legal(move) and move not in distances:
+                    distances[move] = distance
+                    reached.append(move)
+        front = reached
+    return distances
+
+
+class TerritoryTest(unittest.TestCase):
+
+    def test_matches_breadth_first_search(self):
+        """Territory counts the cells each player reaches strictly first,
+        and detects partitions, on every board engine and size"""
+        partitions = 0
+        for board_class in (isolation.Board, isolation.BitBoard):
+            for width, height in [(7, 7), (5, 8), (8, 4)]:
+                for seed in range(10):
+                    rng = random.Random(seed)
+                    game = board_class("player", "opponent", width, height)
+                    while True:
+                        if game.move_count >= 2:
+                            own = knight_distances(
+                                game, game.get_player_location("player"))
+                            opp = knight_distances(
+                                game, game.get_player_location("opponent"))
+                            expected = (
+                                sum(d < opp.get(cell, float("inf"))
+                                    for cell, d in own.items()),
+                                sum(d < own.get(cell, float("inf"))
+                                    for cell, d in opp.items()),
+                                not set(own) & set(opp))
+                            self.assertEqual(
+                                game_agent.territory(game, "player"), expected)
+                            partitions += expected[2]
+                        moves = sorted(game.get_legal_moves())
+                        if not moves:
+                            break
+                        game.apply_move(rng.choice(moves))
+        self.assertGreater(partitions, 0)
+
+    def test_score(self):
+        """The score is the territory difference, scaled when partitioned"""
+        game = isolation.Board("player", "opponent")
+        game.apply_move((0, 0))
+        self.assertEqual(game_agent.territory_score(game, "player"), -46.)
+        scaled = 0
+        for seed in range(20):
+            game = make_game(isolation.BitBoard, "player", seed)
+            while game.mobility(game.active_player):
+                own, opp, partitioned = game_agent.territory(game, "player")
+                weight = game_agent.PARTITION_WEIGHT if partitioned else 1
+                self.assertEqual(game_agent.territory_score(game, "player"),
+                                 weight * (own - opp))
+                scaled += partitioned and own != opp
+                game.apply_move(sorted(game.get_legal_moves())[0])
+        self.assertGreater(scaled, 0)
+
+
+class EvalCacheTest(unittest.TestCase):
+
+    def test_cached_scores(self):
+        """Cached scores equal the wrapped function's, per player"""
+        cache = game_agent.EvalCache(game_agent.custom_score)
+        game = make_game(isolation.BitBoard, "player", 3)
+        for player in ("player", "opponent", "player"):
+            self.assertEqual(cache(game, player),
+                             game_agent.custom_score(game, player))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        self.assertEqual(cache.stats()["hit_rate"], 1 / 3)
+
+    def test_lru_eviction(self):
+        """The least recently used score is evicted when the cache is full"""
+        calls = []
+        cache = game_agent.EvalCache(
+            lambda game, player: calls.append(game.zobrist_key) or 0., 2)
+        games = [make_game(isolation.Board, "player", seed)
+                 for seed in range(3)]
+        cache(games[0], "player")
+        cache(games[1], "player")
+        cache(games[0], "player")  # games[1] is now the oldest entry
+        cache(games[2], "player")
+        self.assertEqual(cache.evictions, 1)
+        cache(games[0], "player")
+        self.assertEqual(len(calls), 3)
+        cache(games[1], "player")
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_cache_persists_within_game(self):
+        """The player's cache is reused by the next move's search without
+        changing its scores, and is cleared for a new game"""
+        scores = []
+        for eval_cache_size in (0, 2**16):
+            player = game_agent.AlphaBetaPlayer(
+                score_fn=improved_score, eval_cache_size=eval_cache_size)
+            player.time_left = lambda: 1e3
+            game = make_game(isolation.Board, player, 1)
+            random.seed(0)
+            move, score = player.search_root(game, 3)
+            game.apply_move(move)
+            game.apply_move(sorted(game.get_legal_moves())[0])
+            scores.append([score, player.search_root(game, 1)[1]])
+        self.assertEqual(scores[0], scores[1])
+        self.assertGreater(player.score.hits, 0)
+
+        player.get_move(make_game(isolation.Board, player, 1, plies=6),
+                        lambda: 1e3 if player.score.misses < 200 else 0)
+        self.assertGreater(player.score.stats()["entries"], 0)
+        player.get_move(make_game(isolation.Board, player, 2), lambda: 0)
+        self.assertEqual(player.score.stats()["entries"], 0)
+
+
+def store_pickled(pickled_tt, key):
+    """Attach to a pickled shared table and store an entry for `key`."""
+    tt = pickle.loads(pickled_tt)
+    tt.store(key, 4, -2.5, game_agent.UPPER, (3, 1))
+    tt.close()
+
+
+class SharedTranspositionTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tt = game_agent.SharedTranspositionTable(64)
+
+    def tearDown(self):
+        self.tt.close()
+
+    def test_matches_transposition_table(self):
+        """The shared table stores and replaces entries exactly like the
+        in-process table"""
+        rng = random.Random(0)
+        local = game_agent.TranspositionTable(64)
+        for _ in range(2000):
+            key = rng.getrandbits(64)
+            if rng.random() < 0.5:
+                key = key % 100
+            if rng.random() < 0.5:
+                self.assertEqual(self.tt.probe(key), local.probe(key))
+            else:
+                entry = (key, rng.randrange(10), rng.choice([1.5, -3., float("inf")]),
+                         rng.randrange(3), rng.choice([None, (2, 5)]))
+                self.tt.store(*entry)
+                local.store(*entry)
+        self.assertEqual(self.tt.stats(), local.stats())
+        self.tt.clear()
+        self.assertEqual(self.tt.stats()["entries"], 0)
+
+    def test_torn_slot_is_ignored(self):
+        """A slot whose check word does not match its payload is a miss"""
+        self.tt.store(7, 3, 1., game_agent.EXACT, (0, 1))
+        slot = 2 * (7 % self.tt.num_buckets)
+        self.tt._shm.buf[slot * 24 + 9] ^= 0xff
+        self.assertIsNone(self.tt.probe(7))
+
+    def test_shared_between_processes(self):
+        """Entries stored by another process are visible to the owner"""
+        process = multiprocessing.Process(
+            target=store_pickled, args=(pickle.dumps(self.tt), 2**63 + 5))
+        process.start()
+        process.join()
+        self.assertEqual(self.tt.probe(2**63 + 5),
+                         (2**63 + 5, 4, -2.5, game_agent.UPPER, (3, 1)))
+
+
+def minimax_value(game, player, depth, alpha=float("-inf"),
+                  beta=float("inf")):
+    """Return the alpha-beta value of `game` to `depth` for `player`,
+    computed without any search enhancements.
+    """
+    if depth == 0:
+        return player.score(game, player)
+    maximizing = game.active_player == player
+    value = float("-inf") if maximizing else float("inf")
+    for m in game.get_legal_moves():
+        child = minimax_value(game.forecast_move(m), player, depth - 1,
+                              alpha, beta)
+        if maximizing:
+            value = max(value, child)
+            alpha = max(alpha, value)
+        else:
+            value = min(value, child)
+            beta = min(beta, value)
+        if alpha >= beta:
+            break
+    return value
+
+
+def root_values(game, player, depth):
+    """Return a dict mapping each legal move of `game` to its exact minimax
+    value at `depth` for `player`.
+    """
+    return {m: minimax_value(game.forecast_move(m), player, depth - 1)
+            for m in game.get_legal_moves()}
+
+
+class MoveOrderingTest(unittest.TestCase):
+
+    def test_ordering_preserves_value_and_saves_nodes(self):
+        """Ordered search picks an optimal move and visits fewer nodes"""
+        depth = 5
+        nodes = {False: 0, True: 0}
+        for seed in range(6):
+            values = None
+            for move_ordering in (False, True):
+                random.seed(seed)
+                player = game_agent.AlphaBetaPlayer(
+                    score_fn=improved_score, move_ordering=move_ordering)
+                player.time_left = lambda: 1e3
+                game = make_game(isolation.Board, player, seed)
+                if values is None:
+                    values = root_values(game, player, depth)
+                for d in range(1, depth + 1):
+                    start = player.nodes
+                    move = player.alphabeta(game, d)
+                nodes[move_ordering] += player.nodes - start
+                self.assertEqual(values[move], max(values.values()))
+        self.assertLess(nodes[True], nodes[False])
+
+    def test_killers_preserve_value(self):
+        """Killer/history ordering picks an optimal move"""
+        for seed in range(4):
+            random.seed(seed)
+            player = game_agent.AlphaBetaPlayer(score_fn=improved_score,
+                                                killers=True)
+            player.time_left = lambda: 1e3
+            game = make_game(isolation.Board, player, seed)
+            values = root_values(game, player, 4)
+            for depth in range(1, 5):
+                move = player.alphabeta(game, depth)
+            self.assertEqual(values[move], max(values.values()))
+            self.assertTrue(player._history)
+            self.assertTrue(any(k[0] is not None for k in player._killers))
+
+    def test_tables_age_between_moves(self):
+        """History scores halve and killers shift between get_move calls"""
+        player = game_agent.AlphaBetaPlayer(score_fn=improved_score,
+                                            killers=True)
+        player._history = {(True, (1, 1)): 9, (False, (2, 2)): 1}
+        player._killers = [[(0, 0), None], [None, None], [(3, 3), (4, 4)]]
+        player.age_tables(2)
+        self.assertEqual(player._history, {(True, (1, 1)): 4})
+        self.assertEqual(player._killers, [[(3, 3), (4, 4)]])
+
+    def test_principal_variation(self):
+        """The principal variation starts with the chosen move"""
+        player = game_agent.AlphaBetaPlayer(score_fn=improved_score,
+                                            move_ordering=True)
+        player.time_left = lambda: 1e3
+        game = make_game(isolation.Board, player, 3)
+        for depth in range(1, 5):
+            move = player.alphabeta(game, depth)
+            self.assertEqual(player._pv[0], move)
+            self.assertLessEqual(len(player._pv), depth)
+            board = game
+            for pv_move in player._pv:
+                self.assertIn(pv_move, board.get_legal_moves())
+                board = board.forecast_move(pv_move)
+
+
+class PrincipalVariationSearchTest(unittest.TestCase):
+
+    def test_pvs_picks_optimal_move(self):
+        """PVS chooses a move with the best minimax value"""
+        for seed in range(6):
+            for kwargs in ({}, {"move_ordering": True, "killers": True,
+                                "tt_size": 1000}):
+                random.seed(seed)
+                player = game_agent.AlphaBetaPlayer(
+                    score_fn=improved_score, search="pvs", **kwargs)
+                player.time_left = lambda: 1e3
+                game = make_game(isolation.Board, player, seed)
+                values = root_values(game, player, 4)
+                for depth in range(1, 5):
+                    move = player.alphabeta(game, depth)
+                self.assertEqual(values[move], max(values.values()))
+
+    def test_unknown_search(self):
+        """An unknown search algorithm is rejected"""
+        with self.assertRaises(ValueError):
+            game_agent.AlphaBetaPlayer(search="mtdf")
+
+
+class AspirationWindowTest(unittest.TestCase):
+
+    def test_windows_match_full_window(self):
+        """Aspiration searches return the full-window score after failing
+        low or high"""
+        for seed in range(4):
+            for guess in (-50., -0.5, 0., 3., 50.):
+                random.seed(seed)
+                player = game_agent.AlphaBetaPlayer(score_fn=improved_score,
+                                                    aspiration_window=1.)
+                player.time_left = lambda: 1e3
+                game = make_game(isolation.Board, player, seed)
+                values = root_values(game, player, 3)
+                move, score = player.aspiration_search(game, 3, guess)
+                self.assertEqual(score, max(values.values()))
+                self.assertEqual(values[move], score)
+                if abs(guess) == 50.:
+                    self.assertGreater(player.aspiration_researches, 0)
+
+    def test_lost_position(self):
+        """A lost position terminates with a legal move and -inf score"""
+        player = game_agent.AlphaBetaPlayer(score_fn=improved_score,
+                                            aspiration_window=1.)
+        player.time_left = lambda: 1e3
+        # every move on this 3x3 board is forced, and player 1 runs out of
+        # moves first
+        game = isolation.Board(player, "opponent", 3, 3)
+        game.apply_move((0, 0))
+        game.apply_move((2, 1))
+        move, score = player.aspiration_search(game, 10, 2.)
+        self.assertEqual(move, (1, 2))
+        self.assertEqual(score, float("-inf"))
+
+
+def partitioned_games(player, seeds, size=5, max_cells=8):
+    """Yield positions on a size x size board in which `player` is to move
+    and the solver applies, taken from random games."""
+    for seed in seeds:
+        rng = random.Random(seed)
+        game = isolation.Board(player, "opponent", size, size)
+        while game.get_legal_moves():
+            if (game.active_player == player and
+                    endgame.solve(game, max_cells) is not None):
+                yield game
+            game.apply_move(rng.choice(sorted(game.get_legal_moves())))
+
+
+def active_player_wins(game):
+    """Return True if the active player wins `game` with perfect play."""
+    return any(not active_player_wins(game.forecast_move(m))
+               for m in game.get_legal_moves())
+
+
+class EndgameSolverTest(unittest.TestCase):
+
+    def test_search_scores_partitions_exactly(self):
+        """Partitioned positions below the root get their exact value"""
+        for search in ("alphabeta", "pvs"):
+            player = game_agent.AlphaBetaPlayer(
+                score_fn=improved_score, search=search, endgame_cells=8)
+            player.time_left = lambda: 1e3
+            for game in partitioned_games(player, range(10)):
+                move, score = player.search_root(game, 1)
+                wins = active_player_wins(game)
+                self.assertEqual(score, float("inf" if wins else "-inf"))
+                self.assertEqual(active_player_wins(game.forecast_move(move)),
+                                 not wins)
+            self.assertGreater(player.endgame_hits, 0)
+
+    def test_root_plays_solver_move(self):
+        """get_move answers partitioned positions without searching"""
+        player = game_agent.AlphaBetaPlayer(score_fn=improved_score,
+                                            endgame_cells=8)
+        for game in partitioned_games(player, range(5)):
+            nodes = player.nodes
+            move = player.get_move(game, lambda: 1e3)
+            self.assertEqual(player.nodes, nodes)
+            self.assertEqual(move, endgame.solve(game)[1])
+
+
+class TablebaseSearchTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, "tablebase.bin")
+        tablebase.write_table(cls.path, tablebase.generate(3, 5, 5), 3, 5, 5)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def covered_games(self, player, tb):
+        """Return positions of random 5x5 games covered by the tablebase,
+        with `player` to move."""
+        games = []
+        for seed in range(200):
+            rng = random.Random(seed)
+            game = isolation.Board(player, "opponent", 5, 5)
+            while game.get_legal_moves():
+                if game.active_player == player and tb.probe(game):
+                    games.append(game)
+                    break
+                game.apply_move(rng.choice(sorted(game.get_legal_moves())))
+        return games
+
+    def test_leaves_scored_exactly(self):
+        """Leaves covered by the tablebase get their exact value"""
+        player = game_agent.AlphaBetaPlayer(score_fn=improved_score,
+                                            tablebase=self.path)
+        player.time_left = lambda: 1e3
+        games = self.covered_games(player, player.tablebase)
+        self.assertGreater(len(games), 10)
+        for game in games:
+            _, score = player.search_root(game, 1)
+            wins = active_player_wins(game)
+            self.assertEqual(score, float("inf" if wins else "-inf"))
+        self.assertGreater(player.tablebase_hits, 0)
+
+    def test_root_plays_tablebase_move(self):
+        """get_move answers covered positions without searching"""
+        tb = tablebase.Tablebase(self.path)
+        player = game_agent.AlphaBetaPlayer(score_fn=improved_score,
+                                            tablebase=tb)
+        for game in self.covered_games(player, tb):
+            nodes = player.nodes
+            move = player.get_move(game, lambda: 1e3)
+            self.assertEqual(player.nodes, nodes)
+            self.assertEqual(move, tb.best_move(game))
+        tb.close()
+
+
+def random_positions(player, sizes=((7, 7), (5, 8)), seeds=range(20)):
+    """Yield BitBoards with both players placed after random moves, on
+    boards of each of the given sizes."""
+    for width, height in sizes:
+        for seed in seeds:
+            rng = random.Random(seed)
+            game = isolation.BitBoard(player, "opponent", width, height)
+            for _ in range(2 + seed):
+                moves = sorted(game.get_legal_moves())
+                if not moves:
+                    break
+                game.apply_move(rng.choice(moves))
+            if game.get_legal_moves():
+                yield game
+
+
+@unittest.skipIf(game_agent.np is None, "requires numpy")
+class BatchEvaluationTest(unittest.TestCase):
+
+    def test_scores_match_scalar_heuristics(self):
+        """Batched scores equal the scalar heuristics for both players"""
+        for game in random_positions("player"):
+            moves = game.get_legal_moves()
+            for view in ("player", "opponent"):
+                planes = game_agent.stack_children(game, moves, view)
+                for score_fn, weights in game_agent.BATCH_HEURISTICS.items():
+                    scores = game_agent.batch_evaluate(
+                        planes, game.active_player != view, *weights)
+                    expected = [score_fn(game.forecast_move(m), view)
+                                for m in moves]
+                    self.assertEqual(scores.tolist(), expected)
+
+    def test_grandchildren(self):
+        """Every position two plies below is stacked and scored exactly"""
+        for game in random_positions("player"):
+            moves = game.get_legal_moves()
+            planes, lines = game_agent.stack_grandchildren(game, moves, "player")
+            expected = sorted((m, r) for m in moves
+                              for r in game.forecast_move(m).get_legal_moves())
+            self.assertEqual(sorted(lines), expected)
+            scores = game_agent.batch_evaluate(
+                planes, game.active_player == "player", 1, 1)
+            self.assertEqual(scores.tolist(), [
+                game_agent.custom_score(
+                    game.forecast_move(m).forecast_move(r), "player")
+                for m, r in lines])
+
+
+class ParallelSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.player = game_agent.ParallelAlphaBetaPlayer(
+            score_fn=improved_score, workers=2, move_ordering=True)
+
+    def tearDown(self):
+        self.player.close()
+
+    def test_split_root_matches_serial_search(self):
+        """Root splitting finds the best serial score at every depth"""
+        for seed in range(3):
+            game = make_game(isolation.BitBoard, self.player, seed)
+            serial = game_agent.AlphaBetaPlayer(score_fn=improved_score)
+            serial.time_left = lambda: 1e3
+            values = root_values(game.copy_with_players(serial, "opponent"),
+                                 serial, 3)
+            scores = self.player.split_root(game, 3, time.monotonic() + 60)
+            self.assertEqual(set(scores), set(values))
+            self.assertEqual(max(scores.values()), max(values.values()))
+            best = max(scores, key=scores.get)
+            self.assertEqual(values[best], max(values.values()))
+
+    def test_returns_legal_move_in_time(self):
+        """get_move returns a legal move before the deadline"""
+        for budget in (15, 60):
+            game = make_game(isolation.Board, self.player, budget)
+            start = time.monotonic()
+            time_left = lambda: budget - 1000 * (time.monotonic() - start)
+            move = self.player.get_move(game, time_left)
+            self.assertIn(move, game.get_legal_moves())
+            self.assertGreater(time_left(), 0)
+        self.assertGreater(self.player.nodes, 0)
+
+
+class LazySMPTest(unittest.TestCase):
+
+    def test_returns_legal_move_in_time(self):
+        """get_move returns a legal move before the deadline, with the
+        helpers filling the shared table"""
+        player = game_agent.LazySMPPlayer(score_fn=improved_score, workers=2,
+                                          move_ordering=True, tt_size=2**12)
+        try:
+            for budget in (15, 100):
+                game = make_game(isolation.BitBoard, player, budget)
+                start = time.monotonic()
+                time_left = lambda: budget - 1000 * (time.monotonic() - start)
+                move = player.get_move(game, time_left)
+                self.assertIn(move, game.get_legal_moves())
+                self.assertGreater(time_left(), 0)
+            self.assertGreater(player.completed_depth, 1)
+            self.assertGreater(player.tt.stats()["entries"], 0)
+        finally:
+            player.close()
+
+
+class MonteCarloTreeSearchTest(unittest.TestCase):
+
+    def test_rollouts_follow_the_rules(self):
+        """Encoded states match the board, and random rollouts only make
+        legal moves until the player to move is stuck"""
+        for seed in range(5):
+            game = make_game(isolation.Board, "player", seed, plies=seed)
+            neighbors = competition_agent.neighbor_table(game.width, game.height)
+            blocked, locs, to_move = competition_agent.encode(game)
+            self.assertEqual(
+                sorted((idx % 7, idx // 7) for idx in competition_agent.legal_moves(
+                    blocked, locs, to_move, neighbors)),
+                sorted(game.get_legal_moves()))
+            before = (bytearray(blocked), list(locs))
+            winner = competition_agent.rollout(blocked, locs, to_move, neighbors)
+            self.assertEqual(competition_agent.legal_moves(
+                blocked, locs, 1 - winner, neighbors), [])
+            for player in (0, 1):
+                if before[1][player] != locs[player]:
+                    self.assertTrue(blocked[locs[player]])
+                    self.assertFalse(before[0][locs[player]])
+
+    def test_returns_legal_move_in_time(self):
+        """get_move returns a legal move before the deadline and reports its
+        rollout rate"""
+        player = competition_agent.CustomPlayer()
+        game = make_game(isolation.Board, player, 0)
+        start = time.monotonic()
+        time_left = lambda: 50 - 1000 * (time.monotonic() - start)
+        move = player.get_move(game, time_left)
+        self.assertIn(move, game.get_legal_moves())
+        self.assertGreater(time_left(), 0)
+        self.assertGreater(player.rollouts, 0)
+        self.assertGreater(player.rollouts_per_second, 0)
+
+    def test_tree_reuse(self):
+        """The subtree of the opponent's reply is kept between turns"""
+        for reuse_tree in (True, False):
+            player = competition_agent.CustomPlayer(reuse_tree=reuse_tree)
+            game = make_game(isolation.Board, player, 1)
+            start = time.monotonic()
+            game.apply_move(player.get_move(
+                game, lambda: 50 - 1000 * (time.monotonic() - start)))
+            reply = max(player._tree.children, key=lambda child: child.visits)
+            visits = reply.visits
+            game.apply_move((reply.move % 7, reply.move // 7))
+            start = time.monotonic()
+            player.get_move(game, lambda: 50 - 1000 * (time.monotonic() - start))
+            if reuse_tree:
+                self.assertEqual(player.reused_visits, visits)
+                self.assertGreater(player.reused_visits, 0)
+            else:
+                self.assertEqual(player.reused_visits, 0)
+
+
+class OpeningBookTest(unittest.TestCase):
+
+    def test_mcts_book(self):
+        """Books can be built with a fixed number of rollouts per move"""
+        book = opening_book.build_book(plies=2, search="mcts", effort=50,
+                                       width=5, height=5)
+        # the empty board for the first player, and one position for each of
+        # the 6 first moves of a 5x5 board that are distinct up to symmetry
+        # for the second
+        self.assertEqual(len(book), 7)
+        self.assertTrue(all(0 <= move < 25 for move in book.values()))
+
+    def test_canonical_key_is_symmetric(self):
+        """Symmetric positions share a key, and the returned symmetry maps a
+        position to its canonical form"""
+        for width, height in ((7, 7), (5, 6)):
+            perms, inverses = competition_agent.symmetries(width, height)
+            self.assertEqual(len(perms), 8 if width == height else 4)
+            for seed in range(10):
+                game = make_game(lambda p1, p2: isolation.Board(p1, p2, width, height),
+                                 "player", seed, plies=seed % 5)
+                blocked, locs, _ = competition_agent.encode(game)
+                key, symmetry = competition_agent.canonical_key(
+                    blocked, locs, width, height)
+                for perm, inverse in zip(perms, inverses):
+                    self.assertEqual(sorted(inverse[idx] for idx in perm),
+                                     list(range(width * height)))
+                    image = bytearray(len(blocked))
+                    for idx, cell in enumerate(blocked):
+                        image[perm[idx]] = cell
+                    image_locs = [perm[loc] if loc >= 0 else -1 for loc in locs]
+                    self.assertEqual(competition_agent.canonical_key(
+                        image, image_locs, width, height)[0], key)
+                canonical = bytearray(len(blocked))
+                for idx, cell in enumerate(blocked):
+                    canonical[perms[symmetry][idx]] = cell
+                self.assertEqual(competition_agent.canonical_key(
+                    canonical, [perms[symmetry][loc] if loc >= 0 else -1
+                                for loc in locs], width, height),
+                    (key, 0))
+
+    def test_player_answers_book_positions(self):
+        """The player plays an optimal book move without searching in every
+        position reached by following the book"""
+        depth = 3
+        book = opening_book.build_book(plies=3, search="alphabeta",
+                                       effort=depth, width=5, height=5)
+        data = json.loads(json.dumps(opening_book.book_data(book, 3, 5, 5)))
+        player = competition_agent.CustomPlayer(data=data)
+        searcher = game_agent.AlphaBetaPlayer(score_fn=improved_score)
+        searcher.time_left = lambda: 1e3
+        for seed in range(6):
+            rng = random.Random(seed)
+            game = isolation.Board("player1", "player2", 5, 5)
+            while game.move_count < 3:
+                if game.move_count % 2 == seed % 2:
+                    move = player.get_move(
+                        game_agent.relabel(game, player, "opponent"), lambda: 1e3)
+                    self.assertEqual(player.rollouts, 0)
+                    values = root_values(game_agent.relabel(
+                        game, searcher, "opponent"), searcher, depth)
+                    self.assertEqual(values[move], max(values.values()))
+                else:
+                    move = rng.choice(sorted(game.get_legal_moves()))
+                game.apply_move(move)
+
+
+class SlowPlayer:
+    """Player that always exceeds the tournament time limit."""
+
+    def get_move(self, game, legal_moves, time_left):
+        time.sleep((tournament.TIME_LIMIT + 50) / 1000.)
+        return legal_moves[0]
+
+
+class TournamentTest(unittest.TestCase):
+
+    def play_round(self, agents, workers, seed, time_control="nodes"):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            ratio = tournament.play_round(agents, 2, workers, seed,
+                                          time_control)
+        return ratio, output.getvalue()
+
+    def test_results_independent_of_workers(self):
+        """Seeded rounds give the same results serially and in parallel"""
+        agents = [tournament.Agent(RandomPlayer(), "Random"),
+                  tournament.Agent(GreedyPlayer(), "Greedy"),
+                  tournament.Agent(RandomPlayer(), "Random2")]
+        serial = self.play_round(agents, 1, seed=7)
+        self.assertEqual(self.play_round(agents, 2, seed=7), serial)
+        self.assertIn("Match 2:", serial[1])
+
+    def test_timeout_warnings_reach_parent(self):
+        """Timeouts in worker processes are still reported"""
+        agents = [tournament.Agent(SlowPlayer(), "Slow"),
+                  tournament.Agent(RandomPlayer(), "Random")]
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            ratio, _ = self.play_round(agents, 2, seed=0, time_control="wall")
+        self.assertEqual(ratio, 100.)
+        self.assertTrue(any(str(w.message) == tournament.TIMEOUT_WARNING
+                            for w in caught))
+
+    def test_interval_and_llr(self):
+        """Wilson intervals, Elo conversions and the SPRT statistic"""
+        low, high = tournament.wilson_interval(8, 10)
+        self.assertAlmostEqual(low, 0.4902, places=4)
+        self.assertAlmostEqual(high, 0.9433, places=4)
+        self.assertEqual(tournament.wilson_interval(0, 0), (0., 1.))
+        self.assertAlmostEqual(tournament.elo_to_score(0.), 0.5)
+        for elo in (-200., 35., 400.):
+            self.assertAlmostEqual(tournament.score_to_elo(
+                tournament.elo_to_score(elo)), elo)
+        self.assertEqual(tournament.elo_interval(10, 10)[1], float("inf"))
+        lower, upper = tournament.sprt_bounds(0.05, 0.05)
+        self.assertAlmostEqual(upper, -lower)
+        self.assertGreater(tournament.sprt_llr(60, 40, 0., 35.), 0.)
+        self.assertLess(tournament.sprt_llr(50, 50, 0., 35.), 0.)
+
+    def test_sprt_stops_early(self):
+        """The SPRT accepts H1 for a clearly stronger agent and H0 for a
+        clearly weaker one well before the match limit"""
+        greedy = tournament.Agent(GreedyPlayer(improved_score), "Greedy")
+        random_agent = tournament.Agent(RandomPlayer(), "Random")
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            stronger = tournament.play_sprt(greedy, random_agent, 0., 100.,
+                                            max_matches=200, seed=1)
+            weaker = tournament.play_sprt(random_agent, greedy, 0., 100.,
+                                          max_matches=200, seed=1)
+        self.assertEqual(stronger.decision, "H1")
+        self.assertEqual(weaker.decision, "H0")
+        for result in (stronger, weaker):
+            self.assertLess(result.wins + result.losses, 400)
+        self.assertIn("LLR", output.getvalue())
+
+    def test_results_log_resumes(self):
+        """Finished games are logged, a restarted round reuses them, and the
+        summary counts every logged game once"""
+        agents = [tournament.Agent(RandomPlayer(), "Random"),
+                  tournament.Agent(GreedyPlayer(), "Greedy"),
+                  tournament.Agent(RandomPlayer(), "Random2")]
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "results.jsonl")
+        with contextlib.redirect_stdout(io.StringIO()):
+            ratio = tournament.play_round(
+                agents, 2, seed=5, log=tournament.ResultsLog(path))
+        with open(path) as log_file:
+            lines = log_file.readlines()
+        # 2 opponents x 2 orderings x 2 matches x 2 games
+        self.assertEqual(len(lines), 16)
+        record = json.loads(lines[0])
+        self.assertEqual(record["match"], ["Random2", "Random", 0])
+        self.assertEqual(record["players"], ["Random2", "Random"])
+        self.assertIn(record["winner"], record["players"])
+        self.assertEqual(len(record["opening"]), 2)
+        self.assertEqual(len(record["move_times"]), len(record["moves"]) + 1)
+
+        # simulate a run killed while writing the fourth match
+        with open(path, "w") as log_file:
+            log_file.writelines(lines[:7])
+            log_file.write(lines[7][:20])
+        seeds = {tuple(json.loads(line)["match"]): json.loads(line)["seed"]
+                 for line in lines}
+        log = tournament.ResultsLog(path)
+        match_id = ("Random", "Random2", 0)
+        self.assertIsNotNone(log.result(match_id, seeds[match_id]))
+        self.assertIsNone(log.result(match_id, seeds[match_id] + 1))
+        match_id = ("Random", "Random2", 1)
+        self.assertIsNone(log.result(match_id, seeds[match_id]))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(tournament.play_round(agents, 2, seed=5, log=log),
+                             ratio)
+        # the incomplete line is kept, followed by the 5 replayed matches
+        with open(path) as log_file:
+            self.assertEqual(len(log_file.readlines()), 8 + 10)
+
+        table = tournament.summarize(path)
+        games = sum(won + lost for row in table.values()
+                    for won, lost, _ in row.values())
+        self.assertEqual(games, 2 * 16)
+        self.assertEqual(sum(won for won, _, _ in table["Random2"].values()),
+                         round(ratio * 16 / 100))
+
+        # a round with other openings plays all of its matches again
+        with contextlib.redirect_stdout(io.StringIO()):
+            tournament.play_round(agents, 2, seed=6,
+                                  log=tournament.ResultsLog(path))
+        with open(path) as log_file:
+            self.assertEqual(len(log_file.readlines()), 8 + 10 + 16)
+        table = tournament.summarize(path)
+        self.assertEqual(sum(won + lost for row in table.values()
+                             for won, lost, _ in row.values()), 2 * 32)
+
+
+if __name__ == '__main__':
+    unittest.main()
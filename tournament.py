@@ -17,24 +17,65 @@ For example, if the random moves chosen for initialization are (5, 2) and
 agentB at (1, 3) as player 2 then play to conclusion; the agents swap
 initiative in the second match with agentB at (5, 2) as player 1 and agentA at
 (1, 3) as player 2.
+
+Matches are independent, so `--workers N` plays them in a pool of N worker
+processes. Every match seeds the random number generator with its own seed
+drawn in advance (from `--seed`), so the openings do not depend on which
+worker plays a match or in what order. Each worker uses a whole CPU during
+its games, so use at most one worker per core to keep the time limit
+meaningful.
+
+Every turn is charged on the clock chosen with `--time-control` (see
+`isolation.Board.play()`). The default "cpu" control charges the process CPU
+time of each move, so an expensive heuristic pays for its own cost while
+the load of other workers does not count against it; "wall" charges
+wall-clock time. "nodes" charges a fixed cost per call to `time_left()`,
+which the search agents make once per node, so that results are exactly
+reproducible; it never charges the cost of evaluating a position, so use it
+only for reproducibility runs, not to compare heuristics.
+
+With `--log FILE` every finished game is appended to FILE as one JSON
+record (see `ResultsLog`), and a run restarted with the same log and the
+same `--seed` skips the matches it already holds; `--summarize FILE`
+prints the win tables of a log without playing.
+
+With `--sprt` the script instead plays the Student agent head to head
+against ID_Improved and stops as soon as a sequential probability ratio test
+decides between "Student is at most `--elo0` Elo stronger" (H0) and "at
+least `--elo1` Elo stronger" (H1), with error rates `--alpha` and `--beta`,
+or after `--max-matches` matches. Win rates are reported with Wilson score
+intervals, converted to Elo differences.
 """
 
+import argparse
+import functools
 import itertools
+import json
+import math
+import multiprocessing
+import os
 import random
 import warnings
 
 from collections import namedtuple
 
 from isolation import Board
+from isolation.isolation import TIME_CONTROLS
 from sample_players import RandomPlayer
 from sample_players import null_score
 from sample_players import open_move_score
 from sample_players import improved_score
-from game_agent import CustomPlayer
-from game_agent import custom_score
+from game_agent2 import CustomPlayer
+from game_agent2 import custom_score
 
 NUM_MATCHES = 5  # number of matches against each opponent
 TIME_LIMIT = 150  # number of milliseconds before timeout
+TIME_CONTROL = "cpu"  # clock the time limit is measured on
+
+# defaults of the sequential probability ratio test (--sprt)
+ELO0, ELO1 = 0., 35.  # Elo differences of the null and alternative hypotheses
+ALPHA = BETA = 0.05  # probabilities of accepting H1 (H0) when H0 (H1) holds
+MAX_MATCHES = 500  # matches (of two games) before the test gives up
 
 TIMEOUT_WARNING = "One or more agents lost a match this round due to " + \
                   "timeout. The get_move() function must return before " + \
@@ -56,28 +97,227 @@ same opponents.
 
 Agent = namedtuple("Agent", ["player", "name"])
 
+SPRTResult = namedtuple("SPRTResult", ["decision", "wins", "losses", "llr"])
+
+
+def elo_to_score(elo):
+    """Return the expected score of a player `elo` points stronger."""
+    return 1. / (1. + 10. ** (-elo / 400.))
+
+
+def score_to_elo(score):
+    """Return the Elo difference that gives an expected score of `score`."""
+    if score <= 0.:
+        return float("-inf")
+    if score >= 1.:
+        return float("inf")
+    return 400. * math.log10(score / (1. - score))
+
+
+def wilson_interval(wins, games, z=1.96):
+    """Return the Wilson score interval (low, high) of a win rate, at the
+    confidence level of the normal quantile `z` (95% by default).
+    """
+    if not games:
+        return 0., 1.
+    rate = wins / games
+    center = rate + z * z / (2 * games)
+    spread = z * math.sqrt(rate * (1 - rate) / games + z * z / (4 * games * games))
+    denominator = 1 + z * z / games
+    return (center - spread) / denominator, (center + spread) / denominator
+
+
+def elo_interval(wins, games, z=1.96):
+    """Return the Wilson score interval of a win rate as Elo differences."""
+    low, high = wilson_interval(wins, games, z)
+    return score_to_elo(low), score_to_elo(high)
+
 
-def play_match(player1, player2):
+def sprt_llr(wins, losses, elo0, elo1):
+    """Return the log-likelihood ratio of H1 (the win rate matches `elo1`)
+    against H0 (it matches `elo0`) after `wins` and `losses`. Isolation has
+    no draws, so every game is a Bernoulli trial.
+    """
+    p0, p1 = elo_to_score(elo0), elo_to_score(elo1)
+    return wins * math.log(p1 / p0) + losses * math.log((1 - p1) / (1 - p0))
+
+
+def sprt_bounds(alpha, beta):
+    """Return the (lower, upper) LLR bounds at which the test accepts H0 or
+    H1 with error rates `alpha` (false H1) and `beta` (false H0).
+    """
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def read_log(path):
+    """Yield the records of a results log one at a time, skipping a last
+    line left incomplete by an interrupted run."""
+    with open(path) as log_file:
+        for line in log_file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def _match_key(record):
+    """Return the (match triple, seed) pair identifying the match of a
+    logged game."""
+    return tuple(record["match"]), record["seed"]
+
+
+class ResultsLog:
+    """Append-only JSONL log of the games played by the tournament.
+
+    Each line records one finished game: the match it belongs to ("match",
+    a [player1 name, player2 name, index] triple as in `play_round()`), its
+    number within the match ("game", 0 or 1), the match seed, the names of
+    the first and second player of the game ("players"), the winner's name,
+    the termination reason, the opening moves, the rest of the move
+    history, the milliseconds charged for each of those turns and the time
+    control. Both games of a match are written together once it finishes.
+
+    Opening a log reads it one line at a time and keeps only the winners of
+    each match, so that `result()` can report matches played by an earlier
+    run. Matches are identified by their match triple and their seed, so a
+    run with a different `--seed` (or the default random one) plays its
+    own matches instead of reusing games played from other openings.
+
+    Parameters
+    ----------
+    path : str
+        The log file; it is created if it does not exist.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._winners = {}
+        self._partial_line = False
+        if os.path.exists(path):
+            for record in read_log(path):
+                self._winners.setdefault(_match_key(record), {})[
+                    record["game"]] = record["winner"]
+            with open(path, "rb") as log_file:
+                log_file.seek(0, os.SEEK_END)
+                if log_file.tell():
+                    log_file.seek(-1, os.SEEK_END)
+                    self._partial_line = log_file.read(1) != b"\n"
+
+    def result(self, match_id, seed):
+        """Return the scores (player1, player2) of a match logged with the
+        given seed, or None if the log does not hold both of its games."""
+        winners = self._winners.get((tuple(match_id), seed), {})
+        if len(winners) < 2:
+            return None
+        score_1 = sum(winner == match_id[0] for winner in winners.values())
+        return score_1, 2 - score_1
+
+    def append(self, match_id, seed, records, time_control):
+        """Append the games of a match, as described by the `records` of
+        `play_match()`, to the log."""
+        names = match_id[:2]
+        lines = ["\n"] if self._partial_line else []
+        for game, record in enumerate(records):
+            first = record["first"]
+            entry = {"match": list(match_id), "game": game, "seed": seed,
+                     "players": [names[first], names[1 - first]],
+                     "winner": names[record["winner"]],
+                     "termination": record["termination"],
+                     "opening": record["opening"], "moves": record["moves"],
+                     "move_times": record["move_times"],
+                     "time_control": time_control}
+            lines.append(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._winners.setdefault((tuple(match_id), seed), {})[game] = \
+                entry["winner"]
+        with open(self.path, "a") as log_file:
+            log_file.write("".join(lines))
+        self._partial_line = False
+
+
+def summarize(path):
+    """Rebuild the win tables of a results log, reading one record at a
+    time. Return a dict mapping each agent's name to a dict mapping each
+    opponent's name to a [wins, losses, timeout losses] list.
+
+    Games logged twice (e.g., the first game of a match replayed after an
+    interrupted run, or games played by concurrent runs) are counted once.
+    To find them, one (match, seed, game) key per logged game is kept in
+    memory, but none of the records themselves.
+    """
+    table = {}
+    seen = set()
+    for record in read_log(path):
+        key = (_match_key(record), record["game"])
+        if key in seen:
+            continue
+        seen.add(key)
+        winner = record["winner"]
+        loser = [name for name in record["players"] if name != winner][0]
+        table.setdefault(winner, {}).setdefault(loser, [0, 0, 0])[0] += 1
+        row = table.setdefault(loser, {}).setdefault(winner, [0, 0, 0])
+        row[1] += 1
+        row[2] += record["termination"] == "timeout"
+    return table
+
+
+def print_summary(table):
+    """Print the win tables returned by `summarize()`."""
+    for name in sorted(table):
+        print("\n{}".format(name))
+        print("----------")
+        wins = games = 0
+        for opponent, (won, lost, timeouts) in sorted(table[name].items()):
+            print("  vs {!s:<15}{:>5} to {:<5} ({} timeouts)".format(
+                opponent, won, lost, timeouts))
+            wins, games = wins + won, games + won + lost
+        low, high = wilson_interval(wins, games)
+        print("  {:<18}{:>9.2f}%  (95% CI {:.2f}% - {:.2f}%)".format(
+            "Total", 100. * wins / games, 100. * low, 100. * high))
+
+
+def play_match(player1, player2, board_class=Board, time_control=TIME_CONTROL,
+               records=None):
     """
     Play a "fair" set of matches between two agents by playing two games
     between the players, forcing each agent to play from randomly selected
     positions. This should control for differences in outcome resulting from
     advantage due to starting position on the board.
+
+    The games are played on instances of `board_class`, which may be any
+    board engine from the isolation package (e.g., `Board` or `BitBoard`),
+    with each turn measured on the clock `time_control` (see `Board.play()`).
+
+    If `records` is a list, a JSON-serializable dict describing each game is
+    appended to it: the index in (player1, player2) of the player who moved
+    first ("first") and of the winner ("winner"), the two random opening
+    moves ("opening"), the moves played after them ("moves"), the
+    milliseconds charged for each of those turns ("move_times") and the
+    reason the game ended ("termination").
     """
     num_wins = {player1: 0, player2: 0}
     num_timeouts = {player1: 0, player2: 0}
     num_invalid_moves = {player1: 0, player2: 0}
-    games = [Board(player1, player2), Board(player2, player1)]
+    games = [board_class(player1, player2), board_class(player2, player1)]
 
     # initialize both games with a random move and response
+    opening = []
     for _ in range(2):
         move = random.choice(games[0].get_legal_moves())
         games[0].apply_move(move)
         games[1].apply_move(move)
+        opening.append(list(move))
 
     # play both games and tally the results
-    for game in games:
-        winner, _, termination = game.play(time_limit=TIME_LIMIT)
+    for first, game in enumerate(games):
+        move_times = []
+        winner, history, termination = game.play(time_limit=TIME_LIMIT,
+                                                 time_control=time_control,
+                                                 move_times=move_times)
+        if records is not None:
+            records.append({"first": first,
+                            "winner": 0 if winner == player1 else 1,
+                            "opening": opening, "moves": history,
+                            "move_times": move_times,
+                            "termination": termination})
 
         if player1 == winner:
             num_wins[player1] += 1
@@ -102,30 +342,109 @@ def play_match(player1, player2):
     return num_wins[player1], num_wins[player2]
 
 
-def play_round(agents, num_matches):
+def _play_seeded_match(job, time_control=TIME_CONTROL):
+    """Play the match described by a (player1, player2, seed) tuple with the
+    random number generator seeded by `seed`. Return the scores of both
+    players and whether a timeout warning was raised.
+    """
+    player1, player2, seed = job
+    random.seed(seed)
+    records = []
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        score_1, score_2 = play_match(player1, player2,
+                                      time_control=time_control,
+                                      records=records)
+    timeouts = any(str(w.message) == TIMEOUT_WARNING for w in caught)
+    return score_1, score_2, timeouts, records
+
+
+def play_matches(jobs, workers=1, time_control=TIME_CONTROL, log=None,
+                 match_ids=None):
+    """
+    Play a list of (player1, player2, seed) matches and yield the result of
+    each, in order, as a pair of scores. With more than one worker the
+    matches are played in a pool of processes on copies of the players.
+
+    With a `ResultsLog`, `match_ids` holds a (player1 name, player2 name,
+    index) triple identifying each match together with its seed: matches
+    already in the log under the same seed are not played again but yield
+    their logged result, and the games of every other match are appended
+    to the log as soon as it finishes.
+    """
+    if log is None:
+        logged = [None] * len(jobs)
+    else:
+        logged = [log.result(match_id, job[2])
+                  for job, match_id in zip(jobs, match_ids)]
+    pending = [job for job, result in zip(jobs, logged) if result is None]
+    play = functools.partial(_play_seeded_match, time_control=time_control)
+    if workers > 1 and pending:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap(play, pending)
+    else:
+        pool = None
+        results = map(play, pending)
+    try:
+        for idx, (job, result) in enumerate(zip(jobs, logged)):
+            if result is not None:
+                yield result
+                continue
+            score_1, score_2, timeouts, records = next(results)
+            if timeouts:
+                warnings.warn(TIMEOUT_WARNING)
+            if log is not None:
+                log.append(match_ids[idx], job[2], records, time_control)
+            yield score_1, score_2
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+def play_round(agents, num_matches, workers=1, seed=None,
+               time_control=TIME_CONTROL, log=None):
     """
-    Play one round (i.e., a single match between each pair of opponents)
+    Play one round (i.e., a single match between each pair of opponents),
+    using `workers` processes; `seed` makes the openings reproducible. With
+    a `ResultsLog`, matches already logged are skipped (see
+    `play_matches()`).
     """
     agent_1 = agents[-1]
     wins = 0.
     total = 0.
 
+    # Each player takes a turn going first; the seed of every match is drawn
+    # up front, so it does not depend on the order matches finish in
+    rng = random.Random(seed)
+    jobs, match_ids = [], []
+    for agent_2 in agents[:-1]:
+        for a1, a2 in itertools.permutations((agent_1, agent_2)):
+            for idx in range(num_matches):
+                jobs.append((a1.player, a2.player, rng.getrandbits(32)))
+                match_ids.append((a1.name, a2.name, idx))
+    results = play_matches(jobs, workers, time_control, log, match_ids)
+
     print("\nPlaying Matches:")
     print("----------")
 
+    matches_per_opponent = 2 * num_matches
     for idx, agent_2 in enumerate(agents[:-1]):
 
         counts = {agent_1.player: 0., agent_2.player: 0.}
         names = [agent_1.name, agent_2.name]
-        print("  Match {}: {!s:^11} vs {!s:^11}".format(idx + 1, *names), end=' ')
-
-        # Each player takes a turn going first
-        for p1, p2 in itertools.permutations((agent_1.player, agent_2.player)):
-            for _ in range(num_matches):
-                score_1, score_2 = play_match(p1, p2)
-                counts[p1] += score_1
-                counts[p2] += score_2
-                total += score_1 + score_2
+        print("  Match {}: {!s:^11} vs {!s:^11}".format(idx + 1, *names), end=' ',
+              flush=True)
+
+        # results come back in job order, so the players of each result are
+        # found by its index rather than by the (copied) player objects
+        for job in range(idx * matches_per_opponent,
+                         (idx + 1) * matches_per_opponent):
+            p1, p2, _ = jobs[job]
+            score_1, score_2 = next(results)
+            counts[p1] += score_1
+            counts[p2] += score_2
+            total += score_1 + score_2
 
         wins += counts[agent_1.player]
 
@@ -135,7 +454,90 @@ def play_round(agents, num_matches):
     return 100. * wins / total
 
 
+def play_sprt(agent, baseline, elo0=ELO0, elo1=ELO1, alpha=ALPHA, beta=BETA,
+              max_matches=MAX_MATCHES, workers=1, seed=None,
+              time_control=TIME_CONTROL, log=None):
+    """
+    Play matches between `agent` and `baseline` until a sequential
+    probability ratio test decides whether `agent` is at most `elo0` (H0)
+    or at least `elo1` (H1) Elo stronger, printing a progress line after
+    every match. The agents alternate between the two orderings of
+    `play_match()`, and each match is seeded (and logged in a `ResultsLog`)
+    as in `play_round()`.
+
+    Returns an SPRTResult with the decision ("H0", "H1", or None if
+    `max_matches` were played first), the games won and lost by `agent` and
+    the final log-likelihood ratio.
+    """
+    lower, upper = sprt_bounds(alpha, beta)
+    rng = random.Random(seed)
+    orders = itertools.cycle([(agent, baseline), (baseline, agent)])
+    jobs, match_ids = [], []
+    for idx, (a1, a2) in zip(range(max_matches), orders):
+        jobs.append((a1.player, a2.player, rng.getrandbits(32)))
+        match_ids.append((a1.name, a2.name, idx))
+    wins = losses = 0
+    llr, decision = 0., None
+    results = play_matches(jobs, workers, time_control, log, match_ids)
+    try:
+        for (p1, _, _), (score_1, score_2) in zip(jobs, results):
+            if p1 is agent.player:
+                wins, losses = wins + score_1, losses + score_2
+            else:
+                wins, losses = wins + score_2, losses + score_1
+            llr = sprt_llr(wins, losses, elo0, elo1)
+            low, high = elo_interval(wins, wins + losses)
+            print("\r  {} vs {}: {}-{}  Elo {:+.0f} [{:+.0f}, {:+.0f}]  "
+                  "LLR {:.2f} [{:.2f}, {:.2f}]".format(
+                      agent.name, baseline.name, wins, losses,
+                      score_to_elo(wins / (wins + losses)), low, high,
+                      llr, lower, upper), end=" ", flush=True)
+            if llr <= lower or llr >= upper:
+                decision = "H0" if llr <= lower else "H1"
+                break
+    finally:
+        results.close()
+        print()
+    return SPRTResult(decision, wins, losses, llr)
+
+
 def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes playing matches in "
+                             "parallel (default: %(default)s)")
+    parser.add_argument("--matches", type=int, default=NUM_MATCHES,
+                        help="matches against each opponent "
+                             "(default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed for the match openings (default: random)")
+    parser.add_argument("--time-control", choices=TIME_CONTROLS,
+                        default=TIME_CONTROL,
+                        help="clock charged for each move (default: %(default)s)")
+    parser.add_argument("--log", default=None,
+                        help="JSONL file to append games to and to resume from")
+    parser.add_argument("--summarize", metavar="LOG", default=None,
+                        help="print the win tables of a log and exit")
+    parser.add_argument("--sprt", action="store_true",
+                        help="test Student against ID_Improved head to head "
+                             "with an SPRT instead of the round-robin")
+    parser.add_argument("--elo0", type=float, default=ELO0,
+                        help="Elo difference under H0 (default: %(default)s)")
+    parser.add_argument("--elo1", type=float, default=ELO1,
+                        help="Elo difference under H1 (default: %(default)s)")
+    parser.add_argument("--alpha", type=float, default=ALPHA,
+                        help="probability of a false H1 (default: %(default)s)")
+    parser.add_argument("--beta", type=float, default=BETA,
+                        help="probability of a false H0 (default: %(default)s)")
+    parser.add_argument("--max-matches", type=int, default=MAX_MATCHES,
+                        help="matches before the SPRT gives up "
+                             "(default: %(default)s)")
+    args = parser.parse_args()
+
+    if args.summarize:
+        print_summary(summarize(args.summarize))
+        return
+    log = ResultsLog(args.log) if args.log else None
 
     HEURISTICS = [("Null", null_score),
                   ("Open", open_move_score),
@@ -164,6 +566,20 @@ def main():
                    Agent(CustomPlayer(score_fn=custom_score, **CUSTOM_ARGS), "Student")]
 
     print(DESCRIPTION)
+    if args.sprt:
+        baseline, student = test_agents
+        print("SPRT: H0 Elo <= {:g}, H1 Elo >= {:g}, alpha {:g}, beta {:g}"
+              .format(args.elo0, args.elo1, args.alpha, args.beta))
+        result = play_sprt(student, baseline, args.elo0, args.elo1,
+                           args.alpha, args.beta, args.max_matches,
+                           args.workers, args.seed, args.time_control, log)
+        verdicts = {"H1": "stronger than", "H0": "not stronger than",
+                    None: "inconclusive against"}
+        print("{} is {} {} after {} games".format(
+            student.name, verdicts[result.decision], baseline.name,
+            result.wins + result.losses))
+        return
+
     for agentUT in test_agents:
         print("")
         print("*************************")
@@ -171,11 +587,16 @@ def main():
         print("*************************")
 
         agents = random_agents + mm_agents + ab_agents + [agentUT]
-        win_ratio = play_round(agents, NUM_MATCHES)
+        win_ratio = play_round(agents, args.matches, args.workers, args.seed,
+                               args.time_control, log)
+        # every game has a winner: 2 games per match, both orderings
+        games = 4 * args.matches * (len(agents) - 1)
+        low, high = wilson_interval(round(win_ratio * games / 100.), games)
 
         print("\n\nResults:")
         print("----------")
-        print("{!s:<15}{:>10.2f}%".format(agentUT.name, win_ratio))
+        print("{!s:<15}{:>10.2f}%  (95% CI {:.2f}% - {:.2f}%)".format(
+            agentUT.name, win_ratio, 100. * low, 100. * high))
 
 
 if __name__ == "__main__":